@@ -0,0 +1,329 @@
+"""
+Headless benchmark of the acquisition → storage → plot pipeline.
+
+Runs MainApp offscreen with the ADC worker on the dummy bus, on the
+simulated plant with --simulation, or replaying a recorded run with
+--replay, for every sampling time and channel count. Each case runs in
+its own process, so CPU and memory are per case.
+
+Measured per case
+- samples/s received by the GUI thread, tick overruns and jitter
+- per-stage latency from instrumentation.STAGES: read, buffer, control,
+  convert, copy, save, emit, tick (worker thread), on_worker_step,
+  store, plot model, render, plot, values (GUI thread)
+- CPU time and resident memory
+
+    python -m controlunit.benchmark --rates 1 0.1 0.01 0.001 --channels 9 16 32
+    python -m controlunit.benchmark --output new.json --baseline old.json
+    python -m controlunit.benchmark --replay cu_20240101_120000.csv --speed 0
+
+With --baseline, cases slower than the baseline by more than --tolerance
+are listed and the exit code is 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from controlunit.instrumentation import STAGES
+
+RESULT = "BENCHMARK "
+# stage p99 changes below this are noise, s
+MIN_REGRESSION = 1e-4
+
+
+# MARK: memory
+def rss():
+    """Resident memory in MB, peak where /proc is not available"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def backend():
+    from controlunit.devices import adc_setter
+
+    module = adc_setter.smbus.__module__
+    if module.endswith("simulation"):
+        return "simulation"
+    if module.endswith("dummy"):
+        return "dummy"
+    return "hardware"
+
+
+# MARK: case
+def extend_channels(adc_channels, n):
+    """
+    ADC Channels with extra "No Conversion" channels on unused numbers,
+    MainApp needs all configured signals, so n can not be smaller.
+    """
+    if n < len(adc_channels):
+        raise ValueError(f"{n} channels, at least {len(adc_channels)} are configured")
+    channels = dict(adc_channels)
+    used = {props["Channel"] for props in channels.values()}
+    for number in [k for k in range(64) if k not in used][: n - len(channels)]:
+        channels[f"A{number}"] = {
+            "Channel": number,
+            "Gain": 10,
+            "Description": "benchmark",
+            "Conversion Function": "No Conversion",
+        }
+    if len(channels) < n:
+        raise ValueError(f"{n} channels, the board has 64")
+    return channels
+
+
+def benchmark_config(
+    config, rate, channels, folder, data_format=None, replay=None, speed=1.0
+):
+    """Settings of one case, files go to folder"""
+    import readsettings
+
+    config = dict(config)
+    config["Sampling Time"] = rate
+    config["Data Folder"] = folder
+    config["Log File Path"] = os.path.join(folder, config["Log File"])
+    if data_format:
+        config["Data Format"] = data_format
+    if replay:
+        config["Replay"] = dict(config.get("Replay") or {}, File=replay, Speed=speed)
+    config["ADC Channels"] = extend_channels(config["ADC Channels"], channels)
+    return readsettings.init_adc_channels(config)
+
+
+def run_case(
+    rate, channels, duration, warmup, data_format=None, replay=None, speed=1.0
+):
+    """
+    Run MainApp offscreen for warmup + duration seconds.
+    Returns the measurements as a dict.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5 import QtCore, QtWidgets
+    from controlunit.main import MainApp
+
+    app = QtWidgets.QApplication([])
+    folder = tempfile.mkdtemp(prefix="cu_benchmark_")
+    gui = MainApp(app)
+    gui.config = benchmark_config(
+        gui.config, rate, channels, folder, data_format, replay, speed
+    )
+    gui.log_file.open(gui.config["Log File Path"])
+    gui.sampling = rate
+    gui.currentvalues = {name: 0 for name in gui.config["ADC Signal Names"]}
+    gui.update_plot_timewindow()
+
+    gui.instrumentation_dock.enable.setChecked(True)
+    workers = {}
+    prep_worker = gui.prep_worker
+
+    def prep_and_keep_worker(device_class, device_name, start_time):
+        worthre = prep_worker(device_class, device_name, start_time)
+        workers[device_name] = worthre["worker"]
+        return worthre
+
+    gui.prep_worker = prep_and_keep_worker
+
+    result = {"samples": 0}
+    on_worker_step = gui.on_worker_step
+
+    def count_and_step(data):
+        if data[-1] == "ADC" and "start" in result:
+            start, stop = data[0]
+            result["samples"] += stop - start
+        on_worker_step(data)
+
+    gui.on_worker_step = count_and_step
+    memory = []
+
+    def measure():
+        STAGES.reset()
+        result["samples"] = 0
+        result["start"] = time.monotonic()
+        result["cpu"] = cpu_time()
+        memory.append(rss())
+
+    def stop():
+        result["elapsed"] = time.monotonic() - result["start"]
+        result["cpu"] = cpu_time() - result["cpu"]
+        memory.append(rss())
+        gui.abort_all_threads()
+        QtCore.QTimer.singleShot(300, app.quit)
+
+    def sample_memory():
+        if "start" in result:
+            memory.append(rss())
+
+    memory_timer = QtCore.QTimer()
+    memory_timer.timeout.connect(sample_memory)
+    memory_timer.start(500)
+
+    gui.control_dock.OnOffSW.setChecked(True)
+    gui._MainApp__onoff()
+    # applied in the worker thread, as from the GUI
+    workers["ADC"].change_sampling_time.emit(rate)
+    QtCore.QTimer.singleShot(int(warmup * 1000), measure)
+    QtCore.QTimer.singleShot(int((warmup + duration) * 1000), stop)
+    app.exec_()
+
+    worker = workers["ADC"]
+    timing = worker.scheduler.stats()
+    scan = worker.aio.scan_stats
+    elapsed = result["elapsed"]
+    return {
+        "rate": rate,
+        "channels": channels,
+        "duration": elapsed,
+        "backend": "replay" if replay else backend(),
+        "data format": gui.config.get("Data Format", "csv"),
+        "target samples per s": 1 / rate,
+        "samples": result["samples"],
+        "samples per s": result["samples"] / elapsed,
+        "ticks": timing["ticks"],
+        "overruns": timing["overruns"],
+        "missed": timing["missed"],
+        "mean jitter": timing["mean jitter"],
+        "max jitter": timing["max jitter"],
+        "scan latency": scan["total latency"] / max(scan["scans"], 1),
+        "transactions per scan": scan["transactions"] / max(scan["scans"], 1),
+        "cpu percent": 100 * result["cpu"] / elapsed,
+        "rss mb": {"start": memory[0], "max": max(memory), "end": memory[-1]},
+        "stages": STAGES.stats(),
+    }
+
+
+# MARK: suite
+def run_suite(args):
+    """Every case in a child process, returns the results document"""
+    env = dict(os.environ)
+    if args.simulation:
+        env["CONTROLUNIT_SIMULATION"] = "1"
+    cases = []
+    for rate in args.rates:
+        for channels in args.channels:
+            command = [sys.executable, "-m", "controlunit.benchmark", "--case"]
+            command += ["--rates", str(rate), "--channels", str(channels)]
+            command += ["--duration", str(args.duration)]
+            command += ["--warmup", str(args.warmup)]
+            if args.format:
+                command += ["--format", args.format]
+            if args.replay:
+                command += ["--replay", args.replay, "--speed", str(args.speed)]
+            child = subprocess.run(command, env=env, capture_output=True, text=True)
+            lines = [
+                line[len(RESULT) :]
+                for line in child.stdout.splitlines()
+                if line.startswith(RESULT)
+            ]
+            if child.returncode or not lines:
+                print(f"rate {rate} s, {channels} channels failed:\n{child.stderr}")
+                continue
+            case = json.loads(lines[-1])
+            print(format_case(case))
+            cases.append(case)
+    return {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "cases": cases,
+    }
+
+
+def format_case(case):
+    stages = case["stages"]
+    p99 = ", ".join(f"{k} {v['p99'] * 1e3:.2f}" for k, v in stages.items())
+    return (
+        f"{case['rate']:g} s x {case['channels']} ch: "
+        f"{case['samples per s']:.1f}/{case['target samples per s']:g} samples/s, "
+        f"{case['overruns']} overruns, cpu {case['cpu percent']:.0f} %, "
+        f"rss {case['rss mb']['max']:.0f} MB\n  p99 ms: {p99}"
+    )
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against baseline, list of messages"""
+    previous = {(c["rate"], c["channels"]): c for c in baseline["cases"]}
+    regressions = []
+    for case in results["cases"]:
+        old = previous.get((case["rate"], case["channels"]))
+        if old is None:
+            continue
+        name = f"{case['rate']:g} s x {case['channels']} ch"
+        if case["samples per s"] < old["samples per s"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {case['samples per s']:.1f} samples/s,"
+                f" was {old['samples per s']:.1f}"
+            )
+        for stage, stats in case["stages"].items():
+            if stage not in old["stages"]:
+                continue
+            before, after = old["stages"][stage]["p99"], stats["p99"]
+            if after > before * (1 + tolerance) and after - before > MIN_REGRESSION:
+                regressions.append(
+                    f"{name}: {stage} p99 {after * 1e3:.2f} ms,"
+                    f" was {before * 1e3:.2f} ms"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 0.1, 0.01])
+    parser.add_argument("--channels", type=int, nargs="+", default=[9, 16, 32])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--simulation", action="store_true")
+    parser.add_argument("--format", choices=["csv", "binary", "both"])
+    parser.add_argument("--replay", help="play this cu_*.csv or cu_*.bin run")
+    parser.add_argument("--speed", type=float, default=1.0, help="0: max")
+    parser.add_argument("--output", help="write results to this json file")
+    parser.add_argument("--baseline", help="compare with this results file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--case", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        case = run_case(
+            args.rates[0],
+            args.channels[0],
+            args.duration,
+            args.warmup,
+            args.format,
+            args.replay,
+            args.speed,
+        )
+        print(RESULT + json.dumps(case))
+        return 0
+
+    results = run_suite(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
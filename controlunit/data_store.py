@@ -0,0 +1,169 @@
+"""
+Bounded in-memory store for data received from workers.
+
+Batches are copied into preallocated column chunks, so an append is
+amortized O(1) and never copies the history. Sealed chunks older than
+the retention horizon are dropped: the full run is already on disk
+(storage.py) and long plot windows are drawn from the PlotModel pyramid.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Chunk:
+    """Preallocated typed columns for `size` rows"""
+
+    def __init__(self, dtypes, size):
+        self.columns = {name: np.empty(size, dtype=dtype) for name, dtype in dtypes}
+        self.size = size
+        self.rows = 0
+
+    def free(self):
+        return self.size - self.rows
+
+    def fill(self, data, start, n):
+        """Copy n rows of data starting at row start, data is {column: array}"""
+        for name, column in self.columns.items():
+            column[self.rows : self.rows + n] = data[name][start : start + n]
+        self.rows += n
+
+    def view(self, name):
+        return self.columns[name][: self.rows]
+
+
+class ChunkedStore:
+    """
+    Chunked columnar store with a retention horizon.
+
+    Parameters
+    ----------
+    columns: list
+        column names
+    horizon: float
+        seconds of data kept in memory, non-positive to keep everything
+    max_rows: int
+        maximum rows kept in memory, non-positive for no limit
+    chunk_rows: int
+        rows per chunk
+    time_column: str
+        datetime column used for the horizon
+    """
+
+    def __init__(
+        self, columns, horizon=7200, max_rows=0, chunk_rows=4096, time_column="date"
+    ):
+        self.columns = list(columns)
+        self.horizon = horizon
+        self.max_rows = max_rows
+        self.chunk_rows = chunk_rows
+        self.time_column = time_column
+        self.chunks = []
+        self.dtypes = None
+        self.rows = 0
+        self.dropped_rows = 0
+
+    def __len__(self):
+        return self.rows
+
+    def append(self, data):
+        """Append a batch, DataFrame or {column: array}"""
+        if isinstance(data, pd.DataFrame):
+            data = {name: data[name].to_numpy() for name in self.columns}
+        n = len(data[self.columns[0]])
+        if self.dtypes is None:
+            self.dtypes = [
+                (name, np.asarray(data[name]).dtype) for name in self.columns
+            ]
+            # horizon arithmetic needs a datetime64 time column
+            k = self.columns.index(self.time_column)
+            self.dtypes[k] = (self.time_column, np.dtype("datetime64[us]"))
+
+        start = 0
+        while start < n:
+            if not self.chunks or not self.chunks[-1].free():
+                self.chunks.append(Chunk(self.dtypes, self.chunk_rows))
+            chunk = self.chunks[-1]
+            k = min(chunk.free(), n - start)
+            chunk.fill(data, start, k)
+            start += k
+        self.rows += n
+        self.retain()
+
+    def retain(self):
+        """Drop sealed chunks beyond the horizon or the row limit"""
+        while len(self.chunks) > 1:
+            oldest = self.chunks[0]
+            expired = self.horizon > 0 and self._age(oldest) > self.horizon
+            too_many = self.max_rows > 0 and len(self) - oldest.rows >= self.max_rows
+            if not (expired or too_many):
+                break
+            self.dropped_rows += oldest.rows
+            self.rows -= oldest.rows
+            self.chunks.pop(0)
+
+    def _age(self, chunk):
+        """Seconds between the newest sample and the last sample in chunk"""
+        newest = self.chunks[-1].view(self.time_column)[-1]
+        last = chunk.view(self.time_column)[-1]
+        return (newest - last) / np.timedelta64(1, "s")
+
+    def clear(self):
+        self.chunks = []
+        self.rows = 0
+
+    def truncate(self, n):
+        """Drop the last n rows, undoes an append"""
+        n = min(n, self.rows)
+        self.rows -= n
+        while n:
+            chunk = self.chunks[-1]
+            k = min(chunk.rows, n)
+            chunk.rows -= k
+            n -= k
+            if not chunk.rows:
+                self.chunks.pop()
+
+    def _last_parts(self, n):
+        """(chunk, first row) pairs holding the last n rows"""
+        parts, rows = [], 0
+        for chunk in reversed(self.chunks):
+            k = min(chunk.rows, n - rows)
+            parts.insert(0, (chunk, chunk.rows - k))
+            rows += k
+            if rows >= n:
+                break
+        return parts
+
+    def tail(self, n):
+        """Last n rows as a DataFrame"""
+        return self._frame(self._last_parts(n))
+
+    def last(self, n):
+        """Last n rows as {column: array}, views unless they span chunks"""
+        parts = self._last_parts(n)
+        if len(parts) == 1:
+            chunk, a = parts[0]
+            return {name: chunk.view(name)[a:] for name in self.columns}
+        if not parts:
+            return {name: np.empty(0) for name in self.columns}
+        return {
+            name: np.concatenate([chunk.view(name)[a:] for chunk, a in parts])
+            for name in self.columns
+        }
+
+    def to_dataframe(self):
+        """All rows in memory as a DataFrame"""
+        return self._frame([(chunk, 0) for chunk in self.chunks])
+
+    def _frame(self, parts):
+        """DataFrame from (chunk, first row) pairs"""
+        if not parts:
+            return pd.DataFrame(columns=self.columns)
+        return pd.DataFrame(
+            {
+                name: np.concatenate([chunk.view(name)[a:] for chunk, a in parts])
+                for name in self.columns
+            },
+            columns=self.columns,
+        )
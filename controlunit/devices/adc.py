@@ -9,13 +9,22 @@ https://www.y2c.co.jp/i2c-r/aio-32-0ra-irc/
 import os
 from pathlib import Path
 import numpy as np
-import pandas as pd
 import time, datetime
 from PyQt5 import QtCore
-from simple_pid import PID
 
 from controlunit.devices.adc_setter import AIO_32_0RA_IRC as adc
 from .device import DeviceThread
+from .ring_buffer import RingBuffer
+from .conversion_plan import ConversionPlan
+from .scan_table import ScanTable
+from .pid_controller import PIDController, ControlTrace, TRACE_COLUMNS, TRACE_DTYPES
+from controlunit.storage import (
+    ADC_COLUMN_DTYPES,
+    make_persistence_worker,
+    BinaryWriter,
+    PersistenceWorker,
+)
+from controlunit.instrumentation import STAGES, timed
 
 
 # MARK: ADC
@@ -23,8 +32,13 @@ class ADC(DeviceThread):
     __IGmode = 0  # Torr
     __IGrange = -3
     send_control_voltage = QtCore.pyqtSignal(float)
+    # control voltage, time.monotonic() of the Ip sample; DirectConnection to MCP4725
+    actuate_plasma_current = QtCore.pyqtSignal(float, float)
     send_zero_adjustment = QtCore.pyqtSignal(dict)
-    set_plasma_current = QtCore.pyqtSignal(float)
+    # setpoint, time.monotonic() of the request
+    set_plasma_current = QtCore.pyqtSignal(float, float)
+    # Sampling Time from the GUI, applied in the worker thread
+    change_sampling_time = QtCore.pyqtSignal(float)
 
     def __init__(self, device_name, app, startTime, config, pi):
         super().__init__(device_name, app, startTime, config, pi)
@@ -49,24 +63,43 @@ class ADC(DeviceThread):
         IGscale: range (scale) of Ionization Gauge in linear mode
         QMS_signal: int, "trigger" on or off. When on emits a signal from GPIO
         """
+        self.sampling_time = self.config["Sampling Time"]
         self.prep_adc_board()
         self.adc_signals_columns = self.config["ADC Signal Names"]
         self.adc_values_columns = (
             self.config["ADC Additional Columns"] + self.config["ADC Signal Names"]
         )
 
-        self.adc_values = pd.DataFrame(columns=self.adc_values_columns)
-        self.converted_values = pd.DataFrame(columns=self.config["ADC Converted Names"])
+        self.adc_converted_columns = self.config["ADC Converted Names"]
+        self.adc_std_columns = self.config.get("ADC Std Names", [])
+        self.buffer = RingBuffer(
+            self.config["ADC Column Names"],
+            self.config.get("ADC Buffer Size", 4096),
+            ADC_COLUMN_DTYPES,
+        )
+        self.conversion_plan = ConversionPlan(
+            [self.adc_channels[name] for name in self.adc_signals_columns],
+            self.__IGmode,
+            self.__IGrange,
+        )
+        self._converted_until = 0
+        # rows before this index were sent to the GUI thread
+        self._sent = 0
+        self.held_batches = 0
+        self.prep_streaming()
+        self.prep_scan_table()
         self.__qmsSignal = 0
         self._mfc_presets = {1: 0.0, 2: 0.0}
         self.plasma_current_setpopint = 0
         self.plasma_current = 0
+        self.sensed_at = time.monotonic()
         self.zero_ip = 0
         self.zero_bu = 0
-        self.sampling_time = self.config["Sampling Time"]
-
         self.connect_signals()
 
+        self.control_config = self.config.get("Plasma Current Control", {})
+        self.prep_pid()
+
         # handle data storage within this thread
         self.datapath = Path(self.config["Data Folder"])
         self.create_file()
@@ -74,6 +107,7 @@ class ADC(DeviceThread):
     def connect_signals(self):
         """connect signals"""
         self.set_plasma_current.connect(self._set_plasma_current)
+        self.change_sampling_time.connect(self.set_sampling_time)
 
     def prep_adc_board(self):
         """
@@ -81,7 +115,13 @@ class ADC(DeviceThread):
         Address: 0x49, 0x3E
         Why this addresses?
         """
-        self.aio = adc(0x49, 0x3E)
+        self.aio = adc(
+            0x49,
+            0x3E,
+            self.config.get("ADC Conversion Wait", "sleep"),
+            self.pi,
+            self.config.get("ADC Alert GPIO"),
+        )
 
         self.gain_definitions = {
             10: self.aio.PGA.PGA_10_0352V,
@@ -93,8 +133,118 @@ class ADC(DeviceThread):
         self.adc_channels = self.config["Adc Channel Properties"]
         for _, j in self.adc_channels.items():
             j.gain = self.gain_definitions[j.gainIndex]
+        self.scan_channels = [ch.channel for ch in self.adc_channels.values()]
+        self.ip_index = list(self.adc_channels).index("Ip")
+        # oversampling is reduced in AIO_32_0RA_IRC.scan, on the raw block
+        self.scan_samples = [ch.oversampling for ch in self.adc_channels.values()]
+        self.scan_reduce = [ch.reduce for ch in self.adc_channels.values()]
+        self.std_index = [
+            k for k, ch in enumerate(self.adc_channels.values()) if ch.keep_std
+        ]
+        self.adc_std = np.zeros(len(self.std_index))
+
+    def prep_streaming(self):
+        """
+        Continuous-conversion streaming of one fast channel (`ADC Streaming`).
+        Between slow scans of the other channels the fast channel is read
+        at 860 SPS into preallocated arrays, then into `self.fast_buffer`
+        with per-sample timestamps, and saved to `cu_*_fast`.
+        """
+        self.streaming = self.config.get("ADC Streaming", False)
+        if not self.streaming:
+            return
+        name = self.config.get("ADC Streaming Channel", "Ip")
+        self.fast_name = name
+        self.fast_index = list(self.adc_channels).index(name)
+        self.fast_datarate = self.aio.DataRate.DR_860SPS
+        self.fast_plan = ConversionPlan(
+            [self.adc_channels[name]], self.__IGmode, self.__IGrange
+        )
+
+        self.fast_columns = ["date", "time", name, name + "_c"]
+        self.fast_buffer = None
+        # longest burst between event loop turns
+        self.stream_slice = self.config.get("ADC Streaming Slice", 0.02)
+        self.size_fast_buffers()
+        # wall clock of time.monotonic() samples
+        self._clock = (np.datetime64(datetime.datetime.now(), "us"), time.monotonic())
+        self.fast_latest = 0.0
+
+    def size_fast_buffers(self):
+        """
+        Burst arrays and fast ring buffer for the current Sampling Time.
+        The ring buffer only grows, it is replaced while empty.
+        """
+        # one burst, with margin for a fast ADC clock
+        burst = max(self.stream_slice, self.sampling_time)
+        size = int(np.ceil(burst * 860 * 1.2)) + 1
+        self.fast_volts = np.zeros(size)
+        self.fast_times = np.zeros(size)
+        capacity = max(self.config.get("ADC Buffer Size", 4096), 4 * self.STEP * size)
+        if self.fast_buffer is None or self.fast_buffer.capacity < capacity:
+            self.fast_buffer = RingBuffer(
+                self.fast_columns, capacity, ADC_COLUMN_DTYPES
+            )
+
+    def prep_scan_table(self):
+        """
+        Channels read at each tick, from `Rate` of the ADC Channels.
+        Channels not read are NaN in the row, so slow signals are stored
+        sparse and the scan time goes to the faster channels.
+        """
+        self.scan_table = self.build_scan_table(self.sampling_time)
+
+    def build_scan_table(self, sampling_time):
+        """ScanTable for ticks of sampling_time, ValueError if a Rate is too high"""
+        rates = [ch.rate for ch in self.adc_channels.values()]
+        indices = list(range(len(rates)))
+        if self.streaming:
+            del rates[self.fast_index], indices[self.fast_index]
+        return ScanTable(rates, 1 / sampling_time, indices)
+
+    def channel_rates(self):
+        """Rate of every channel in the rows, Hz"""
+        rates = np.full(len(self.adc_channels), 1 / self.sampling_time)
+        rates[self.scan_table.indices] = self.scan_table.rates()
+        return rates
 
     # MARK: Setters
+    @QtCore.pyqtSlot(float)
+    def set_sampling_time(self, sampling_time):
+        """
+        Change Sampling Time while acquiring.
+        The scan table and the PID period follow the new tick, and a new
+        data file is started so that its header matches the rows.
+        Refused when a channel Rate is above the new tick rate.
+        """
+        if sampling_time == self.sampling_time:
+            super().set_sampling_time(sampling_time)
+            return
+        try:
+            table = self.build_scan_table(sampling_time)
+        except ValueError as ex:
+            self.send_message.emit(
+                f"<font color='red'>{self.device_name}</font> sampling time"
+                f" {sampling_time} s refused, {ex}; kept {self.sampling_time} s"
+            )
+            return
+        # rows of the old rates go to the old file
+        self.send_processed_data_to_main_thread()
+        self.close_file()
+        self.aio.reset_stats()
+        super().set_sampling_time(sampling_time)
+        self.scan_table = table
+        if self.streaming:
+            self.size_fast_buffers()
+            self.control_source = (self.fast_buffer, self.fast_name)
+            self.reset_control_clock()
+        self.update_control_period()
+        self.create_file()
+        self.send_message.emit(
+            f"<font color='blue'>{self.device_name}</font> sampling time"
+            f" {sampling_time} s"
+        )
+
     def set_ig_mode(self, IGmode: int):
         """
         Sets Ionization Gauge mode from GUI
@@ -132,8 +282,10 @@ class ADC(DeviceThread):
 
     @QtCore.pyqtSlot(list)
     def update_mfcs(self, arg):
-        mfc_num, voltage_preset = arg
+        mfc_num, voltage_preset = arg[:2]
         self.set_mfc_preset(voltage_preset, mfc_num)
+        if len(arg) > 2:
+            self.record_setpoint_latency(arg[2])
 
     def set_adc_gain(self, gain):
         """
@@ -163,11 +315,41 @@ class ADC(DeviceThread):
     # MARK: Data saving
     def create_file(self):
         """Create a file for ADC data"""
-        fname = f"cu_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        fname = f"cu_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
         self.datapath.mkdir(parents=True, exist_ok=True)
-        self.savepath = self.datapath / fname
-        with open(self.savepath, "w") as f:
-            f.writelines(self.generate_header())
+        # a file after a Sampling Time change can start in the same second
+        base, k = fname, 1
+        while any(self.datapath.glob(f"{fname}.*")):
+            k += 1
+            fname = f"{base}_{k}"
+        self.writer = make_persistence_worker(
+            self.config,
+            self.datapath / fname,
+            self.config["ADC Column Names"],
+            self.generate_header(),
+            {name: column.dtype for name, column in self.buffer.data.items()},
+        )
+        self.savepath = self.writer.path
+        self._write_errors = {}
+        self.trace = None
+        if self.control_config.get("Trace", True):
+            writer = BinaryWriter(
+                self.datapath / f"{fname}_pid",
+                TRACE_COLUMNS,
+                self.generate_trace_header(),
+                TRACE_DTYPES,
+            )
+            self.trace = ControlTrace(
+                PersistenceWorker(writer, self.config.get("Writer Queue Size", 1000))
+            )
+        if self.streaming:
+            self.fast_writer = make_persistence_worker(
+                self.config,
+                self.datapath / f"{fname}_fast",
+                self.fast_columns,
+                self.generate_fast_header(),
+                {name: column.dtype for name, column in self.fast_buffer.data.items()},
+            )
         message = (
             f"<font size=4 color='blue'>{self.device_name}</font>"
             f" savepath:<br> {self.savepath}"
@@ -182,208 +364,449 @@ class ADC(DeviceThread):
             f"# Columns , {', '.join(self.config['ADC Column Names'])}\n",
             f"# Signals , {', '.join(self.config['ADC Signal Names'])}\n",
             f"# Channels , {', '.join([str(i) for i in self.config['ADC Channel Numbers']])}\n",
-            "# For converted signals '_c' is added\n",
+            f"# Rates , {', '.join(f'{r:g}' for r in self.channel_rates())} Hz\n",
+            f"# Oversampling , {', '.join(map(str, self.scan_samples))}\n",
+            f"# Reduce , {', '.join(self.scan_reduce)}\n",
+            "# For converted signals '_c' is added,"
+            " for standard deviations of oversampled signals '_std'\n",
+            "# Signals are empty in rows where they were not sampled\n",
             "#\n",
             "# [Data]\n",
         ]
 
+    def generate_fast_header(self):
+        """Generate header lines for the fast channel file"""
+        channel = self.adc_channels[self.fast_name].channel
+        return [
+            "# Title , Control Unit ADC fast channel\n",
+            f"# Date , {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+            f"# Columns , {', '.join(self.fast_columns)}\n",
+            f"# Signals , {self.fast_name}\n",
+            f"# Channels , {channel}\n",
+            "# Data Rate , 860 SPS continuous\n",
+            "#\n",
+            "# [Data]\n",
+        ]
+
+    def generate_trace_header(self):
+        """Generate header lines for the controller trace"""
+        kp, ki, kd = self.controller.default_tunings
+        return [
+            "# Title , Control Unit plasma current PID trace\n",
+            f"# Date , {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+            f"# Columns , {', '.join(TRACE_COLUMNS)}\n",
+            f"# Rate , {1 / self.control_period:g} Hz\n",
+            f"# Gains , {kp}, {ki}, {kd}\n",
+            f"# Output Limits , {', '.join(map(str, self.controller.output_limits))}\n",
+            f"# Derivative Filter , {self.controller.derivative_filter} s\n",
+            f"# Gain Schedule , {self.controller.schedule}\n",
+            "#\n",
+            "# [Data]\n",
+        ]
+
+    @timed("save")
     def save_data(self, data):
-        """Append data to file"""
-        data.to_csv(self.savepath, mode="a", header=False, index=False)
+        """Queue data for the background writer, never waits for the disk"""
+        self.writer.write(data)
+        self.report_write_errors(self.writer)
+
+    def report_write_errors(self, writer):
+        """Log new errors of the writer thread, the run is not being saved"""
+        reported = self._write_errors.get(writer.path, 0)
+        if writer.errors == reported:
+            return
+        self._write_errors[writer.path] = writer.errors
+        self.send_log.emit(
+            f"<font color='red'>{self.device_name}</font> {writer.path}:"
+            f" {writer.errors} write errors, {writer.last_error}",
+            "error",
+        )
+
+    def close_file(self):
+        """Write remaining data, close the file and report writer counters"""
+        self.writer.close()
+        if self.trace is not None:
+            self.trace.close()
+        if self.streaming:
+            self.fast_writer.close()
+            stream = self.aio.stream_stats
+            self.send_log.emit(
+                f"<font color='blue'>{self.device_name}</font>"
+                f" {self.fast_name}: {stream['samples']} fast samples"
+                f" in {stream['bursts']} bursts, {stream['skipped']} skipped",
+                "debug",
+            )
+        stats = self.writer.stats()
+        self.send_message.emit(
+            f"<font color='blue'>{self.device_name}</font> saved {stats['rows']} rows,"
+            f" dropped {stats['dropped']} batches, {stats['errors']} errors,"
+            f" max write latency {stats['max latency']*1000:.0f} ms"
+        )
+        scan = self.aio.scan_stats
+        self.send_log.emit(
+            f"<font color='blue'>{self.device_name}</font> {scan['scans']} scans,"
+            f" {scan['transactions'] / max(scan['scans'], 1):.1f} I2C transactions"
+            f" and {scan['mux writes'] / max(scan['scans'], 1):.1f} mux writes per scan,"
+            f" mean latency {scan['total latency'] / max(scan['scans'], 1)*1000:.1f} ms,"
+            f" max {scan['max latency']*1000:.1f} ms,"
+            f" {scan['polls per conversion']:.2f} polls per conversion"
+            f" ({self.aio.ads1115.wait_mode})",
+            "debug",
+        )
 
     # MARK: Data append
-    def put_new_data_in_dataframe(self):
+    @timed("buffer")
+    def put_new_data_in_buffer(self):
         """
-        Put new data from ADC and GUI into pandas dataframe
+        Write new data from ADC and GUI into the ring buffer, in place
         """
         now = datetime.datetime.now()
         dSec = (now - self.__startTime).total_seconds()
-        new_data_row = pd.DataFrame(
-            np.atleast_2d(
-                [
-                    now,
-                    dSec,
-                    self.__IGmode,
-                    self.__IGrange,
-                    self.__qmsSignal,
-                    self._mfc_presets[1],
-                    self._mfc_presets[2],
-                    self.plasma_current_setpopint,
-                    *self.adc_voltages.values(),
-                ]
-            ),
-            columns=self.adc_values_columns,
+        self.buffer.append(
+            (
+                now,
+                dSec,
+                self.__IGmode,
+                self.__IGrange,
+                self.__qmsSignal,
+                self._mfc_presets[1],
+                self._mfc_presets[2],
+                self.plasma_current_setpopint,
+                *self.adc_voltages,
+            )
         )
-
-        # self.adc_values = pd.concat([self.adc_values, new_data_row], ignore_index=True)
-        # adjusting the dtypes to remove it FutureWarning
-        self.adc_values = pd.concat(
-            [self.adc_values.astype(new_data_row.dtypes), new_data_row],
-            ignore_index=True,
+        if self.adc_std_columns:
+            self.buffer.set_row(
+                self.buffer.head - 1, self.adc_std_columns, self.adc_std
+            )
+
+    @timed("convert")
+    def update_processed_signals(self):
+        """
+        Convert raw rows not converted yet as one block
+        and write converted values into the ring buffer
+        """
+        start, stop = max(self._converted_until, self.buffer.tail), self.buffer.head
+        if stop <= start:
+            return
+        raw = np.column_stack(
+            [self.buffer.read(name, start, stop) for name in self.adc_signals_columns]
         )
+        converted = self.conversion_plan.convert(raw)
+        for k, name in enumerate(self.adc_converted_columns):
+            self.buffer.write(name, converted[:, k], start)
+        self._converted_until = stop
 
-    def update_processed_signals_dataframe(self):
+    def update_conversion_plan(self):
         """
-        Update processed dataframe with new values
+        Re-plan conversion if IG mode or range changed.
+        Rows recorded with the previous settings are converted first.
         """
-        converted_values = []
-        for name, value in self.adc_voltages.items():
-            conversion = self.adc_channels[name].conversion
-            if conversion.__name__ == "ionization_gauge":
-                converted_values.append(
-                    conversion(value, self.__IGmode, self.__IGrange)
-                )
-            else:
-                converted_values.append(conversion(value))
-
-        converted_values = pd.DataFrame(
-            np.atleast_2d(converted_values), columns=self.config["ADC Converted Names"]
-        )
-
-        # self.converted_values = pd.concat([self.converted_values, converted_values], ignore_index=True)
-        # Fixing FutureError
-        self.converted_values = pd.concat(
-            [self.converted_values.astype(converted_values.dtypes), converted_values],
-            ignore_index=True,
-        )
+        if (self.__IGmode, self.__IGrange) == (
+            self.conversion_plan.ig_mode,
+            self.conversion_plan.ig_scale,
+        ):
+            return
+        self.update_processed_signals()
+        self.conversion_plan.set_ionization_gauge(self.__IGmode, self.__IGrange)
 
     def calculate_averaged_signals(self):
         """
         Calculate averages for the calibrated signals to show them in GUI
         """
-        self.averages = self.converted_values.mean().values
+        self.averages = np.array(
+            [np.nanmean(self.buffer.read(name)) for name in self.adc_converted_columns]
+        )
 
     # MARK: Data send
-    def send_processed_data_to_main_thread(self):
+    def send_processed_data_to_main_thread(self, flush=False):
         """
         Sends processed data to main thread in main.py
-        Clears temporary dataframes to reset memory consumption.
-        """
-        newdata = self.adc_values.join(self.converted_values)
+        Only the range of pending rows is emitted, the GUI reads them
+        from the ring buffer. The writer thread gets its own copy.
+        flush: send the rows even if the GUI is still busy
+        """
+        self.update_processed_signals()
+        start, stop = self.buffer.consume()
+        started = STAGES.start()
+        newdata = self.buffer.block(start, stop, copy=True)
+        STAGES.stop("copy", started)
         self.save_data(newdata)
-        self.data_ready.emit([newdata, self.device_name])
-        self.clear_datasets()
-
-    # MARK: Data clear
-    def clear_datasets(self):
-        """
-        Remove data from temporary dataframes
-        """
-        self.adc_values = self.adc_values.iloc[0:0]
-        self.converted_values = self.converted_values.iloc[0:0]
+        self.emit_rows(flush)
+        if self.streaming:
+            start, stop = self.fast_buffer.consume()
+            self.fast_writer.write(self.fast_buffer.to_dataframe(start, stop))
+            self.report_write_errors(self.fast_writer)
+
+    def emit_rows(self, flush=False):
+        """
+        Send the consumed rows not yet sent to the GUI thread.
+        Until the GUI releases the last range, new rows are held and sent
+        later as one range: a busy GUI gets fewer, larger batches.
+        """
+        stop = self.buffer.tail
+        if stop == self._sent:
+            return
+        if not flush and self.buffer.released < self._sent:
+            self.held_batches += 1
+            return
+        started = STAGES.start()
+        self.data_ready.emit([(self._sent, stop), self.device_name])
+        STAGES.stop("emit", started)
+        self._sent = stop
 
     # MARK: plasma current
 
     def set_zero_ip(self):
         """set zero Ip"""
-        if self.converted_values["Ip_c"].mean() is not np.nan:
-            self.zero_ip = self.converted_values["Ip_c"].mean()
+        # converted values exist up to the last sent batch
+        stop = self._converted_until
+        recent = self.buffer.read("Ip_c", stop - self.STEP, stop)
+        recent = recent[np.isfinite(recent)]
+        if recent.size:
+            self.zero_ip = recent.mean()
         self.send_zero_adjustment.emit({"Ip": self.zero_ip, "Bu": self.zero_bu})
 
-    def set_cathode_current(self, control_voltage):
-        """Send cathode control voltage to main thread"""
+    def set_cathode_current(self, control_voltage, sensed=None):
+        """
+        Send cathode control voltage to the MCP4725 worker directly,
+        the main thread only observes it.
+        sensed: time.monotonic() of the Ip sample, None if not a PID output
+        """
         self.plasma_current_setpopint = control_voltage
+        if sensed is None:
+            sensed = time.monotonic()
+        self.actuate_plasma_current.emit(control_voltage, sensed)
         self.send_control_voltage.emit(control_voltage)
 
-    @QtCore.pyqtSlot(float)
-    def _set_plasma_current(self, plasma_current_setpopint):
-        """set dac voltage, controlling cathode current"""
-        self.plasma_current_setpopint = plasma_current_setpopint
-        self.pid.setpoint = self.plasma_current_setpopint
-        if plasma_current_setpopint == 0:
+    @QtCore.pyqtSlot(float, float)
+    def _set_plasma_current(self, plasma_current_setpoint, requested):
+        """set plasma current setpoint, 0 turns control off"""
+        self.record_setpoint_latency(requested)
+        if not self.controller.setpoint:
+            # start from the newest sample, not from rows recorded before
+            self.reset_control_clock()
+        self.controller.set_setpoint(plasma_current_setpoint)
+        if plasma_current_setpoint == 0:
             self.reset_current_control()
         return
 
     def reset_current_control(self):
-        self.prep_pid()
+        self.controller.reset()
         self.set_cathode_current(0)
 
     def update_pid_coefficients(self, pid_coefficients):
         """update pid"""
-        # self.pid.Ki = 1.0
-        self.pid.tunings = pid_coefficients
-        # self.signal_send_pid.emit(self.pid.tunings)
+        self.controller.set_tunings(*pid_coefficients)
 
     def prep_pid(self):
         """
-        Set PID parameters
-        ouptput is control voltage, from 0 to 5000 V.
+        Set PID parameters from "Plasma Current Control" in settings.yml.
+        Output is control voltage in mV.
+        The controller runs at its own rate, independent of STEP batching.
         """
-        p, i, d = 1, 0, 0
-        self.pid = PID(p, i, d, setpoint=self.plasma_current_setpopint)
-        self.pid.output_limits = (0, 2600)
-        self.pid.sample_time = self.sampling_time * self.STEP
-        # self.signal_send_pid.emit(self.pid.tunings)
-
+        config = self.control_config
+        self.controller = PIDController(
+            *config.get("Gains", [1, 0, 0]),
+            output_limits=config.get("Output Limits", [0, 2600]),
+            derivative_filter=config.get("Derivative Filter", 0.0),
+            schedule=config.get("Gain Schedule", []),
+        )
+        self.update_control_period()
+        if self.streaming:
+            self.control_source = (self.fast_buffer, self.fast_name)
+        else:
+            self.control_source = (self.buffer, "Ip")
+        self.reset_control_clock()
+
+    def update_control_period(self):
+        """PID period from its Rate, not shorter than the period of Ip samples"""
+        rate = self.control_config.get("Rate", 1 / self.sampling_time)
+        if not self.streaming:
+            rate = min(rate, self.channel_rates()[self.ip_index])
+        self.control_period = 1 / rate
+
+    def reset_control_clock(self):
+        """Use only Ip samples from now on"""
+        self._control_read = self.control_source[0].head
+        self._control_next = None
+        self._control_last = None
+
+    @timed("control")
     def plasma_current_control(self):
         """
-        PID control plasma current
-        """
-        output = self.pid(self.plasma_current - self.zero_ip)
-        self.set_cathode_current(output)
-        #print(self.pid.components)
+        PID control plasma current.
+        Steps the controller at its own rate on raw Ip samples
+        not used yet, the newest output goes to the DAC.
+        """
+        buffer, name = self.control_source
+        start = max(self._control_read, buffer.head - buffer.capacity)
+        stop = buffer.head
+        self._control_read = stop
+        if stop <= start:
+            return
+        times = buffer.read("time", start, stop)
+        values = buffer.read(name, start, stop)
+        # rows where Ip was not sampled, see prep_scan_table
+        sampled = np.isfinite(values)
+        if not sampled.all():
+            times, values = times[sampled], values[sampled]
+            if not times.size:
+                return
+        used = None
+        for t, value in zip(times, values):
+            # samples are not exactly on the control grid, allow some jitter
+            early = 0.1 * self.control_period
+            if self._control_next is not None and t < self._control_next - early:
+                continue
+            if self._control_last is None:
+                dt = self.control_period
+            else:
+                dt = t - self._control_last
+            measurement = value - self.zero_ip
+            output = self.controller.step(measurement, dt)
+            if self.trace is not None:
+                self.trace.append(
+                    t,
+                    self.controller.setpoint,
+                    measurement,
+                    *self.controller.components,
+                    output,
+                )
+            self._control_last = t
+            if (
+                self._control_next is None
+                or t >= self._control_next + self.control_period
+            ):
+                self._control_next = t
+            self._control_next += self.control_period
+            used = t
+        if used is not None:
+            # sensed_at belongs to the newest sample
+            sensed = self.sensed_at - (times[-1] - used)
+            self.set_cathode_current(self.controller.output, sensed)
 
     # MARK: start
     @QtCore.pyqtSlot()
     def start(self):
         """
-        Start acquisition loop
+        Start acquisition, ticks are driven by the thread event loop
         """
-        self.acquisition_loop()
+        fallback = self.aio.ads1115.wait_mode_fallback
+        if fallback:
+            self.send_message.emit(
+                f"<font color='red'>{self.device_name}</font> {fallback}"
+            )
+        self._step = 0
+        self.idling = self.streaming
+        self.start_ticks()
 
     # MARK: read voltages
+    @timed("read")
     def collect_data(self):
         """
-        Read ADC voltages for selected channels
+        Read ADC voltages for selected channels in one scan
         Can change ADC gain at any time by updating self.adc_channels
         """
-        self.adc_voltages = {
-            ch.name: self.aio.analog_read_volt(ch.channel, *self.adc_datarate, ch.gain)
-            for _, ch in self.adc_channels.items()
-        }
-        self.plasma_current = self.adc_voltages["Ip"]
+        props = list(self.adc_channels.values())
+        row = self.scan_table.next()
+        volts = self.aio.scan(
+            [self.scan_channels[k] for k in row],
+            self.adc_datarate[0],
+            [props[k].gain for k in row],
+            [self.scan_samples[k] for k in row],
+            [self.scan_reduce[k] for k in row],
+        )
+        # channels not in this row of the scan table are not sampled
+        self.adc_voltages = np.full(len(props), np.nan)
+        self.adc_voltages[row] = volts
+        spread = np.full(len(props), np.nan)
+        spread[row] = self.aio.scan_std
+        if self.streaming:
+            self.adc_voltages[self.fast_index] = self.fast_latest
+        self.adc_std = spread[self.std_index]
+        if np.isfinite(self.adc_voltages[self.ip_index]):
+            self.plasma_current = self.adc_voltages[self.ip_index]
+        if not self.streaming:
+            self.sensed_at = time.monotonic()
+
+    def stream_fast_channel(self, duration):
+        """
+        Stream the fast channel in continuous mode for duration seconds
+        and append the samples to self.fast_buffer
+        """
+        if duration <= 0:
+            return
+        channel = self.adc_channels[self.fast_name]
+        n = self.aio.stream(
+            channel.channel,
+            self.fast_datarate,
+            channel.gain,
+            duration,
+            self.fast_volts,
+            self.fast_times,
+        )
+        if n == 0:
+            return
+        volts = self.fast_volts[:n]
+        wall, monotonic = self._clock
+        offset = self.fast_times[:n] - monotonic
+        dates = wall + (offset * 1e6).astype("timedelta64[us]")
+        start = (wall - np.datetime64(self.__startTime, "us")) / np.timedelta64(1, "s")
+        self.fast_plan.set_ionization_gauge(self.__IGmode, self.__IGrange)
+        self.fast_buffer.extend(
+            {
+                "date": dates,
+                "time": start + offset,
+                self.fast_name: volts,
+                self.fast_name + "_c": self.fast_plan.convert(volts[:, None])[:, 0],
+            }
+        )
+        self.fast_latest = volts[-1]
+        self.sensed_at = self.fast_times[n - 1]
 
-    # MARK: main loop
-    def acquisition_loop(self):
+    # MARK: tick
+    @timed("tick")
+    def tick(self):
         """
-        Reads ADC raw signals in a loop.
-        Convert voltage to units.
-        Send data back to main thread for ploting ad saving.
+        Read ADC raw signals, convert voltage to units.
+        Send data back to main thread for ploting and saving every STEP ticks.
         """
-        totalStep = 0
-        step = 0
-
-        self.prep_pid()
-        # self.set_cathode_current(325)
+        self.set_adc_datarate()
+        self.collect_data()
+        self.update_conversion_plan()
+        self.put_new_data_in_buffer()
 
-        while not (self._abort):
-            time.sleep(self.sampling_time)
-            self.set_adc_datarate()
-            self.collect_data()
-            self.put_new_data_in_dataframe()
-            self.update_processed_signals_dataframe()
+        if self.controller.setpoint:
+            self.plasma_current_control()
 
-            if self.plasma_current_setpopint:
-                self.plasma_current_control()
-
-            if self.STEP == 1:
-                self.send_processed_data_to_main_thread()
-                continue
-
-            if step % (self.STEP - 1) == 0 and step != 0:
-                # self.calculate_averaged_signals()
-                self.send_processed_data_to_main_thread()
-                step = 0
-            else:
-                step += 1
-            totalStep += 1
-            self.__app.processEvents()
-        else:
-            # self.calculate_averaged_signals()
+        if self.STEP == 1:
             self.send_processed_data_to_main_thread()
+            return
 
-        self.sigDone.emit(self.device_name)
-        return
+        if self._step % (self.STEP - 1) == 0 and self._step != 0:
+            self.send_processed_data_to_main_thread()
+            self._step = 0
+        else:
+            self._step += 1
+
+    def idle(self, time_left):
+        """Stream the fast channel in short slices until the deadline"""
+        self.stream_fast_channel(min(time_left, self.stream_slice))
+        if self.controller.setpoint:
+            self.plasma_current_control()
+
+    def finalize(self):
+        """Send remaining rows and close the data files"""
+        self.send_processed_data_to_main_thread(flush=True)
+        self.close_file()
+        self.report_timing()
+        if self.held_batches:
+            self.send_log.emit(
+                f"<font color='blue'>{self.device_name}</font> {self.held_batches}"
+                " batches held while the GUI was busy",
+                "debug",
+            )
 
 
 if __name__ == "__main__":
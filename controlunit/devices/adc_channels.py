@@ -3,7 +3,7 @@ ADC channel properties class.
 """
 
 
-# Conversion of signals is done in devices/adc.py in update_processed_signals_dataframe
+# Conversion of signals is done in devices/adc.py with devices/conversion_plan.py
 class AdcChannelProps:
     """
     ADC channel properties
@@ -21,6 +21,15 @@ class AdcChannelProps:
         self.description = kws["Description"]
         self.conversion_id = kws["Conversion Function"]
         self.full_scale = kws.get("Full Scale", None)
+        # Hz, None: read at every scan, see devices/scan_table.py
+        self.rate = kws.get("Rate", None)
+        # conversions per sample, reduced to their mean or median
+        self.oversampling = int(kws.get("Oversampling", 1))
+        self.reduce = kws.get("Reduce", "mean")
+        if self.reduce not in ["mean", "median"]:
+            raise ValueError(f"{self.name}: Reduce must be mean or median")
+        # save the standard deviation of the conversions as <name>_std
+        self.keep_std = kws.get("Std", False)
         self.set_conversion_function()
         self.gain = None
 
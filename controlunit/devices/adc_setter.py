@@ -1,14 +1,35 @@
 """
 Source:
 https://www.y2c.co.jp/i2c-r/aio-32-0ra-irc/raspberrypi-python/
+
+AIO_32_0RA_IRC.scan reads a list of channels in one call, ordered to
+minimize PCA9554 multiplexer writes. Oversampled channels take N
+conversions in continuous mode, reduced to their mean or median.
+
+ADS1115 conversion wait modes (`ADC Conversion Wait` in settings.yml):
+- poll: read the Config register until the OS bit is set
+- sleep: sleep for the conversion time of the DataRate, then poll
+- alert: wait for the ALERT/RDY pin edge via a pigpio callback, then read
 """
 
+import threading
+import time
+import numpy as np
+
 try:
     import smbus
 except ModuleNotFoundError:
     pass
     from devices.dummy import smbus
 
+try:
+    import pigpio
+except ImportError:
+    from devices.dummy import pigpio
+
+# scan plans kept, a multi-rate scan table has a few distinct rows
+MAX_SCAN_PLANS = 64
+
 
 class PCA9554:
     class Register:
@@ -21,12 +42,15 @@ class PCA9554:
 
     def __init__(self, address):
         self.address = address
+        self.transactions = 0
 
     def set_direction(self, value):
         self.i2c.write_byte_data(self.address, self.Register.Configuration, value)
+        self.transactions += 1
 
     def write(self, value):
         self.i2c.write_byte_data(self.address, self.Register.OutputPort, value)
+        self.transactions += 1
 
 
 class ADS1115:
@@ -73,37 +97,165 @@ class ADS1115:
         DR_860SPS = 7
 
     class ComparatorQueue:
+        AssertAfterOne = 0x00
         Disable = 0x03
 
+    # Nominal samples per second of DataRate
+    SamplesPerSecond = [8, 16, 32, 64, 128, 250, 475, 860]
+    # the internal oscillator may run up to 10 % slow
+    ClockTolerance = 0.1
+    WaitModes = ["poll", "sleep", "alert"]
+
     i2c = smbus.SMBus(1)
 
-    def __init__(self, address):
+    def __init__(self, address, wait_mode="poll", pi=None, alert_pin=None):
+        """
+        Parameters
+        ----------
+        address: int
+            I2C address
+        wait_mode: str
+            conversion wait: poll, sleep, or alert
+        pi: pigpio.pi
+            used in alert mode for ALERT/RDY edge callbacks
+        alert_pin: int
+            GPIO connected to ALERT/RDY
+
+        An unusable wait mode falls back to poll or sleep, the reason is
+        kept in `wait_mode_fallback` for the owner to log.
+        """
         self.address = address
+        self.transactions = 0
+        self.conversions = 0
+        self.polls = 0
+        self.alert_timeouts = 0
+        self.wait_mode_fallback = None
+        if wait_mode not in self.WaitModes:
+            self.wait_mode_fallback = (
+                f"ADS1115 wait mode {wait_mode} is not supported, using poll"
+            )
+            wait_mode = "poll"
+        if wait_mode == "alert" and (pi is None or alert_pin is None):
+            self.wait_mode_fallback = (
+                "ADS1115 alert mode needs pigpio and an ALERT/RDY pin, using sleep"
+            )
+            wait_mode = "sleep"
+        self.wait_mode = wait_mode
+        self.ready = threading.Event()
+        if wait_mode == "alert":
+            self.prep_alert(pi, alert_pin)
+
+    def prep_alert(self, pi, alert_pin):
+        """
+        Use ALERT/RDY as conversion ready: Hi_thresh MSB set, Lo_thresh MSB clear.
+        The pin is pulled low at the end of each conversion.
+        Words are byte-swapped for SMBus, as in analog_read.
+        """
+        self.i2c.write_word_data(self.address, self.Register.HiThresh, 0x0080)
+        self.i2c.write_word_data(self.address, self.Register.LoThresh, 0x0000)
+        self.transactions += 2
+        pi.set_mode(alert_pin, pigpio.INPUT)
+        self.alert_callback = pi.callback(
+            alert_pin, pigpio.FALLING_EDGE, self._on_alert
+        )
 
-    def analog_read(self, mux, data_rate, pga):
+    def _on_alert(self, gpio, level, tick):
+        self.ready.set()
+
+    def conversion_time(self, data_rate):
+        """Nominal conversion time in seconds"""
+        return 1 / self.SamplesPerSecond[data_rate]
+
+    def wait_conversion(self, data_rate):
+        """Wait until the single-shot conversion is ready"""
+        if self.wait_mode == "alert":
+            # the clock may run 10 % slow, allow twice the conversion time
+            if self.ready.wait(2 * self.conversion_time(data_rate)):
+                return
+            self.alert_timeouts += 1
+        elif self.wait_mode == "sleep":
+            time.sleep(self.conversion_time(data_rate))
+
+        data = 0
+        while data & 0x80 == 0:
+            data = self.i2c.read_byte_data(self.address, 1)
+            self.transactions += 1
+            self.polls += 1
+
+    def polls_per_conversion(self):
+        return self.polls / max(self.conversions, 1)
+
+    def write_config(self, mux, data_rate, pga, mode):
+        """Write Config register, starts a conversion"""
+        comparator = self.ComparatorQueue.Disable
+        if self.wait_mode == "alert":
+            comparator = self.ComparatorQueue.AssertAfterOne
+            self.ready.clear()
         self.i2c.write_word_data(
             self.address,
             self.Register.Config,
             data_rate << 13
-            | self.ComparatorQueue.Disable << 8
+            | comparator << 8
             | self.SingleShotCoversion.Begin << 7
             | mux << 4
             | pga << 1
-            | self.Mode.PowerDownSingleShot,
+            | mode,
         )
+        self.transactions += 1
 
-        data = 0
-        while data & 0x80 == 0:
-            data = self.i2c.read_byte_data(self.address, 1)
-
-        self.i2c.write_byte_data(self.address, self.Register.Conversion, 1)
-
+    def read_conversion(self):
+        """Read Conversion register as a signed count"""
         word_data = self.i2c.read_word_data(self.address, self.Register.Conversion)
+        self.transactions += 1
         data = (word_data << 8) & 0xFF00 | (word_data >> 8) & 0xFF
         if data >= 0x8000:
             data -= 0x10000
         return data
 
+    def analog_read(self, mux, data_rate, pga):
+        self.write_config(mux, data_rate, pga, self.Mode.PowerDownSingleShot)
+
+        self.wait_conversion(data_rate)
+        self.conversions += 1
+
+        self.i2c.write_byte_data(self.address, self.Register.Conversion, 1)
+        self.transactions += 1
+
+        return self.read_conversion()
+
+    # MARK: continuous
+    def start_continuous(self, mux, data_rate, pga):
+        """
+        Start continuous conversions.
+        Returns the origin of the conversion grid: conversion k is due at
+        start + (k + 1) * conversion_time. The origin is late by the clock
+        tolerance of one conversion, so even on a slow oscillator the first
+        read is not the last conversion of the previous channel.
+        The next analog_read returns the board to single-shot mode.
+        """
+        self.write_config(mux, data_rate, pga, self.Mode.Continuous)
+        margin = self.ClockTolerance * self.conversion_time(data_rate)
+        return time.monotonic() + margin
+
+    def wait_continuous(self, deadline):
+        """
+        Wait for the next continuous conversion.
+        The OS bit does not report conversions in continuous mode,
+        so wait for ALERT/RDY or until the expected deadline.
+        Returns time.monotonic() of the conversion.
+        """
+        if self.wait_mode == "alert":
+            period = 1 / self.SamplesPerSecond[-1]
+            timeout = max(deadline - time.monotonic(), 0) + period
+            if self.ready.wait(timeout):
+                self.ready.clear()
+                return time.monotonic()
+            self.alert_timeouts += 1
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return deadline
+
 
 class AIO_32_0RA_IRC:
     class PGA:
@@ -124,38 +276,277 @@ class AIO_32_0RA_IRC:
 
     multiplexerSettings = 0xFF
 
-    def __init__(self, ads1115_address, pca9554_address):
-        self.ads1115 = ADS1115(ads1115_address)
+    def __init__(
+        self,
+        ads1115_address,
+        pca9554_address,
+        wait_mode="poll",
+        pi=None,
+        alert_pin=None,
+    ):
+        self.ads1115 = ADS1115(ads1115_address, wait_mode, pi, alert_pin)
         self.multiplexer = PCA9554(pca9554_address)
         self.multiplexerSettings = 0xFF
         self.multiplexer.write(self.multiplexerSettings)
         self.multiplexer.set_direction(0)
-
-    def analog_read(self, channel, data_rate, pga):
+        # plans of the channel lists scanned so far, one per scan table row
+        self._scan_plans = {}
+        # [(channel, data_rate, pga), start, conversion] of continuous mode
+        self._stream = None
+        self.reset_stats()
+        # conversions of one oversampled channel, and their std per channel
+        self._block = np.zeros(16)
+        self.scan_std = np.zeros(0)
+
+    def reset_stats(self):
+        """Restart the scan and stream counters, with a new data file"""
+        self.scan_stats = {
+            "scans": 0,
+            "mux writes": 0,
+            "transactions": 0,
+            "last transactions": 0,
+            "last latency": 0.0,
+            "max latency": 0.0,
+            "total latency": 0.0,
+            "polls per conversion": 0.0,
+        }
+        self.stream_stats = {"bursts": 0, "samples": 0, "skipped": 0}
+        self.ads1115.conversions = 0
+        self.ads1115.polls = 0
+
+    def channel_mux(self, channel):
+        """
+        Multiplexer setting for a channel
+        Returns (bank, nibble, adcMux): bank 0 uses the low nibble of PCA9554,
+        bank 1 the high nibble, bank None a full byte in nibble.
+        Channels 32-63 select the same nibble as channel & 0x0F and
+        leave the other bank untouched.
+        """
         if channel < 16:
-            extMux = (self.multiplexerSettings & 0xF0) | channel
-            adcMux = ADS1115.Mux.Ain0_Gnd
+            return 0, channel, ADS1115.Mux.Ain0_Gnd
         elif channel < 32:
-            extMux = (self.multiplexerSettings & 0x0F) | (channel & 0x0F) << 4
-            adcMux = ADS1115.Mux.Ain1_Gnd
+            return 1, channel & 0x0F, ADS1115.Mux.Ain1_Gnd
         elif channel < 48:
-            extMux = (self.multiplexerSettings & 0xF0) | channel
-            adcMux = ADS1115.Mux.Ain0_Ain3
+            return 0, channel & 0x0F, ADS1115.Mux.Ain0_Ain3
         elif channel < 64:
-            extMux = (self.multiplexerSettings & 0x0F) | (channel & 0x0F) << 4
-            adcMux = ADS1115.Mux.Ain1_Ain3
+            return 1, channel & 0x0F, ADS1115.Mux.Ain1_Ain3
         elif channel < 256:
-            return 0
-        else:
-            extMux = channel & 0xFF
-            adcMux = ADS1115.Mux.Ain0_Ain1
-
-        if self.multiplexerSettings != extMux:
-            self.multiplexer.write(extMux)
-            self.multiplexerSettings = extMux
+            return None, None, None
+        return None, channel & 0xFF, ADS1115.Mux.Ain0_Ain1
 
+    def analog_read(self, channel, data_rate, pga):
+        self._stream = None
+        adcMux = self.select_channel(channel)
+        if adcMux is None:
+            return 0
         return self.ads1115.analog_read(adcMux, data_rate, pga)
 
+    # MARK: scan
+    def plan_scan(self, channels):
+        """
+        Order reads of channels to minimize multiplexer writes.
+
+        Channels on Ain0 (low nibble) and Ain1 (high nibble) are paired,
+        so one PCA9554 write selects two channels.
+        Returns list of (extMux, [(index, adcMux), ...]), extMux None: no write.
+        """
+        banks = {0: [], 1: []}
+        steps = []
+        for index, channel in enumerate(channels):
+            bank, nibble, adc_mux = self.channel_mux(channel)
+            if bank is None and adc_mux is not None:
+                steps.append((nibble, [(index, adc_mux)]))
+            elif bank is not None:
+                banks[bank].append((index, nibble, adc_mux))
+
+        # Keep the nibble already selected first in each bank
+        setting = self.multiplexerSettings
+        current = {0: setting & 0x0F, 1: (setting >> 4) & 0x0F}
+        for bank, reads in banks.items():
+            reads.sort(key=lambda read: read[1] != current[bank])
+
+        for k in range(max(len(banks[0]), len(banks[1]))):
+            pair = [banks[b][k] for b in [0, 1] if k < len(banks[b])]
+            for b in [0, 1]:
+                if k < len(banks[b]):
+                    current[b] = banks[b][k][1]
+            ext_mux = current[1] << 4 | current[0]
+            steps.append((ext_mux, [(index, adc_mux) for index, _, adc_mux in pair]))
+        return steps
+
+    def scan(
+        self,
+        channels,
+        data_rate=DataRate.DR_860SPS,
+        gains=None,
+        samples=None,
+        reduce=None,
+    ):
+        """
+        Read channels in one scan.
+
+        Parameters
+        ----------
+        channels: list
+            channel numbers
+        data_rate: int
+            DataRate for all channels
+        gains: list
+            PGA for each channel, PGA_10_0352V by default
+        samples: list
+            conversions for each channel, 1 by default
+        reduce: list
+            "mean" or "median" for each oversampled channel, mean by default
+
+        Returns
+        -------
+        volts: np.ndarray, in the order of channels
+            standard deviations of oversampled channels go to self.scan_std
+        """
+        start = time.perf_counter()
+        transactions = self.transactions
+        self._stream = None
+        key = tuple(channels)
+        plan = self._scan_plans.get(key)
+        if plan is None:
+            if len(self._scan_plans) >= MAX_SCAN_PLANS:
+                self._scan_plans.clear()
+            plan = self._scan_plans[key] = self.plan_scan(channels)
+        if gains is None:
+            gains = [self.PGA.PGA_10_0352V] * len(channels)
+
+        counts = np.zeros(len(channels))
+        spread = np.zeros(len(channels))
+        for ext_mux, reads in plan:
+            if ext_mux is not None and ext_mux != self.multiplexerSettings:
+                self.multiplexer.write(ext_mux)
+                self.multiplexerSettings = ext_mux
+                self.scan_stats["mux writes"] += 1
+            for index, adc_mux in reads:
+                n = samples[index] if samples else 1
+                if n <= 1:
+                    counts[index] = self.ads1115.analog_read(
+                        adc_mux, data_rate, gains[index]
+                    )
+                    continue
+                block = self.oversample(adc_mux, data_rate, gains[index], n)
+                median = reduce is not None and reduce[index] == "median"
+                counts[index] = np.median(block) if median else block.mean()
+                spread[index] = block.std()
+        volt_per_count = np.array([self.volt_per_count(pga) for pga in gains])
+        volts = counts * volt_per_count
+        self.scan_std = spread * volt_per_count
+
+        latency = time.perf_counter() - start
+        stats = self.scan_stats
+        stats["scans"] += 1
+        stats["last latency"] = latency
+        stats["max latency"] = max(stats["max latency"], latency)
+        stats["total latency"] += latency
+        stats["last transactions"] = self.transactions - transactions
+        stats["transactions"] += self.transactions - transactions
+        stats["polls per conversion"] = self.ads1115.polls_per_conversion()
+        return volts
+
+    def oversample(self, adc_mux, data_rate, pga, n):
+        """
+        n conversions of the selected input in continuous mode,
+        counts in a view of a preallocated array.
+        Reads are spaced for the slowest oscillator, so none of them
+        repeats a conversion or returns one of the previous channel.
+        """
+        if len(self._block) < n:
+            self._block = np.zeros(n)
+        block = self._block[:n]
+        period = self.ads1115.conversion_time(data_rate)
+        period *= 1 + self.ads1115.ClockTolerance
+        start = self.ads1115.start_continuous(adc_mux, data_rate, pga)
+        for k in range(n):
+            self.ads1115.wait_continuous(start + (k + 1) * period)
+            block[k] = self.ads1115.read_conversion()
+        return block
+
+    # MARK: stream
+    def select_channel(self, channel):
+        """Set the PCA9554 multiplexer for channel, returns the ADS1115 mux"""
+        bank, nibble, adc_mux = self.channel_mux(channel)
+        if bank == 0:
+            ext_mux = (self.multiplexerSettings & 0xF0) | nibble
+        elif bank == 1:
+            ext_mux = (self.multiplexerSettings & 0x0F) | nibble << 4
+        else:
+            ext_mux = nibble
+        if ext_mux is not None and ext_mux != self.multiplexerSettings:
+            self.multiplexer.write(ext_mux)
+            self.multiplexerSettings = ext_mux
+        return adc_mux
+
+    def stream(self, channel, data_rate, pga, duration, volts, times):
+        """
+        Read one channel in continuous mode.
+        Consecutive calls for the same channel keep the board converting
+        and continue its conversion grid; any other read ends the stream.
+
+        Parameters
+        ----------
+        channel: int
+            channel number
+        data_rate: int
+            DataRate, DR_860SPS for the fastest sampling
+        pga: int
+            PGA of the channel
+        duration: float
+            seconds to stream
+        volts, times: np.ndarray
+            preallocated output, voltages and time.monotonic() of each conversion
+
+        Returns
+        -------
+        n: int, samples written into volts and times
+        """
+        period = self.ads1115.conversion_time(data_rate)
+        setting = (channel, data_rate, pga)
+        if self._stream is None or self._stream[0] != setting:
+            adc_mux = self.select_channel(channel)
+            start = self.ads1115.start_continuous(adc_mux, data_rate, pga)
+            self._stream = [setting, start, 0]
+        # continue the conversion grid of the previous call
+        _, start, conversion = self._stream
+        stop = time.monotonic() + duration
+        n = 0
+        while n < len(volts):
+            # a late read returns the newest conversion, skip the overwritten ones
+            completed = int((time.monotonic() - start) / period)
+            if completed > conversion + 1:
+                self.stream_stats["skipped"] += completed - conversion - 1
+                conversion = completed - 1
+            deadline = start + (conversion + 1) * period
+            if deadline > stop:
+                break
+            times[n] = self.ads1115.wait_continuous(deadline)
+            volts[n] = self.ads1115.read_conversion()
+            n += 1
+            conversion += 1
+        self._stream[2] = conversion
+        volts[:n] *= self.volt_per_count(pga)
+        self.stream_stats["bursts"] += 1
+        self.stream_stats["samples"] += n
+        return n
+
+    @property
+    def transactions(self):
+        """I2C transactions on the ADS1115 and PCA9554 so far"""
+        return self.ads1115.transactions + self.multiplexer.transactions
+
+    def volt_per_count(self, pga):
+        """Input voltage of one ADC count, includes the 49/10 input divider"""
+        full_scale = {
+            self.PGA.PGA_1_2544V: 0.256,
+            self.PGA.PGA_2_5088V: 0.512,
+            self.PGA.PGA_5_0176V: 1.024,
+        }
+        return full_scale.get(pga, 2.048) * 49 / 10 / 32767
+
     def analog_read_volt(
         self, channel, data_rate=DataRate.DR_128SPS, pga=PGA.PGA_10_0352V
     ):
@@ -179,6 +570,8 @@ class AIO_32_0RA_IRC:
 
 def main():
     aio = AIO_32_0RA_IRC(0x49, 0x3E)
+    if aio.ads1115.wait_mode_fallback:
+        print(aio.ads1115.wait_mode_fallback)
 
     # アナログ入力値の読み出し（電圧値）（860SPS）
 
@@ -0,0 +1,100 @@
+"""
+Vectorized conversion of ADC voltages into physical units.
+
+Every conversion in devices/conversions.py is either linear,
+$y = a v + b$, or exponential, $y = 10^{a v + b}$.
+A ConversionPlan holds per-channel coefficient arrays, so a block of
+samples (n_samples × n_channels) is converted in a few NumPy ufunc calls.
+The functions in conversions.py remain the reference implementation.
+"""
+
+import numpy as np
+
+# conversion_id: (kind, a, b)
+LINEAR, EXPONENTIAL = 0, 1
+COEFFICIENTS = {
+    "Pfeiffer Single Gauge": (EXPONENTIAL, 1.6801381, -11.35925447),
+    "Pfeiffer IKR251": (EXPONENTIAL, 1.0, -10.625),
+    "Hall Sensor": (LINEAR, 5.0, -5.0 * 2.52),
+    "No Conversion": (LINEAR, 1.0, 0.0),
+    "MFC": (LINEAR, 1.0, 0.0),
+    "cathode current": (LINEAR, 1.0, 0.0),
+    "cathode volt": (LINEAR, 42 / 10, 0.0),
+}
+
+
+def ionization_gauge_coefficients(mode, scale):
+    """Coefficients for the Ionization Gauge, see conversions.ionization_gauge"""
+    if mode == 0:
+        return LINEAR, 10.0**scale, 0.0
+    if mode == 1:
+        return EXPONENTIAL, 0.5, -5.0
+    return LINEAR, np.nan, np.nan
+
+
+class ConversionPlan:
+    """
+    Per-channel coefficients compiled from AdcChannelProps.
+
+    Parameters
+    ----------
+    channels: list
+        AdcChannelProps, in the order of the block columns
+    ig_mode: int
+        Ionization Gauge mode, 0: linear (Torr), 1: log (Pa)
+    ig_scale: int
+        Ionization Gauge range for linear mode
+    """
+
+    def __init__(self, channels, ig_mode=0, ig_scale=-3):
+        self.channels = list(channels)
+        n = len(self.channels)
+        self.a = np.ones(n)
+        self.b = np.zeros(n)
+        self.exponential = np.zeros(n, dtype=bool)
+        self.ionization_gauge = np.zeros(n, dtype=bool)
+        self.ig_mode = None
+        self.ig_scale = None
+
+        for k, channel in enumerate(self.channels):
+            if channel.conversion_id == "Ionization Gauge":
+                self.ionization_gauge[k] = True
+            elif channel.conversion_id == "Baratron":
+                self.a[k] = channel.full_scale / 10
+            else:
+                kind, self.a[k], self.b[k] = COEFFICIENTS[channel.conversion_id]
+                self.exponential[k] = kind == EXPONENTIAL
+
+        self.set_ionization_gauge(ig_mode, ig_scale)
+
+    def set_ionization_gauge(self, mode, scale):
+        """
+        Re-plan Ionization Gauge channels.
+        Returns True if the coefficients changed.
+        """
+        if (mode, scale) == (self.ig_mode, self.ig_scale):
+            return False
+        self.ig_mode, self.ig_scale = mode, scale
+        kind, a, b = ionization_gauge_coefficients(mode, scale)
+        self.a[self.ionization_gauge] = a
+        self.b[self.ionization_gauge] = b
+        self.exponential[self.ionization_gauge] = kind == EXPONENTIAL
+        return True
+
+    def convert(self, voltages, out=None):
+        """
+        Convert a block of voltages
+
+        Parameters
+        ----------
+        voltages: array
+            shape (n_samples, n_channels) or (n_channels,)
+        out: array
+            optional output array of the same shape
+        """
+        out = np.multiply(voltages, self.a, out=out)
+        out += self.b
+        if self.exponential.any():
+            mask = np.broadcast_to(self.exponential, out.shape)
+            np.power(10.0, out, out=out, where=mask)
+        return out
@@ -85,11 +85,11 @@ class DAC8532(DeviceThread):
         if channel == 1:
             self.DAC.DAC8532_Out_Voltage(self.DAC.channel_A, voltage / 1000)
             print("DAC8532 MF1 (" + BLUE + "H2" + RESET + f"): {voltage/1000} V")
-            self.send_presets_to_adc.emit([channel, voltage])
+            self.send_presets_to_adc.emit([channel, voltage, time.monotonic()])
         elif channel == 2:
             self.DAC.DAC8532_Out_Voltage(self.DAC.channel_B, voltage / 1000)
             print("DAC8532 MF2 (" + RED + "O2" + RESET + f"): {voltage/1000} V")
-            self.send_presets_to_adc.emit([channel, voltage])
+            self.send_presets_to_adc.emit([channel, voltage, time.monotonic()])
         else:
             print(f"DAC8532 MFCs: channel {channel} not registered")
 
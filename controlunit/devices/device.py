@@ -9,17 +9,103 @@ TEST = False
 PRINTTHREADINFO = False
 
 
+# MARK: Scheduler
+class TickScheduler:
+    """
+    Ticks at absolute deadlines on the monotonic clock.
+
+    Deadlines are start + k * period, so the work time of a tick does not
+    stretch the period. A tick later than one period is an overrun; the
+    missed deadlines are skipped and counted instead of queued.
+
+    Parameters
+    ----------
+    period: float
+        seconds between ticks, "Sampling Time"
+    clock, sleep: callable
+        time.monotonic and time.sleep, replaced by a fake clock in tests
+    """
+
+    def __init__(self, period, clock=time.monotonic, sleep=time.sleep):
+        self.period = period
+        self.clock = clock
+        self.sleep = sleep
+        self.reset()
+
+    def reset(self):
+        self.start = self.clock()
+        self.deadline = self.start + self.period
+        self.ticks = 0
+        self.overruns = 0
+        self.missed = 0
+        self.lateness_sum = 0.0
+        self.lateness_max = 0.0
+
+    def set_period(self, period):
+        """
+        Change the period, the next deadline is one new period from now.
+        Counters restart, stats describe one period only.
+        """
+        self.period = period
+        self.reset()
+
+    def delay(self):
+        """Seconds until the next deadline, negative when late"""
+        return self.deadline - self.clock()
+
+    def tick(self):
+        """
+        Record a tick at the current deadline and advance it.
+        Returns lateness of the tick in seconds.
+        """
+        lateness = max(self.clock() - self.deadline, 0.0)
+        self.ticks += 1
+        self.lateness_sum += lateness
+        self.lateness_max = max(self.lateness_max, lateness)
+        self.deadline += self.period
+        if lateness > self.period:
+            missed = int(lateness // self.period)
+            self.overruns += 1
+            self.missed += missed
+            self.deadline += missed * self.period
+        return lateness
+
+    def wait(self):
+        """Sleep until the next deadline, then tick"""
+        delay = self.delay()
+        if delay > 0:
+            self.sleep(delay)
+        return self.tick()
+
+    def stats(self):
+        """Counters for logging"""
+        elapsed = self.clock() - self.start
+        return {
+            "ticks": self.ticks,
+            "rate": self.ticks / elapsed if elapsed > 0 else 0.0,
+            "period": self.period,
+            "mean jitter": self.lateness_sum / max(self.ticks, 1),
+            "max jitter": self.lateness_max,
+            "overruns": self.overruns,
+            "missed": self.missed,
+        }
+
+
 # MARK: Worker
 class DeviceThread(QtCore.QObject):
     """
     send_message usage:
     self.send_message.emit(f"Your Message Here to pass to main.py")
+    Messages in red are logged as warnings, others as info.
+    send_log sets the event_log level, for debug statistics and errors:
+    self.send_log.emit(f"Your Message", "error")
     """
 
     STEP = 3
     data_ready = QtCore.pyqtSignal(list)
     sigDone = QtCore.pyqtSignal(str)
     send_message = QtCore.pyqtSignal(str)
+    send_log = QtCore.pyqtSignal(str, str)
 
     def __init__(self, device_name, app, startTime, config, pi):
         super().__init__()
@@ -31,6 +117,11 @@ class DeviceThread(QtCore.QObject):
         self.config = config
         self._abort = False
         self.pi = pi
+        self._timer = None
+        self._finished = False
+        # call self.idle in slices before each deadline
+        self.idling = False
+        self.setpoint_latency = {"count": 0, "sum": 0.0, "max": 0.0}
 
     def print_checks(self):
         attrs = vars(self)
@@ -44,9 +135,125 @@ class DeviceThread(QtCore.QObject):
     def getStartTime(self):
         return self.__startTime
 
+    def prep_scheduler(self):
+        """Deadline scheduler with period self.sampling_time"""
+        self.scheduler = TickScheduler(self.sampling_time)
+        self._overruns_reported = 0
+
+    def wait_tick(self):
+        """
+        Sleep until the next sampling deadline.
+        Overruns are reported to the log, at most once per ten ticks.
+        """
+        self.scheduler.wait()
+        overruns = self.scheduler.overruns
+        if overruns > self._overruns_reported and self.scheduler.ticks % 10 == 0:
+            self._overruns_reported = overruns
+            self.send_message.emit(
+                f"<font color='red'>{self.device_name}</font> {overruns} late ticks,"
+                f" {self.scheduler.missed} samples missed"
+            )
+
+    def report_timing(self):
+        """Send scheduler and setpoint latency statistics to the log"""
+        stats = self.scheduler.stats()
+        self.send_log.emit(
+            f"<font color='blue'>{self.device_name}</font>"
+            f" {stats['ticks']} ticks at {stats['rate']:.2f} Hz"
+            f" (target {1 / stats['period']:.2f} Hz),"
+            f" jitter mean {stats['mean jitter']*1000:.1f} ms"
+            f" max {stats['max jitter']*1000:.1f} ms,"
+            f" {stats['overruns']} overruns, {stats['missed']} missed",
+            "debug",
+        )
+        latency = self.setpoint_latency
+        if latency["count"]:
+            self.send_log.emit(
+                f"<font color='blue'>{self.device_name}</font>"
+                f" {latency['count']} setpoint changes, latency"
+                f" mean {latency['sum'] / latency['count']*1000:.1f} ms"
+                f" max {latency['max']*1000:.1f} ms",
+                "debug",
+            )
+
+    def record_setpoint_latency(self, requested):
+        """
+        Record the delay of a setpoint slot.
+        requested: time.monotonic() when the setpoint was sent
+        """
+        latency = time.monotonic() - requested
+        self.setpoint_latency["count"] += 1
+        self.setpoint_latency["sum"] += latency
+        self.setpoint_latency["max"] = max(self.setpoint_latency["max"], latency)
+
+    # MARK: Ticks
+    def start_ticks(self):
+        """
+        Drive self.tick from the event loop of the worker thread.
+
+        A precise single-shot QTimer is aimed at each scheduler deadline.
+        Queued slots (setpoints, abort) run between ticks and idle slices,
+        so the thread never blocks in a loop and needs no processEvents.
+        """
+        self.prep_scheduler()
+        self._timer = QtCore.QTimer()
+        self._timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._on_timer)
+        self._arm()
+
+    def _arm(self):
+        """Start the timer for the next idle slice or the next deadline"""
+        if self._abort:
+            self.finish()
+        elif self.idling and self.scheduler.delay() > 0:
+            self._timer.start(0)
+        else:
+            self._timer.start(max(int(self.scheduler.delay() * 1000), 0))
+
+    def _on_timer(self):
+        if self._abort:
+            self.finish()
+            return
+        if self.idling and self.scheduler.delay() > 0:
+            self.idle(self.scheduler.delay())
+        else:
+            # the timer has millisecond resolution, sleep the rest
+            self.wait_tick()
+            self.tick()
+        self._arm()
+
+    def tick(self):
+        """One acquisition step at a deadline, implemented by devices"""
+        pass
+
+    def idle(self, time_left):
+        """Short piece of work before the next deadline, used if self.idling"""
+        pass
+
+    def finalize(self):
+        """Last step after abort: send remaining data, close files"""
+        pass
+
+    def finish(self):
+        """Stop ticking, finalize once and report done"""
+        if self._finished:
+            return
+        self._finished = True
+        if self._timer is not None:
+            self._timer.stop()
+        self.finalize()
+        self.sigDone.emit(self.device_name)
+
     def set_sampling_time(self, sampling_time):
-        """Set sampling time"""
+        """Set sampling time, timing of the old period goes to the log"""
         self.sampling_time = sampling_time
+        scheduler = getattr(self, "scheduler", None)
+        if scheduler is not None and sampling_time != scheduler.period:
+            if scheduler.ticks:
+                self.report_timing()
+            scheduler.set_period(sampling_time)
+            self._overruns_reported = 0
         if sampling_time >= 0.9:
             self.STEP = 1
         if sampling_time < 0.9:
@@ -62,10 +269,18 @@ class DeviceThread(QtCore.QObject):
         """
         pass
 
+    @QtCore.pyqtSlot()
     def abort(self):
+        """
+        Stop acquisition.
+        In the worker thread the device finalizes right away, otherwise
+        at its next timer event.
+        """
         message = f"<font color='blue'>{self.device_name}</font> aborting acquisition"
         # self.send_message.emit(message)
         self._abort = True
+        if self._timer is not None and QtCore.QThread.currentThread() is self.thread():
+            self.finish()
 
 
 if __name__ == "__main__":
@@ -2,8 +2,13 @@
 Dummy classes to test the code not on RasPi
 smbus
 RPi
+
+Set CONTROLUNIT_SIMULATION=1 to replace smbus, pigpio and spidev with
+the plant model in devices/simulation.py
 """
 
+import os
+
 
 class smbus:
     def __init__(self):
@@ -88,12 +93,41 @@ class pi:
     def i2c_write_device(self, device, reg_data):
         return
 
+    def i2c_close(self, device):
+        return
+
+    def spi_open(self, channel, baud, flags=0):
+        return channel
+
+    def spi_read(self, handle, count):
+        return 0, bytearray(count)
+
+    def spi_close(self, handle):
+        return
+
+    def read(self, pinNum):
+        return 0
+
     def set_mode(self, pinNum, OUTPUT):
         return
 
+    def callback(self, user_gpio, edge=0, func=None):
+        return _callback()
+
+
+class _callback:
+    def cancel(self):
+        return
+
 
 class pigpio:
     """pigpio dummy"""
 
     pi = pi
     OUTPUT = None
+    INPUT = None
+    FALLING_EDGE = 1
+
+
+if os.environ.get("CONTROLUNIT_SIMULATION", "") not in ["", "0"]:
+    from controlunit.devices.simulation import smbus, spidev, pigpio
@@ -14,6 +14,7 @@ import time, datetime
 from PyQt5 import QtCore
 
 from .device import DeviceThread
+from controlunit.storage import make_persistence_worker
 from heatercontrol import HeaterContol
 from controlunit.ui.text_shortcuts import RED, RESET
 
@@ -36,7 +37,6 @@ class MAX6675(DeviceThread):
         self.device_name = device_name
         self.__startTime = startTime
         self.config = config
-        self.__abort = False
         self.pi = pi
         self.init()
 
@@ -58,13 +58,6 @@ class MAX6675(DeviceThread):
         self.datapath = Path(self.config["Data Folder"])
         self.create_file()
 
-    @QtCore.pyqtSlot()
-    def abort(self):
-        message = "Worker thread {} aborting acquisition".format(self.device_name)
-        # self.send_message.emit(message)
-        # print(message)
-        self.__abort = True
-
     def setPresetTemp(self, newTemp: int):
         self.temperature_setpoint = newTemp
         return
@@ -72,18 +65,24 @@ class MAX6675(DeviceThread):
     @QtCore.pyqtSlot()
     def start(self):
         """
-        Start data acquisition
+        Start data acquisition, ticks are driven by the thread event loop
         """
-        self.acquisition_loop()
+        self.init_thermocouple()
+        self.init_heater_control()
+        self._step = 0
+        self.start_ticks()
 
     def init_heater_control(self):
         self.membrane_heater = HeaterContol(self.pi, self.__app)
-        self.thread = QtCore.QThread()
-        self.thread.setObjectName("heater current")
-        self.membrane_heater.moveToThread(self.thread)
-        self.thread.started.connect(self.membrane_heater.work)
-        self.sigAbortHeater.connect(self.membrane_heater.setAbort)
-        self.thread.start()
+        self.heater_thread = QtCore.QThread()
+        self.heater_thread.setObjectName("heater current")
+        self.membrane_heater.moveToThread(self.heater_thread)
+        self.heater_thread.started.connect(self.membrane_heater.work)
+        # the heater thread loops in work(), a queued slot would never run
+        self.sigAbortHeater.connect(
+            self.membrane_heater.setAbort, QtCore.Qt.DirectConnection
+        )
+        self.heater_thread.start()
 
     def init_thermocouple(self):
         """
@@ -122,11 +121,16 @@ class MAX6675(DeviceThread):
     # MARK: data saving
     def create_file(self):
         """Create file for temperature data"""
-        fname = f"cu_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_temp.csv"
+        fname = f"cu_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_temp"
         self.datapath.mkdir(parents=True, exist_ok=True)
-        self.savepath = self.datapath / fname
-        with open(self.savepath, "w") as f:
-            f.writelines(self.generate_header())
+        self.writer = make_persistence_worker(
+            self.config,
+            self.datapath / fname,
+            self.columns,
+            self.generate_header(),
+            {"date": "datetime64[us]"},
+        )
+        self.savepath = self.writer.path
         message = (
             f"<font size=4 color='blue'>{self.device_name}</font>"
             f" savepath:<br> {self.savepath}"
@@ -146,8 +150,8 @@ class MAX6675(DeviceThread):
         ]
 
     def save_data(self, data):
-        """Append data to temperature file"""
-        data.to_csv(self.savepath, mode="a", header=False, index=False)
+        """Queue data for the background writer"""
+        self.writer.write(data)
 
     def update_dataframe(self):
         """
@@ -168,44 +172,36 @@ class MAX6675(DeviceThread):
         """
         self.average = self.data["T"].mean()
 
-    # MARK: main loop
-    @QtCore.pyqtSlot()
-    def acquisition_loop(self):
+    # MARK: tick
+    def tick(self):
         """
-        Temperature acquisition and Feedback Control loop
+        Temperature acquisition and Feedback Control step
         """
-        self.init_thermocouple()
-        self.init_heater_control()
-
-        step = 0
+        self.read_thermocouple()
+        self.update_dataframe()
 
-        while not (self.__abort):
-            time.sleep(self.sampling_time)
-            self.read_thermocouple()
-            self.update_dataframe()
-
-            if step % (self.STEP - 1) == 0 and step != 0:
-                self.calculate_average()
-                self.temperature_control()
-                self.send_processed_data_to_main_thread()
-                self.clear_datasets()
-                step = 0
-            else:
-                step += 1
-            self.__app.processEvents()
-        else:
-            # ABORTING
+        if self._step % (self.STEP - 1) == 0 and self._step != 0:
             self.calculate_average()
+            self.temperature_control()
             self.send_processed_data_to_main_thread()
-            self.sigAbortHeater.emit()
-            self.__sumE = 0
-            self.thread.quit()
-            self.thread.wait()
-            self.pi.spi_close(self.sensor)
-            # self.pi.stop()
-
-        self.thread = None
-        self.sigDone.emit(self.device_name)
+            self.clear_datasets()
+            self._step = 0
+        else:
+            self._step += 1
+
+    def finalize(self):
+        """Send remaining data, stop the heater and close the file"""
+        self.calculate_average()
+        self.send_processed_data_to_main_thread()
+        self.writer.close()
+        self.report_timing()
+        self.sigAbortHeater.emit()
+        self.__sumE = 0
+        self.heater_thread.quit()
+        self.heater_thread.wait()
+        self.pi.spi_close(self.sensor)
+        # self.pi.stop()
+        self.heater_thread = None
 
     # MARK: PID
     def temperature_control(self):
@@ -8,11 +8,13 @@ https://www.microchip.com/en-us/product/mcp4725
 https://www.sparkfun.com/products/12918
 """
 
+import threading
 import time
 from PyQt5 import QtCore
 
 from .device import DeviceThread
 from controlunit.devices.mcp4725_setter import MCP4725Setter
+from controlunit.instrumentation import LatencyHistogram
 
 
 try:
@@ -40,21 +42,54 @@ class MCP4725(DeviceThread):
 
         self.pi = pigpio.pi()
         self.mcp = MCP4725Setter(self.pi)
+        # output_voltage runs in the ADC thread during PID control
+        self._lock = threading.Lock()
         self.mcp.set_voltage(0)
         self.output_voltage_signal.connect(self.output_voltage)
+        self.control_latency = LatencyHistogram()
         print("12 bit DAC MCP4725 initialised")
 
     @QtCore.pyqtSlot()
     def abort(self):
-        self._abort = True
-        self.output_voltage(0)
+        # no PID output can be written after the 0 V below
+        with self._lock:
+            first = not self._abort
+            self._abort = True
+            self._write(0)
+        if first and self.control_latency.count:
+            self.send_message.emit(
+                f"<font color='blue'>{self.device_name}</font> sense to actuate"
+                f" latency {self.control_latency.summary()}"
+            )
 
     @QtCore.pyqtSlot(float)
     def output_voltage(self, voltage):
         """voltage in milli Volts"""
-        voltage = voltage / 1000  # convert to volts
-        self.mcp.set_voltage(voltage)
-        # print(f"MCP4725 Ip DAC: {voltage} V")
+        with self._lock:
+            self._write(voltage)
+
+    def _write(self, voltage):
+        """voltage in milli Volts, call with self._lock held"""
+        self.mcp.set_voltage(voltage / 1000)
+
+    @QtCore.pyqtSlot(float, float)
+    def actuate(self, voltage, sensed):
+        """
+        Control output, connected directly to the ADC worker.
+        Runs in the ADC thread, the GUI event loop is not involved.
+
+        Parameters
+        ----------
+        voltage: float
+            control voltage in milli Volts
+        sensed: float
+            time.monotonic() of the measurement the output is based on
+        """
+        with self._lock:
+            if self._abort:
+                return
+            self._write(voltage)
+        self.control_latency.record(time.monotonic() - sensed)
 
     def demo(self):
         i = 0
@@ -0,0 +1,155 @@
+"""
+PID controller for the plasma current.
+
+- Anti-windup: the integral term stops growing while the output is
+  saturated in the direction of the error, and stays within the output limits.
+- Derivative on measurement, low-pass filtered: setpoint steps give no kick.
+- Gain scheduling by setpoint. The integral is kept as a term, not as the
+  integrated error, so switching gains is bumpless.
+
+ControlTrace records every controller step into a compact binary file
+(storage.BinaryWriter, float32 columns), read it with storage.read_binary.
+"""
+
+import numpy as np
+
+TRACE_COLUMNS = ["time", "setpoint", "measurement", "P", "I", "D", "output"]
+TRACE_DTYPES = {name: np.float32 for name in TRACE_COLUMNS}
+TRACE_DTYPES["time"] = np.float64
+
+
+class PIDController:
+    """
+    Parameters
+    ----------
+    kp, ki, kd: float
+        gains, ki and kd per second
+    output_limits: tuple
+        (lower, upper) output limits
+    derivative_filter: float
+        time constant of the derivative low-pass filter in seconds, 0: no filter
+    schedule: list
+        [[setpoint from, kp, ki, kd], ...], gains for setpoints above each threshold
+    """
+
+    def __init__(
+        self, kp, ki, kd, output_limits=(0, 2600), derivative_filter=0.0, schedule=None
+    ):
+        self.tunings = (kp, ki, kd)
+        self.default_tunings = self.tunings
+        self.output_limits = tuple(output_limits)
+        self.derivative_filter = derivative_filter
+        self.schedule = sorted([list(row) for row in schedule or []])
+        self.setpoint = 0.0
+        self.reset()
+
+    def reset(self):
+        """Clear integral and derivative state"""
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.last_measurement = None
+        self.components = (0.0, 0.0, 0.0)
+        self.output = 0.0
+
+    def set_tunings(self, kp, ki, kd):
+        """Set default gains, used where the schedule does not apply"""
+        self.default_tunings = (kp, ki, kd)
+        self.set_setpoint(self.setpoint)
+
+    def set_setpoint(self, setpoint):
+        """Set the setpoint and select its gains from the schedule"""
+        self.setpoint = setpoint
+        tunings = self.default_tunings
+        for threshold, kp, ki, kd in self.schedule:
+            if setpoint >= threshold:
+                tunings = (kp, ki, kd)
+        self.tunings = tunings
+
+    def clamp(self, value):
+        lower, upper = self.output_limits
+        return min(max(value, lower), upper)
+
+    def step(self, measurement, dt):
+        """
+        One controller step.
+
+        Parameters
+        ----------
+        measurement: float
+            process value
+        dt: float
+            seconds since the previous step
+
+        Returns
+        -------
+        output: float, within output_limits
+        """
+        kp, ki, kd = self.tunings
+        error = self.setpoint - measurement
+
+        if self.last_measurement is None or dt <= 0:
+            rate = 0.0
+        else:
+            rate = -(measurement - self.last_measurement) / dt
+        if self.derivative_filter > 0 and dt > 0:
+            alpha = self.derivative_filter / (self.derivative_filter + dt)
+            self.derivative = alpha * self.derivative + (1 - alpha) * rate
+        else:
+            self.derivative = rate
+        self.last_measurement = measurement
+
+        proportional = kp * error
+        derivative = kd * self.derivative
+        integral = self.integral + ki * error * max(dt, 0)
+        lower, upper = self.output_limits
+        unsaturated = proportional + integral + derivative
+        if (unsaturated > upper and error > 0) or (unsaturated < lower and error < 0):
+            integral = self.integral
+        self.integral = self.clamp(integral)
+
+        self.components = (proportional, self.integral, derivative)
+        self.output = self.clamp(proportional + self.integral + derivative)
+        return self.output
+
+
+class ControlTrace:
+    """
+    Preallocated buffer of controller steps, handed to a writer in blocks.
+
+    Parameters
+    ----------
+    writer: PersistenceWorker or DataWriter
+        receives {column: array} blocks with TRACE_COLUMNS
+    size: int
+        steps per block
+    """
+
+    def __init__(self, writer, size=1024):
+        self.writer = writer
+        self.size = size
+        self.columns = [
+            np.zeros(size, dtype=TRACE_DTYPES[name]) for name in TRACE_COLUMNS
+        ]
+        self.n = 0
+
+    def append(self, time, setpoint, measurement, p, i, d, output):
+        values = (time, setpoint, measurement, p, i, d, output)
+        for column, value in zip(self.columns, values):
+            column[self.n] = value
+        self.n += 1
+        if self.n == self.size:
+            self.flush()
+
+    def flush(self):
+        if self.n == 0:
+            return
+        block = {
+            name: column[: self.n].copy()
+            for name, column in zip(TRACE_COLUMNS, self.columns)
+        }
+        self.writer.write(block)
+        self.n = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
@@ -0,0 +1,174 @@
+"""
+Replay of a recorded run as the ADC worker.
+
+ReplayADC takes the place of ADC in MainApp.define_devices when
+`Replay: File` is set. Instead of scanning the board, every tick takes
+the recorded rows that are due from the run (loader.open_run, csv or
+binary) and sends them through the normal path: ring buffer, conversion,
+writer thread and `data_ready`. Dates and times of the recording are kept.
+
+Speed: 1 plays in real time, N times faster, 0 as fast as possible:
+back-to-back ticks of up to `Batch Rows` rows, paused while the GUI is
+more than half the ring buffer behind, so no row is lost. The PID
+is not run, recorded Ip must not drive the cathode supply.
+"""
+
+import time
+
+import numpy as np
+from PyQt5 import QtCore
+
+from .adc import ADC
+from controlunit.instrumentation import timed
+from controlunit.loader import open_run
+
+# s to wait at speed 0 while the GUI has not read half of the ring buffer
+BACKPRESSURE_WAIT = 0.005
+# recorded settings the conversion depends on
+IG_COLUMNS = ["IGmode", "IGscale"]
+
+
+def setting_runs(rows, columns):
+    """(start, stop) of the runs of rows with equal values in columns"""
+    n = len(rows["time"])
+    changed = np.zeros(n, dtype=bool)
+    for name in columns:
+        if name in rows:
+            values = np.asarray(rows[name])
+            changed[1:] |= values[1:] != values[:-1]
+    edges = [0, *np.flatnonzero(changed), n]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+class ReplayADC(ADC):
+    def __init__(self, device_name, app, startTime, config, pi):
+        # fast channel files are not replayed
+        config = dict(config, **{"ADC Streaming": False})
+        super().__init__(device_name, app, startTime, config, pi)
+
+    def init(self):
+        super().init()
+        self.prep_replay()
+
+    def prep_replay(self):
+        """Open the run, rows are read chunk by chunk while playing"""
+        replay = self.config.get("Replay") or {}
+        self.replay_file = replay["File"]
+        self.speed = replay.get("Speed", 1.0)
+        # stay below the ring buffer, the GUI reads batches from it
+        self.batch_rows = min(replay.get("Batch Rows", 1000), self.buffer.capacity // 4)
+        self.run = open_run(self.replay_file)
+        # converted values are computed again, as in acquisition
+        recorded = [
+            c for c in self.buffer.columns if c not in self.adc_converted_columns
+        ]
+        self.replay_columns = [c for c in recorded if c in self.run.columns]
+        self.missing_columns = [c for c in recorded if c not in self.run.columns]
+        self.chunks = self.run.chunks(self.replay_columns)
+        self.chunk = None
+        self.position = 0
+        self.replayed = 0
+        # (time.monotonic(), recorded time) of the first replayed row
+        self.replay_started = None
+
+    @QtCore.pyqtSlot()
+    def start(self):
+        self.send_message.emit(
+            f"<font color='blue'>{self.device_name}</font> replaying"
+            f" {self.replay_file}, {len(self.run)} rows,"
+            f" speed {self.speed or 'max'}"
+        )
+        if self.missing_columns:
+            self.send_message.emit(
+                f"<font color='red'>{self.device_name}</font> not in the run,"
+                f" kept at 0: {', '.join(self.missing_columns)}"
+            )
+        super().start()
+
+    def wait_tick(self):
+        """At speed 0 the next tick follows right away"""
+        if self.speed > 0:
+            super().wait_tick()
+            return
+        # count the tick on time and keep the deadline at now
+        self.scheduler.deadline = time.monotonic()
+        self.scheduler.tick()
+        self.scheduler.deadline -= self.scheduler.period
+
+    # MARK: read
+    def next_chunk(self):
+        self.chunk = next(self.chunks, None)
+        self.position = 0
+        return self.chunk is not None
+
+    @timed("read")
+    def collect_rows(self):
+        """
+        Recorded rows due at this tick, {column: array}.
+        Returns None at the end of the run.
+        """
+        if self.chunk is None and not self.next_chunk():
+            return None
+        if self.replay_started is None:
+            self.replay_started = (time.monotonic(), self.chunk["time"][0])
+        until = np.inf
+        if self.speed > 0:
+            started, first = self.replay_started
+            until = first + (time.monotonic() - started) * self.speed
+        parts, n = [], 0
+        while n < self.batch_rows:
+            if self.position == len(self.chunk["time"]) and not self.next_chunk():
+                break
+            times = self.chunk["time"][self.position :]
+            k = min(np.searchsorted(times, until, side="right"), self.batch_rows - n)
+            if k == 0:
+                break
+            parts.append(
+                {
+                    name: values[self.position : self.position + k]
+                    for name, values in self.chunk.items()
+                }
+            )
+            self.position += k
+            n += k
+        if not parts and self.chunk is None:
+            return None
+        return {
+            name: np.concatenate([p[name] for p in parts]) if parts else []
+            for name in self.replay_columns
+        }
+
+    # MARK: tick
+    @timed("tick")
+    def tick(self):
+        """Put due recorded rows into the ring buffer and send them"""
+        behind = self.buffer.head - self.buffer.released
+        if self.speed <= 0 and behind > self.buffer.capacity // 2:
+            # held rows go out once the GUI released the last range
+            self.emit_rows()
+            self.scheduler.deadline = time.monotonic() + BACKPRESSURE_WAIT
+            return
+        rows = self.collect_rows()
+        if rows is None:
+            self.send_message.emit(
+                f"<font color='blue'>{self.device_name}</font> replay finished,"
+                f" {self.replayed} rows"
+            )
+            self.abort()
+            return
+        if not len(rows["time"]):
+            return
+        # conversion follows the recorded Ionization Gauge settings,
+        # rows go into the buffer per run of equal settings
+        for start, stop in setting_runs(rows, IG_COLUMNS):
+            part = {name: values[start:stop] for name, values in rows.items()}
+            if "IGmode" in part:
+                self.set_ig_mode(int(part["IGmode"][0]))
+            if "IGscale" in part:
+                self.set_ig_range(int(part["IGscale"][0]))
+            self.update_conversion_plan()
+            self.buffer.extend(part)
+        self.replayed += len(rows["time"])
+        if "Ip" in rows:
+            self.plasma_current = rows["Ip"][-1]
+        self.send_processed_data_to_main_thread()
@@ -0,0 +1,186 @@
+"""
+Fixed-capacity ring buffer with one typed NumPy array per column.
+
+Rows are addressed by absolute indices: `head` counts every row ever written,
+`tail` is the first row not yet consumed. The storage position of a row is
+`index % capacity`, so appending a sample is O(1) and allocates no arrays.
+
+The buffer is also the handoff between the ADC thread (single producer)
+and the GUI thread (single consumer): the worker sends only the absolute
+range of a batch, the GUI reads it with `block`, as views into storage.
+Rows are never locked; `overwritten` tells the consumer how many rows of
+a range the producer has already reused or is writing over. Checked again
+after copying a range (seqlock-style), it tells which rows may be torn.
+The consumer calls `release` when done with a range; the producer holds
+new ranges back until then and sends them together.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class RingBuffer:
+    """
+    Column-typed ring buffer for acquisition data.
+
+    Parameters
+    ----------
+    columns: list
+        column names, in the order rows are appended
+    capacity: int
+        number of rows kept in memory
+    dtypes: dict
+        optional {column: dtype}, float64 is used for missing columns
+    """
+
+    def __init__(self, columns, capacity=4096, dtypes=None):
+        dtypes = dtypes or {}
+        self.columns = list(columns)
+        self.capacity = int(capacity)
+        self.data = {
+            name: np.zeros(self.capacity, dtype=dtypes.get(name, np.float64))
+            for name in self.columns
+        }
+        self._arrays = [self.data[name] for name in self.columns]
+        self.head = 0
+        self.tail = 0
+        # rows before this index are written or being written
+        self.writing = 0
+        # rows before this index were read by the consumer thread
+        self.released = 0
+        self.overruns = 0
+
+    def __len__(self):
+        """Number of rows written but not yet consumed"""
+        return self.head - self.tail
+
+    # MARK: write
+    def append(self, row):
+        """
+        Write one row in place.
+        Values are ordered as `self.columns`; a shorter row leaves
+        the trailing columns to be filled with `set_row`.
+        """
+        position = self.head % self.capacity
+        self.writing = self.head + 1
+        for column, value in zip(self._arrays, row):
+            column[position] = value
+        self.head += 1
+        if self.head - self.tail > self.capacity:
+            # oldest unconsumed row was overwritten
+            self.tail = self.head - self.capacity
+            self.overruns += 1
+
+    def extend(self, block):
+        """
+        Write a block of rows, {column: array} with equal lengths.
+        Columns missing from block keep their previous values.
+        """
+        n = len(next(iter(block.values())))
+        if n > self.capacity:
+            block = {name: values[-self.capacity :] for name, values in block.items()}
+            self.head += n - self.capacity
+            n = self.capacity
+        self.writing = self.head + n
+        for name, values in block.items():
+            self.write(name, values, self.head)
+        self.head += n
+        if self.head - self.tail > self.capacity:
+            self.tail = self.head - self.capacity
+            self.overruns += 1
+
+    def set_row(self, index, columns, values):
+        """Set values of the given columns in the row with absolute `index`"""
+        position = index % self.capacity
+        for name, value in zip(columns, values):
+            self.data[name][position] = value
+
+    def write(self, name, values, start):
+        """Write a block of values into column `name` starting at row `start`"""
+        for (a, b), (i, j) in self._segments(start, start + len(values)):
+            self.data[name][a:b] = values[i:j]
+
+    # MARK: read
+    def _segments(self, start, stop):
+        """
+        Map absolute rows [start, stop) to at most two storage slices.
+        Returns list of ((storage_start, storage_stop), (offset_start, offset_stop)).
+        """
+        if stop <= start:
+            return []
+        a = start % self.capacity
+        n = stop - start
+        if a + n <= self.capacity:
+            return [((a, a + n), (0, n))]
+        first = self.capacity - a
+        return [((a, self.capacity), (0, first)), ((0, n - first), (first, n))]
+
+    def _bounds(self, start, stop):
+        start = self.tail if start is None else max(start, self.head - self.capacity, 0)
+        stop = self.head if stop is None else min(stop, self.head)
+        return start, max(start, stop)
+
+    def read(self, name, start=None, stop=None):
+        """
+        Values of column `name` for rows [start, stop).
+        Returns a view when the rows are contiguous in storage, a copy otherwise.
+        """
+        start, stop = self._bounds(start, stop)
+        segments = self._segments(start, stop)
+        if not segments:
+            return self.data[name][0:0]
+        if len(segments) == 1:
+            (a, b), _ = segments[0]
+            return self.data[name][a:b]
+        return np.concatenate([self.data[name][a:b] for (a, b), _ in segments])
+
+    def last(self, name, n):
+        """Last `n` written values of column `name`"""
+        return self.read(name, self.head - n, self.head)
+
+    def block(self, start=None, stop=None, columns=None, copy=False):
+        """
+        Rows [start, stop) as {column: array}.
+
+        Parameters
+        ----------
+        copy: bool
+            own the arrays; otherwise they are views into storage, except
+            for ranges across the wrap, and are reused once overwritten
+        """
+        columns = self.columns if columns is None else columns
+        if copy:
+            return {name: self.read(name, start, stop).copy() for name in columns}
+        return {name: self.read(name, start, stop) for name in columns}
+
+    def release(self, stop):
+        """Consumer thread is done with the rows before `stop`"""
+        self.released = stop
+
+    def overwritten(self, start):
+        """
+        Number of rows from absolute index `start` already overwritten,
+        or being overwritten by the row or block the producer is writing
+        """
+        return max(self.writing - self.capacity - start, 0)
+
+    def to_dataframe(self, start=None, stop=None, columns=None):
+        """Copy rows [start, stop) into a DataFrame"""
+        columns = self.columns if columns is None else columns
+        return pd.DataFrame(
+            self.block(start, stop, columns, copy=True), columns=columns
+        )
+
+    # MARK: consume
+    def consume(self):
+        """
+        Mark pending rows as consumed.
+        Returns (start, stop) absolute indices of the consumed rows.
+        """
+        start, stop = self.tail, self.head
+        self.tail = stop
+        return start, stop
+
+    def clear(self):
+        """Drop all pending rows"""
+        self.tail = self.head
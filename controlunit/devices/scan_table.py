@@ -0,0 +1,106 @@
+"""
+Multi-rate scan table of the ADC channels.
+
+Every channel is read on one tick out of `divider`, the tick rate
+(1 / Sampling Time) divided by its `Rate` and rounded. The table repeats
+every lcm(dividers) ticks. Phases of the channels are staggered so that
+the number of conversions per tick, and so the scan time, is as even as
+possible. Channels without a Rate are read on every tick; a Rate above
+the tick rate cannot be met and is refused with a ValueError.
+
+    table = ScanTable([None, 1.0, 1.0, 2.0], tick_rate=10)
+    table.next()  # channel indices to read on this tick
+"""
+
+import math
+
+import numpy as np
+
+# longest repeating table, in ticks
+MAX_TABLE = 10000
+
+
+def divider(rate, tick_rate):
+    """Ticks between reads of a channel at rate Hz, at least 1"""
+    if rate is None:
+        return 1
+    if rate <= 0:
+        raise ValueError(f"Rate must be positive, got {rate}")
+    if rate > tick_rate * (1 + 1e-9):
+        raise ValueError(f"Rate {rate:g} Hz is above the {tick_rate:g} Hz scan rate")
+    return max(1, round(tick_rate / rate))
+
+
+class ScanTable:
+    """
+    Repeating table of the channels read at each tick.
+
+    Parameters
+    ----------
+    rates: list
+        Hz for each channel, None for every tick
+    tick_rate: float
+        scans per second
+    indices: list
+        channel index stored in the table for each rate,
+        position in rates by default
+    """
+
+    def __init__(self, rates, tick_rate, indices=None):
+        indices = list(range(len(rates))) if indices is None else list(indices)
+        self.indices = indices
+        self.tick_rate = tick_rate
+        self.dividers = [divider(rate, tick_rate) for rate in rates]
+        self.length = math.lcm(1, *self.dividers)
+        if self.length > MAX_TABLE:
+            raise ValueError(
+                f"scan table of {self.length} ticks, choose ADC channel rates"
+                " with common divisors of the sampling rate"
+            )
+        self.phases = self.stagger()
+        self.rows = [
+            np.array(
+                [
+                    index
+                    for index, d, phase in zip(indices, self.dividers, self.phases)
+                    if k % d == phase
+                ],
+                dtype=int,
+            )
+            for k in range(self.length)
+        ]
+        self.position = 0
+
+    def stagger(self):
+        """
+        Phase of every channel, slowest channels go to the least loaded ticks.
+        Returns list of phases, in the order of rates.
+        """
+        load = np.zeros(self.length, dtype=int)
+        phases = [0] * len(self.dividers)
+        for k in sorted(range(len(self.dividers)), key=lambda k: self.dividers[k]):
+            d = self.dividers[k]
+            peaks = [load[phase::d].max() for phase in range(d)]
+            phases[k] = int(np.argmin(peaks))
+            load[phases[k] :: d] += 1
+        return phases
+
+    def __len__(self):
+        return self.length
+
+    def rates(self):
+        """Achieved rate of every channel, Hz"""
+        return [self.tick_rate / d for d in self.dividers]
+
+    def conversions(self):
+        """Conversions per tick, for one table period"""
+        return np.array([len(row) for row in self.rows])
+
+    def next(self):
+        """Channel indices of the next tick"""
+        row = self.rows[self.position]
+        self.position = (self.position + 1) % self.length
+        return row
+
+    def reset(self):
+        self.position = 0
@@ -0,0 +1,542 @@
+"""
+Simulated hardware with a plant model, a drop-in for the constants in dummy.py.
+
+Enable with the CONTROLUNIT_SIMULATION environment variable: where smbus,
+pigpio or spidev are missing, `from devices.dummy import ...` then returns
+the classes below. They share one plant, created by `get_plant()` when
+the first device opens. Plant parameters are read from the `Simulation` block
+in settings.yml, channel numbers and conversions from `ADC Channels`.
+
+Inputs
+- MCP4725 (pigpio I2C, 0x60): cathode control voltage
+- DAC8532 (spidev, channel A/B): MFC1 and MFC2 setpoints
+- Heater GPIO (pigpio write): heater relay
+
+Plant, first-order responses
+- cathode current Ci follows the control voltage
+- plasma current Ip follows Ci above the emission threshold,
+  scaled by the upstream pressure
+- MFC flows follow the setpoints, pressures Pu, Pd (Bu, Bd) follow the flows
+- thermocouple temperature follows the heater duty
+
+Outputs
+- ADS1115 and PCA9554 register emulation: sensor voltages through the
+  inverse of the channel conversion, gauge and ADC noise, conversion timing
+  of the data rate (OS bit, ALERT/RDY callbacks)
+- MAX6675 (pigpio SPI): temperature word
+
+I2C latency injection adds a delay to every smbus transaction.
+The plant clock runs `Time Scale` times faster than time.monotonic(),
+and `Plant.simulate` steps the model offline, faster than real time.
+"""
+
+import random
+import threading
+import time
+
+import numpy as np
+
+from .conversion_plan import ConversionPlan
+
+PLANT_DEFAULTS = {
+    "Time Scale": 1.0,
+    "Seed": None,
+    "I2C Latency": 0.0,
+    "I2C Jitter": 0.0,
+    "ADC Noise": 0.001,
+    "ADC Clock Error": 0.0,
+    "Gauge Noise": 0.01,
+    "Current Noise": 0.005,
+    "Cathode Gain": 3.0,
+    "Cathode Time Constant": 0.5,
+    "Cathode Volt Gain": 4.0,
+    "Emission Threshold": 2.0,
+    "Plasma Gain": 0.5,
+    "Plasma Time Constant": 0.05,
+    "MFC Time Constant": 0.3,
+    "Flow Pressure": [0.02, 0.01],
+    "Base Pressure": 1.0e-5,
+    "Pressure Time Constant": 2.0,
+    "Half Pressure": 0.01,
+    "Downstream Ratio": 0.1,
+    "Ambient Temperature": 25.0,
+    "Heater Gain": 400.0,
+    "Heater Time Constant": 60.0,
+    "Heater GPIO": 17,
+    "IG Mode": 0,
+    "IG Scale": -3,
+}
+
+PRESSURE_SIGNALS = ["Pu", "Pd", "Bu", "Bd"]
+# ADS1115 full scale of the PGA setting, V
+FULL_SCALE = [6.144, 4.096, 2.048, 1.024, 0.512, 0.256, 0.256, 0.256]
+# AIO-32/0RA-IRC input divider
+DIVIDER = 10 / 49
+MCP4725_ADDRESS = 0x60
+DAC8532_CHANNELS = {0x30: 0, 0x34: 1}
+
+
+def relax(value, target, dt, tau):
+    """First-order step of value toward target, exact for any dt"""
+    if tau <= 0:
+        return target
+    return target + (value - target) * np.exp(-dt / tau)
+
+
+class Plant:
+    """
+    Plasma device model shared by the simulated buses.
+
+    Parameters
+    ----------
+    config: dict
+        settings, `Simulation` parameters and `ADC Channels`
+    """
+
+    def __init__(self, config=None):
+        self.lock = threading.RLock()
+        self.callbacks = []
+        self.registers = {}
+        self.configure(config or {})
+
+    def configure(self, config):
+        """Set parameters and the channel map, reset the state"""
+        with self.lock:
+            self.parameters = dict(PLANT_DEFAULTS)
+            self.parameters.update(config.get("Simulation") or {})
+            if "Heater GPIO" in config:
+                self.parameters["Heater GPIO"] = config["Heater GPIO"]
+            seed = self.parameters["Seed"]
+            self.random = np.random.default_rng(seed)
+            self.jitter = random.Random(seed)
+            self.map_channels(config.get("ADC Channels", {}))
+            self.reset()
+
+    def map_channels(self, channels):
+        """
+        Inverse conversions of ADC Channels.
+
+        Parameters
+        ----------
+        channels: dict
+            `ADC Channels` from settings.yml
+        """
+        from controlunit.devices.adc_channels import AdcChannelProps
+
+        props = [AdcChannelProps(name, **kws) for name, kws in channels.items()]
+        plan = ConversionPlan(
+            props, self.parameters["IG Mode"], self.parameters["IG Scale"]
+        )
+        self.channels = {
+            p.channel: (p.name, plan.a[k], plan.b[k], plan.exponential[k])
+            for k, p in enumerate(props)
+        }
+
+    def reset(self):
+        p = self.parameters
+        self.start = time.monotonic()
+        self.time = 0.0
+        self.control = 0.0
+        self.mfc_setpoints = [0.0, 0.0]
+        self.heater = 0
+        self.state = {
+            "Ci": 0.0,
+            "Ip": 0.0,
+            "MFC1": 0.0,
+            "MFC2": 0.0,
+            "Pu": p["Base Pressure"],
+            "T": p["Ambient Temperature"],
+        }
+        self.transactions = 0
+
+    # MARK: inputs
+    def set_control(self, volts):
+        """MCP4725 output, V"""
+        with self.lock:
+            self.update()
+            self.control = volts
+
+    def set_mfc(self, index, volts):
+        """DAC8532 output of MFC index, V"""
+        with self.lock:
+            self.update()
+            self.mfc_setpoints[index] = volts
+
+    def set_gpio(self, gpio, level):
+        with self.lock:
+            if gpio == self.parameters["Heater GPIO"]:
+                self.update()
+                self.heater = level
+
+    # MARK: dynamics
+    def now(self):
+        """Plant time, seconds"""
+        return (time.monotonic() - self.start) * self.parameters["Time Scale"]
+
+    def update(self):
+        """Advance the model to now()"""
+        self.advance(self.now() - self.time)
+
+    def advance(self, dt):
+        """Advance the model by dt plant seconds"""
+        if dt <= 0:
+            return
+        p, s = self.parameters, self.state
+        s["Ci"] = relax(
+            s["Ci"],
+            p["Cathode Gain"] * self.control,
+            dt,
+            p["Cathode Time Constant"],
+        )
+        for k, name in enumerate(["MFC1", "MFC2"]):
+            s[name] = relax(s[name], self.mfc_setpoints[k], dt, p["MFC Time Constant"])
+        flows = [s["MFC1"], s["MFC2"]]
+        pressure = p["Base Pressure"] + np.dot(p["Flow Pressure"], flows)
+        s["Pu"] = relax(s["Pu"], pressure, dt, p["Pressure Time Constant"])
+        emission = max(s["Ci"] - p["Emission Threshold"], 0)
+        discharge = s["Pu"] / (s["Pu"] + p["Half Pressure"])
+        ip = p["Plasma Gain"] * emission * discharge
+        s["Ip"] = relax(s["Ip"], ip, dt, p["Plasma Time Constant"])
+        temperature = p["Ambient Temperature"] + p["Heater Gain"] * self.heater
+        s["T"] = relax(s["T"], temperature, dt, p["Heater Time Constant"])
+        self.time += dt
+
+    def signals(self):
+        """Noise-free physical values of all ADC signals"""
+        p, s = self.parameters, self.state
+        return {
+            "Ip": s["Ip"],
+            "Ci": s["Ci"],
+            "Cv": p["Cathode Volt Gain"] * self.control,
+            "MFC1": s["MFC1"],
+            "MFC2": s["MFC2"],
+            "Pu": s["Pu"],
+            "Bu": s["Pu"],
+            "Pd": s["Pu"] * p["Downstream Ratio"],
+            "Bd": s["Pu"] * p["Downstream Ratio"],
+        }
+
+    def measure(self, name):
+        """Physical value of signal name with gauge noise"""
+        value = self.signals().get(name, 0.0)
+        if name in PRESSURE_SIGNALS:
+            return value * (1 + self.parameters["Gauge Noise"] * self.random.normal())
+        if name == "Ip":
+            return value + self.parameters["Current Noise"] * self.random.normal()
+        return value
+
+    def sensor_voltage(self, channel):
+        """Voltage at the input of ADC channel"""
+        with self.lock:
+            self.update()
+            volts = self.parameters["ADC Noise"] * self.random.normal()
+            if channel not in self.channels:
+                return volts
+            name, a, b, exponential = self.channels[channel]
+            value = self.measure(name)
+            if exponential:
+                value = np.log10(max(value, 1e-30))
+            return volts + (value - b) / a
+
+    def temperature(self):
+        with self.lock:
+            self.update()
+            return self.state["T"]
+
+    # MARK: offline
+    def simulate(self, duration, dt, control=None):
+        """
+        Step the model faster than real time.
+
+        Parameters
+        ----------
+        duration: float
+            plant seconds
+        dt: float
+            step, plant seconds
+        control: callable
+            control(t, signals) returns the MCP4725 voltage or None to keep it
+
+        Returns
+        -------
+        dict of arrays: time, control, and every signal
+        """
+        steps = int(round(duration / dt))
+        trace = {"time": np.zeros(steps), "control": np.zeros(steps)}
+        with self.lock:
+            for k in range(steps):
+                self.advance(dt)
+                signals = self.signals()
+                if control is not None:
+                    volts = control(self.time, signals)
+                    if volts is not None:
+                        self.control = volts
+                trace["time"][k] = self.time
+                trace["control"][k] = self.control
+                for name, value in signals.items():
+                    trace.setdefault(name, np.zeros(steps))[k] = value
+        return trace
+
+    # MARK: buses
+    def i2c_delay(self):
+        """Injected I2C latency of one transaction"""
+        self.transactions += 1
+        p = self.parameters
+        delay = p["I2C Latency"] + p["I2C Jitter"] * self.jitter.random()
+        if delay > 0:
+            time.sleep(delay)
+
+    def fire_alert(self):
+        """ALERT/RDY falling edge on every FALLING_EDGE callback"""
+        tick = int(time.monotonic() * 1e6) & 0xFFFFFFFF
+        for gpio, edge, func in list(self.callbacks):
+            if edge == pigpio.FALLING_EDGE and func is not None:
+                func(gpio, 0, tick)
+
+
+class AlertLine:
+    """ALERT/RDY of a simulated ADS1115, fires at the end of conversions"""
+
+    def __init__(self, plant):
+        self.plant = plant
+        self.condition = threading.Condition()
+        self.next = None
+        self.period = None
+        self.repeat = False
+        thread = threading.Thread(target=self._run, name="ALERT/RDY", daemon=True)
+        thread.start()
+
+    def arm(self, start, period, repeat):
+        with self.condition:
+            self.next = start + period
+            self.period = period
+            self.repeat = repeat
+            self.condition.notify()
+
+    def disarm(self):
+        with self.condition:
+            self.next = None
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.next is None:
+                    self.condition.wait()
+                delay = self.next - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+                self.next = self.next + self.period if self.repeat else None
+            self.plant.fire_alert()
+
+
+class Registers:
+    """ADS1115 and PCA9554 registers of the AIO-32/0RA-IRC on one bus"""
+
+    def __init__(self):
+        self.ext_mux = 0xFF
+        # power-on Config register, byte-swapped as written by ADS1115
+        self.config = 0x8385
+        self.converting_from = 0.0
+        self.alert = None
+        # Conversion register, kept until the first conversion of a new config
+        self.conversion = None
+
+    def conversion_time(self):
+        data_rate = (self.config >> 13) & 0x07
+        return 1 / [8, 16, 32, 64, 128, 250, 475, 860][data_rate]
+
+    def channel(self):
+        """Channel selected by the PCA9554 and ADS1115 multiplexers"""
+        mux = (self.config >> 4) & 0x07
+        low, high = self.ext_mux & 0x0F, (self.ext_mux >> 4) & 0x0F
+        channels = {4: low, 5: 16 + high, 1: 32 + low, 2: 48 + high}
+        return channels.get(mux, 256 + self.ext_mux)
+
+
+class SMBus:
+    """
+    Simulated I2C bus, every SMBus of a bus number shares its registers:
+    PCA9554 and ADS1115 each open their own in adc_setter.
+    """
+
+    def __init__(self, bus, plant=None):
+        self.plant = plant or get_plant()
+        self.registers = self.plant.registers.setdefault(bus, Registers())
+
+    def write_byte_data(self, i2c_addr, register, value):
+        self.plant.i2c_delay()
+        if 0x38 <= i2c_addr <= 0x3F and register == 1:
+            self.registers.ext_mux = value & 0xFF
+
+    def read_byte_data(self, i2c_addr, register):
+        """Config MSB, OS bit set when the single-shot conversion is done"""
+        self.plant.i2c_delay()
+        r = self.registers
+        if r.config & 1 == 0:
+            return 0x00
+        done = time.monotonic() >= r.converting_from + self.conversion_time()
+        return 0x80 if done else 0x00
+
+    def conversion_time(self):
+        """Conversion time of the data rate on the simulated oscillator"""
+        clock_error = self.plant.parameters["ADC Clock Error"]
+        return self.registers.conversion_time() * (1 + clock_error)
+
+    def write_word_data(self, i2c_addr, register, value):
+        self.plant.i2c_delay()
+        if register != 1:
+            return
+        r = self.registers
+        r.config = value
+        r.converting_from = time.monotonic()
+        if (value >> 8) & 0x03 == 0x03:
+            if r.alert is not None:
+                r.alert.disarm()
+            return
+        if r.alert is None:
+            r.alert = AlertLine(self.plant)
+        continuous = value & 1 == 0
+        r.alert.arm(r.converting_from, self.conversion_time(), continuous)
+
+    def read_word_data(self, i2c_addr, register):
+        """
+        Conversion register of the selected channel, byte-swapped.
+        Before the first conversion of a new config is done, the register
+        still holds the last conversion of the previous one.
+        """
+        self.plant.i2c_delay()
+        r = self.registers
+        ready = time.monotonic() >= r.converting_from + self.conversion_time()
+        if ready or r.conversion is None:
+            volts = self.plant.sensor_voltage(r.channel()) * DIVIDER
+            full_scale = FULL_SCALE[(r.config >> 1) & 0x07]
+            count = int(round(volts / full_scale * 32767))
+            r.conversion = min(max(count, -0x8000), 0x7FFF) & 0xFFFF
+        data = r.conversion
+        return (data << 8) & 0xFF00 | (data >> 8) & 0xFF
+
+
+class _callback:
+    def __init__(self, plant, entry):
+        self.plant = plant
+        self.entry = entry
+
+    def cancel(self):
+        if self.entry in self.plant.callbacks:
+            self.plant.callbacks.remove(self.entry)
+
+
+class pi:
+    """pigpio.pi with MCP4725 on I2C and MAX6675 on SPI"""
+
+    connected = True
+
+    def __init__(self, plant=None):
+        self.plant = plant or get_plant()
+        self.i2c_handles = {}
+        self.levels = {}
+
+    def stop(self):
+        return
+
+    def set_mode(self, gpio, mode):
+        return
+
+    def write(self, gpio, level):
+        self.levels[gpio] = level
+        self.plant.set_gpio(gpio, level)
+
+    def read(self, gpio):
+        return self.levels.get(gpio, 0)
+
+    def i2c_open(self, bus, address):
+        handle = len(self.i2c_handles)
+        self.i2c_handles[handle] = address
+        return handle
+
+    def i2c_close(self, handle):
+        self.i2c_handles.pop(handle, None)
+
+    def i2c_write_device(self, handle, data):
+        self.plant.i2c_delay()
+        if self.i2c_handles.get(handle) == MCP4725_ADDRESS:
+            value = data[1] << 4 | data[2] >> 4
+            self.plant.set_control(value * 5.0 / 4096)
+
+    def spi_open(self, channel, baud, flags=0):
+        return channel
+
+    def spi_close(self, handle):
+        return
+
+    def spi_read(self, handle, count):
+        """MAX6675 word, 0.25 °C per count from bit 3"""
+        counts = int(max(self.plant.temperature(), 0) * 4) & 0xFFF
+        word = counts << 3
+        return 2, bytearray([word >> 8, word & 0xFF])
+
+    def callback(self, user_gpio, edge=0, func=None):
+        entry = (user_gpio, edge, func)
+        self.plant.callbacks.append(entry)
+        return _callback(self.plant, entry)
+
+
+class SpiDev:
+    """spidev.SpiDev with the DAC8532 MFC outputs"""
+
+    max_speed_hz = 0
+    mode = 0b01
+
+    def __init__(self, bus=0, device=0, plant=None):
+        self.plant = plant or get_plant()
+
+    def writebytes(self, data):
+        channel, high, low = data[:3]
+        if channel in DAC8532_CHANNELS:
+            volts = (high << 8 | low) * 5.0 / 65535
+            self.plant.set_mfc(DAC8532_CHANNELS[channel], volts)
+
+    def readbytes(self, n=1):
+        return [0] * n
+
+
+class smbus:
+    SMBus = SMBus
+
+
+class spidev:
+    SpiDev = SpiDev
+
+
+class pigpio:
+    """pigpio with the simulated plant"""
+
+    pi = pi
+    OUTPUT = 1
+    INPUT = 0
+    FALLING_EDGE = 1
+
+
+def load_config():
+    """Settings used by the shared plant, empty if they can not be read"""
+    try:
+        from controlunit.readsettings import select_settings
+
+        return select_settings()
+    except (OSError, TypeError, KeyError):
+        return {}
+
+
+_plant = None
+_plant_lock = threading.Lock()
+
+
+def get_plant():
+    """Plant shared by the simulated devices, created on first use"""
+    global _plant
+    with _plant_lock:
+        if _plant is None:
+            _plant = Plant(load_config())
+        return _plant
@@ -0,0 +1,116 @@
+"""
+Event log of the GUI: bounded record ring and buffered file sink.
+
+Messages are kept as LogRecords in a LogRing of fixed capacity, so memory
+and the cost of filtering do not grow over a shift. The Log dock appends
+one line per record and only re-renders the ring when the level filter or
+the search text changes. LogFile keeps `controlunit.log` open and is
+flushed from a timer instead of reopening the file for every message.
+"""
+
+import collections
+import datetime
+
+from striphtmltags import strip_tags
+
+LEVELS = ["debug", "info", "warning", "error"]
+
+
+def level_of(message):
+    """
+    Level of a message without an explicit level, workers mark problems
+    in red; debug statistics and errors are sent with their level.
+    """
+    return "warning" if "color='red'" in message else "info"
+
+
+class LogRecord:
+    """One message: time stamp, level, html message and the html tag"""
+
+    __slots__ = ["time_stamp", "level", "message", "htmltag", "text"]
+
+    def __init__(self, message, level="info", htmltag="p", time_stamp=None):
+        if level not in LEVELS:
+            raise ValueError(f"level {level} not in {LEVELS}")
+        if time_stamp is None:
+            time_stamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.time_stamp = time_stamp
+        self.level = level
+        self.message = message
+        self.htmltag = htmltag
+        self.text = strip_tags(message)
+
+    def html(self):
+        return f"<{self.htmltag}>{self.time_stamp}: {self.message}</{self.htmltag}>"
+
+    def line(self):
+        """Line of the log file"""
+        return f"{self.time_stamp}, {self.text}\n"
+
+    def matches(self, level="debug", search=""):
+        """At least `level` and containing `search`, case insensitive"""
+        if LEVELS.index(self.level) < LEVELS.index(level):
+            return False
+        return search.lower() in self.text.lower()
+
+
+class LogRing:
+    """
+    Last `capacity` records, oldest dropped first.
+
+    Parameters
+    ----------
+    capacity: int
+        records kept in memory
+    """
+
+    def __init__(self, capacity=5000):
+        self.records = collections.deque(maxlen=capacity)
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def append(self, record):
+        if len(self.records) == self.records.maxlen:
+            self.dropped += 1
+        self.records.append(record)
+
+    def select(self, level="debug", search=""):
+        """Records matching the filter, oldest first"""
+        return [r for r in self.records if r.matches(level, search)]
+
+    def clear(self):
+        self.records.clear()
+
+
+class LogFile:
+    """
+    Append-only log file kept open, written through a buffer.
+    Call `flush` periodically and `close` on exit.
+    """
+
+    def __init__(self, path=None):
+        self.file = None
+        self.path = None
+        if path is not None:
+            self.open(path)
+
+    def open(self, path):
+        """Close the current file and append to path"""
+        self.close()
+        self.path = path
+        self.file = open(path, "a")
+
+    def write(self, record):
+        if self.file is not None:
+            self.file.write(record.line())
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
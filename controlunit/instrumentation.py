@@ -0,0 +1,189 @@
+"""
+Latency measurement for the acquisition and control paths.
+
+LatencyHistogram counts durations into preallocated log-spaced bins,
+so recording from a worker thread allocates nothing.
+
+STAGES times the hot path, stage by stage, with time.perf_counter_ns:
+methods decorated with @timed("stage"), or code between
+STAGES.start() and STAGES.stop("stage", start). Histograms are created
+when a stage is declared, or on first use from any thread; readers
+iterate over a snapshot taken under a lock. Disabled (the default, `Instrumentation` in
+settings.yml), a timed call costs one flag check.
+"""
+
+import functools
+import json
+import threading
+import time
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """
+    Log-spaced histogram of durations in seconds.
+
+    Parameters
+    ----------
+    minimum: float
+        upper edge of the first bin, shorter durations are counted there
+    maximum: float
+        lower edge of the overflow bin
+    bins_per_decade: int
+        resolution
+    """
+
+    def __init__(self, minimum=1e-6, maximum=10.0, bins_per_decade=10):
+        decades = np.log10(maximum / minimum)
+        n = int(np.ceil(decades * bins_per_decade))
+        self.edges = minimum * 10 ** (np.arange(n + 1) / bins_per_decade)
+        self.counts = np.zeros(n + 2, dtype=np.int64)
+        self._log_min = np.log10(minimum)
+        self._bins_per_decade = bins_per_decade
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Count one duration"""
+        if seconds <= self.edges[0]:
+            k = 0
+        else:
+            k = int((np.log10(seconds) - self._log_min) * self._bins_per_decade) + 1
+            k = min(k, len(self.counts) - 1)
+        self.counts[k] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Upper bin edge below which q percent of the durations fall"""
+        if self.count == 0:
+            return 0.0
+        k = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.count))
+        upper = np.append(self.edges, np.inf)
+        return min(upper[k], self.max)
+
+    def mean(self):
+        return self.total / max(self.count, 1)
+
+    def reset(self):
+        self.counts[:] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def stats(self):
+        """Count and durations in seconds, for machine-readable output"""
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+    def summary(self, unit=1e-3, name="ms"):
+        """One line for the log"""
+        return (
+            f"n={self.count} mean {self.mean() / unit:.2f} {name},"
+            f" p50 {self.percentile(50) / unit:.2f} {name},"
+            f" p99 {self.percentile(99) / unit:.2f} {name},"
+            f" max {self.max / unit:.2f} {name}"
+        )
+
+
+class Instrumentation:
+    """
+    Latency histograms of named hot-path stages.
+
+    Parameters
+    ----------
+    enabled: bool
+        record durations, can be switched at any time
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        # stages are added from worker threads while the GUI reads them
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        """Histogram of stage name, created on first use"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def items(self):
+        """Snapshot of (stage, histogram) pairs, safe to iterate"""
+        with self._lock:
+            return list(self.histograms.items())
+
+    def start(self):
+        """Start time in ns, 0 when disabled"""
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def stop(self, name, start):
+        """Record stage name since start, see start()"""
+        if start:
+            elapsed = time.perf_counter_ns() - start
+            self.histogram(name).record(elapsed * 1e-9)
+
+    def timed(self, name):
+        """Decorator, record every call of the function as stage name"""
+        histogram = self.histogram(name)
+
+        def decorate(func):
+            @functools.wraps(func)
+            def timed_call(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.record((time.perf_counter_ns() - start) * 1e-9)
+
+            return timed_call
+
+        return decorate
+
+    def reset(self):
+        for _, histogram in self.items():
+            histogram.reset()
+
+    def stats(self):
+        """{stage: stats} of stages with recorded calls"""
+        return {
+            name: histogram.stats()
+            for name, histogram in self.items()
+            if histogram.count
+        }
+
+    def dump(self, path):
+        """Write stats and histogram bins to a json file"""
+        data = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "unit": "s",
+            "stages": self.stats(),
+            "bins": {
+                name: {
+                    "edges": histogram.edges.tolist(),
+                    "counts": histogram.counts.tolist(),
+                }
+                for name, histogram in self.items()
+                if histogram.count
+            },
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1)
+        return path
+
+
+STAGES = Instrumentation()
+timed = STAGES.timed
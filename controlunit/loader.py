@@ -0,0 +1,296 @@
+"""
+Fast loading of recorded runs for analysis.
+
+`open_run` converts a `cu_*.csv` run (or a `cu_*.bin` run written in
+small batches) once into a columnar cache next to it: `cu_*_cache.bin`
+with a `cu_*_cache.json` sidecar, the storage.BinaryWriter format in
+chunks of CHUNK_ROWS rows. CSV data is parsed in chunks with explicit
+dtypes and vectorized NumPy datetime parsing.
+
+The sidecar also holds the time index: file offset, first and last
+`time` and `date` of every cache chunk. `Run.between` bisects it and
+reads only the chunks of the requested range. The cache is rebuilt when
+the size or modification time of the source changes.
+
+    run = open_run("~/work/cudata/cu_20240101_120000.csv")
+    run.signals, run.channels
+    df = run.between(60, 120, ["time", "Ip_c"])
+"""
+
+import itertools
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from controlunit.storage import (
+    ADC_COLUMN_DTYPES,
+    BinaryWriter,
+    iter_binary_chunks,
+    parse_header,
+    read_metadata,
+)
+
+CHUNK_ROWS = 100000
+CACHE_SUFFIX = "_cache"
+INDEX_COLUMNS = ["time", "date"]
+
+
+# MARK: header
+def read_header(path):
+    """Header lines of a `cu_*.csv` file up to and including `# [Data]`"""
+    header_lines = []
+    with open(path, "r") as f:
+        for line in f:
+            if not line.startswith("#"):
+                break
+            header_lines.append(line)
+            if line.startswith("# [Data]"):
+                return header_lines
+    raise ValueError(f"{path} has no '# [Data]' header")
+
+
+def describe(header_lines):
+    """
+    Parse the header written by ADC.generate_header
+
+    Returns
+    -------
+    dict
+        header: {key: value}, columns, signals: lists of names,
+        channels: list of int
+    """
+    header = parse_header(header_lines)
+    if "Columns" not in header:
+        raise ValueError("header has no Columns")
+
+    def split(key):
+        return [v for v in header.get(key, "").split(", ") if v]
+
+    return {
+        "header": header,
+        "columns": split("Columns"),
+        "signals": split("Signals"),
+        "channels": [int(v) for v in split("Channels")],
+    }
+
+
+def column_dtypes(columns):
+    return {name: np.dtype(ADC_COLUMN_DTYPES.get(name, np.float64)) for name in columns}
+
+
+# MARK: chunks
+def iter_csv_chunks(path, header_lines, columns, chunk_rows=CHUNK_ROWS):
+    """Yield {column: array} blocks of a csv run, parsed with explicit dtypes"""
+    dtypes = column_dtypes(columns)
+    dates = [name for name in columns if dtypes[name].kind == "M"]
+    reader = pd.read_csv(
+        path,
+        skiprows=len(header_lines),
+        header=None,
+        names=columns,
+        dtype={name: dtypes[name] for name in columns if name not in dates},
+        chunksize=chunk_rows,
+    )
+    try:
+        chunk = next(reader)
+    except (StopIteration, pd.errors.EmptyDataError):
+        return  # run stopped before the first batch
+    for chunk in itertools.chain([chunk], reader):
+        block = {name: chunk[name].to_numpy() for name in columns}
+        for name in dates:
+            # numpy parses the ISO dates of to_csv, with or without
+            # fractional seconds, on every supported pandas version
+            strings = chunk[name].to_numpy(dtype=object)
+            block[name] = strings.astype(dtypes[name])
+        yield block
+
+
+def rechunk(chunks, rows=CHUNK_ROWS):
+    """Join small {column: array} chunks into blocks of `rows` rows"""
+    pending, n = [], 0
+    for chunk in chunks:
+        pending.append(chunk)
+        n += len(next(iter(chunk.values())))
+        if n >= rows:
+            yield {name: np.concatenate([c[name] for c in pending]) for name in chunk}
+            pending, n = [], 0
+    if pending:
+        yield {name: np.concatenate([c[name] for c in pending]) for name in pending[0]}
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return {"name": Path(path).name, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def cache_path(source):
+    source = Path(source).expanduser()
+    return source.with_name(source.stem + CACHE_SUFFIX + ".bin")
+
+
+# MARK: cache
+def build_cache(source, chunk_rows=CHUNK_ROWS):
+    """
+    Convert a run into the indexed columnar cache
+
+    Parameters
+    ----------
+    source: str or Path
+        `cu_*.csv`, or `cu_*.bin` with its `.json` sidecar
+
+    Returns
+    -------
+    Path
+        the cache `.bin` file
+    """
+    source = Path(source).expanduser()
+    if source.suffix == ".csv":
+        header_lines = read_header(source)
+        columns = describe(header_lines)["columns"]
+        dtypes = column_dtypes(columns)
+        chunks = iter_csv_chunks(source, header_lines, columns, chunk_rows)
+    else:
+        metadata = read_metadata(source)
+        header_lines = metadata["header lines"]
+        columns = metadata["columns"]
+        dtypes = metadata["dtypes"]
+        chunks = rechunk(iter_binary_chunks(source, metadata), chunk_rows)
+
+    writer = BinaryWriter(
+        cache_path(source).with_suffix(""), columns, header_lines, dtypes
+    )
+    indexed = [name for name in INDEX_COLUMNS if name in columns]
+    index = {"offsets": [], "rows": [], **{name: [] for name in indexed}}
+    try:
+        for chunk in chunks:
+            index["offsets"].append(writer.file.tell())
+            index["rows"].append(writer.rows)
+            for name in indexed:
+                values = chunk[name].astype(np.int64) if name == "date" else chunk[name]
+                index[name].append([values[0].item(), values[-1].item()])
+            writer.write(chunk)
+    finally:
+        writer.extra = {"source": source_stamp(source), "index": index}
+        writer.close()
+    return writer.path
+
+
+def open_run(path, rebuild=False):
+    """
+    Run of a `cu_*.csv` or `cu_*.bin` file, from its cache.
+    The cache is built on the first call and when the source changes.
+    """
+    source = Path(path).expanduser()
+    cache = cache_path(source)
+    if not rebuild and cache.exists():
+        with open(cache.with_suffix(".json"), "r") as f:
+            stamp = json.load(f).get("source")
+        rebuild = stamp != source_stamp(source)
+    if rebuild or not cache.exists():
+        build_cache(source)
+    return Run(cache)
+
+
+# MARK: Run
+class Run:
+    """
+    Indexed columnar cache of one run
+
+    Parameters
+    ----------
+    path: str or Path
+        cache `.bin` file, see open_run
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.metadata = read_metadata(self.path)
+        self.columns = self.metadata["columns"]
+        self.dtypes = {
+            name: np.dtype(self.metadata["dtypes"][name]) for name in self.columns
+        }
+        info = describe(self.metadata["header lines"])
+        self.header = info["header"]
+        self.signals = info["signals"]
+        self.channels = info["channels"]
+        index = self.metadata["index"]
+        self.offsets = np.array(index["offsets"], dtype=np.int64)
+        self.starts = np.array(index["rows"] + [self.metadata["rows"]], dtype=np.int64)
+        self.index = {
+            name: np.array(
+                index[name], dtype=np.float64 if name == "time" else np.int64
+            )
+            for name in INDEX_COLUMNS
+            if name in index
+        }
+
+    def __len__(self):
+        return self.metadata["rows"]
+
+    def _read_chunk(self, f, k, columns):
+        """Columns of cache chunk k from the open file f"""
+        n = self.starts[k + 1] - self.starts[k]
+        offset = self.offsets[k] + 8
+        block = {}
+        for name in self.columns:
+            dtype = self.dtypes[name]
+            if name in columns:
+                f.seek(offset)
+                block[name] = np.fromfile(f, dtype=dtype, count=n)
+            offset += n * dtype.itemsize
+        return block
+
+    def _frame(self, chunks, columns):
+        if not chunks:
+            return pd.DataFrame(
+                {name: np.array([], dtype=self.dtypes[name]) for name in columns}
+            )
+        return pd.DataFrame(
+            {name: np.concatenate([c[name] for c in chunks]) for name in columns}
+        )
+
+    def chunks(self, columns=None):
+        """Yield {column: array} for every cache chunk, in order"""
+        columns = self.columns if columns is None else list(columns)
+        with open(self.path, "rb") as f:
+            for k in range(len(self.offsets)):
+                yield self._read_chunk(f, k, columns)
+
+    def read(self, columns=None):
+        """Whole run as a DataFrame"""
+        columns = self.columns if columns is None else list(columns)
+        return self._frame(list(self.chunks(columns)), columns)
+
+    def between(self, start, stop, columns=None, on="time"):
+        """
+        Rows with start <= `on` < stop, reading only the chunks needed.
+
+        Parameters
+        ----------
+        start, stop: float or datetime
+            seconds for on="time", datetimes for on="date"
+        on: str
+            "time" or "date", column must be monotonic
+        """
+        columns = self.columns if columns is None else list(columns)
+        if on not in self.index:
+            raise ValueError(f"run has no index on {on}, only {list(self.index)}")
+        bounds = self.index[on]
+        if on == "date":
+            start = np.datetime64(start, "us").astype(np.int64)
+            stop = np.datetime64(stop, "us").astype(np.int64)
+        # first chunk ending at or after start, last chunk beginning before stop
+        first = np.searchsorted(bounds[:, 1], start, side="left") if len(bounds) else 0
+        last = np.searchsorted(bounds[:, 0], stop, side="left") if len(bounds) else 0
+        needed = list(dict.fromkeys(columns + [on]))
+        chunks = []
+        with open(self.path, "rb") as f:
+            for k in range(first, last):
+                block = self._read_chunk(f, k, needed)
+                key = block[on].astype(np.int64) if on == "date" else block[on]
+                a, b = np.searchsorted(key, [start, stop], side="left")
+                chunks.append({name: block[name][a:b] for name in columns})
+        return self._frame(chunks, columns)
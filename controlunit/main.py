@@ -1,16 +1,21 @@
-import sys, datetime, os
+import sys, datetime, os, time
 from datetime import timedelta
+import numpy as np
 import pandas as pd
 from PyQt5 import QtCore, QtWidgets, QtGui
 
 from mainView import UIWindow
 from controlunit.devices.adc import ADC
+from controlunit.devices.replay import ReplayADC
 from controlunit.devices.dac8532 import DAC8532
 from controlunit.devices.mcp4725 import MCP4725
 
 import readsettings
-from striphtmltags import strip_tags
 from controlunit.trigger_signal import IndicatorLED
+from controlunit.plot_data_handler import PlotModel, last_sampled, plot_time
+from controlunit.data_store import ChunkedStore
+from controlunit.instrumentation import STAGES, timed
+from controlunit.event_log import LogFile, LogRecord, LogRing, level_of
 
 from controlunit.ui.text_shortcuts import RED, BLUE, RESET
 
@@ -55,6 +60,7 @@ class MainApp(QtCore.QObject, UIWindow):
         self.config = readsettings.init_configuration(verbose=True)
         self.datapath = self.config["Data Folder"]
         self.sampling = self.config["Sampling Time"]
+        self.init_log()
 
         # MARK: Current Values
         # To display in text browser
@@ -64,6 +70,8 @@ class MainApp(QtCore.QObject, UIWindow):
 
         self.update_plot_timewindow()
         self.set_scales_switches()
+        self.init_instrumentation()
+        self.init_render()
 
         self.showMain()
         self.log_to_file(f"App started: {os.path.abspath(__file__)}")
@@ -76,7 +84,7 @@ class MainApp(QtCore.QObject, UIWindow):
         val = self.control_dock.sampling_windows[txt]
         self.time_window = val
         try:
-            [self.update_plots(device) for device in self.device_name]
+            [self.update_plots(device) for device in self.plot_models]
         except AttributeError:
             pass
 
@@ -133,6 +141,59 @@ class MainApp(QtCore.QObject, UIWindow):
         self.settings_dock.setSamplingBtn.clicked.connect(self.__set_sampling)
         self.scale_dock.subzero_ip.clicked.connect(self._set_zero_ip)
 
+    # MARK: instrumentation
+    def init_instrumentation(self):
+        """Timing dock, refreshed every second while recording"""
+        dock = self.instrumentation_dock
+        dock.enable.setChecked(self.config.get("Instrumentation", False))
+        dock.enable.toggled.connect(self.enable_instrumentation)
+        dock.resetBtn.clicked.connect(STAGES.reset)
+        dock.dumpBtn.clicked.connect(self.dump_instrumentation)
+        self.instrumentation_timer = QtCore.QTimer()
+        self.instrumentation_timer.timeout.connect(self.update_instrumentation)
+        self.enable_instrumentation(dock.enable.isChecked())
+
+    def enable_instrumentation(self, enabled):
+        STAGES.enabled = enabled
+        if enabled:
+            self.instrumentation_timer.start(1000)
+        else:
+            self.instrumentation_timer.stop()
+
+    def update_instrumentation(self):
+        self.instrumentation_dock.update_stats(STAGES.stats())
+
+    def dump_instrumentation(self):
+        """Save stage stats next to the data files"""
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.datapath, f"cu_{stamp}_timing.json")
+        STAGES.dump(path)
+        self.log_message(f"Stage timing saved to {path}")
+
+    # MARK: render
+    def init_render(self):
+        """
+        Redraw plots and current values at GUI Frame Rate.
+        Batches only mark their device stale, so a burst of batches
+        costs one redraw, while every row still goes to the store.
+        """
+        self._stale = set()
+        self.render_timer = QtCore.QTimer()
+        self.render_timer.timeout.connect(self.render)
+        self.render_timer.start(int(1000 / self.config.get("GUI Frame Rate", 10)))
+
+    @timed("render")
+    def render(self):
+        """Redraw devices with new data, nothing while hidden or minimized"""
+        if not self._stale:
+            return
+        if not self.MainWindow.isVisible() or self.MainWindow.isMinimized():
+            return
+        for device_name in self._stale:
+            self.update_plots(device_name)
+        self._stale.clear()
+        self.update_current_values()
+
     # MARK: GUI setup
 
     def __quit(self):
@@ -177,10 +238,11 @@ class MainApp(QtCore.QObject, UIWindow):
         """
         Define devices, data structure, and step methods
         """
+        replay = self.config.get("Replay") or {}
         devices = {
             "MFCs": DAC8532,
             "PlasmaCurrent": MCP4725,
-            "ADC": ADC,
+            "ADC": ReplayADC if replay.get("File") else ADC,
         }
         # devices['MembraneTemperature'] = MAX6675
         self.step_methods = {
@@ -190,21 +252,32 @@ class MainApp(QtCore.QObject, UIWindow):
 
         self.devices = devices
         self.datadict = {
-            # "MembraneTemperature": pd.DataFrame(columns=self.config["Temperature Columns"]),
-            "ADC": pd.DataFrame(columns=self.config["ADC Column Names"]),
+            # "MembraneTemperature": self.make_store(self.config["Temperature Columns"]),
+            "ADC": self.make_store(self.config["ADC Column Names"]),
         }
         self.newdata = {
             # "MembraneTemperature": pd.DataFrame(columns=self.config["Temperature Columns"]),
-            "ADC": pd.DataFrame(columns=self.config["ADC Column Names"]),
+            "ADC": {},
         }
-
+        # worker ring buffers the batches are read from, ADC rows
+        # overwritten before the GUI read them
+        self.ring_buffers = {}
+        self.handoff_lost = 0
 
         self.plot_methods = {
             "MAX6675": self.update_plots_max6675,
             "ADC": self.update_plots_adc,
         }
+        self.plot_models = {
+            "ADC": PlotModel(
+                ["Ip", "Pu", "Pd", "Bu", "Bd"],
+                self.config.get("Plot Raw Points", 500000),
+                self.config.get("Plot Level Points", 200000),
+            ),
+        }
 
         self.zero_adjustment = {"Ip": 0, "Bu": 0}
+        self.cathode_control_voltage = 0
 
     # MARK: Prep Threads
     def prep_threads(self):
@@ -268,17 +341,25 @@ class MainApp(QtCore.QObject, UIWindow):
         worker.data_ready.connect(self.on_worker_step)
         worker.sigDone.connect(self.on_worker_done)
         worker.send_message.connect(self.log_message)
+        worker.send_log.connect(self.log_at_level)
         self.sigAbortWorkers.connect(worker.abort)
 
         if worker.device_name == "ADC":
             worker.send_control_voltage.connect(self._set_cathode_current)
             worker.send_zero_adjustment.connect(self._adjust_zeros)
+            # kept after abort, queued batches still read from it
+            self.ring_buffers[worker.device_name] = worker.buffer
 
     def start_cross_connections(self):
         """Connect workers signals directly"""
         mfcs_worker = self.workers["MFCs"]["worker"]
         adc_worker = self.workers["ADC"]["worker"]
         mfcs_worker.send_presets_to_adc.connect(adc_worker.update_mfcs)
+        # PID output goes from the ADC thread to the DAC without the GUI loop
+        pc_worker = self.workers["PlasmaCurrent"]["worker"]
+        adc_worker.actuate_plasma_current.connect(
+            pc_worker.actuate, QtCore.Qt.DirectConnection
+        )
 
     # MARK: Abort
     def terminate_existing_threads(self):
@@ -286,7 +367,14 @@ class MainApp(QtCore.QObject, UIWindow):
         Gracefully quits and waits for all currently running threads.
         """
         for device_name, worthre in self.workers.items():
-            worthre["worker"].abort()
+            if worthre["thread"].isRunning():
+                # abort runs in the worker thread after its current tick,
+                # remaining data is sent before the event loop quits
+                QtCore.QMetaObject.invokeMethod(
+                    worthre["worker"], "abort", QtCore.Qt.BlockingQueuedConnection
+                )
+            else:
+                worthre["worker"].abort()
             worthre["thread"].quit()
             worthre["thread"].wait()
 
@@ -305,7 +393,7 @@ class MainApp(QtCore.QObject, UIWindow):
         if not self.workers:
             return
 
-        self.workers["ADC"]["worker"].set_plasma_current.emit(0)
+        self.workers["ADC"]["worker"].set_plasma_current.emit(0, time.monotonic())
 
         self._mfc_presets = {1: 0, 2: 0}
         self.update_current_values()
@@ -326,52 +414,100 @@ class MainApp(QtCore.QObject, UIWindow):
     def generate_time_stamp(self):
         return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+    def init_log(self):
+        """
+        Bounded record ring behind the Log dock, log file kept open
+        and flushed every Log Flush Interval seconds
+        """
+        lines = self.config.get("Log Lines", 5000)
+        self.log_records = LogRing(lines)
+        self.logDock.set_max_lines(lines)
+        self.logDock.level.currentIndexChanged.connect(self.filter_log)
+        self.logDock.search.textChanged.connect(self.filter_log)
+        self.log_file = LogFile(self.config["Log File Path"])
+        self.log_flush_timer = QtCore.QTimer()
+        self.log_flush_timer.timeout.connect(self.log_file.flush)
+        self.log_flush_timer.start(
+            int(1000 * self.config.get("Log Flush Interval", 2.0))
+        )
+        self.__app.aboutToQuit.connect(self.log_file.close)
+
     def log_to_file(self, message):
-        filepath = self.config["Log File Path"]
-        time_stamp = self.generate_time_stamp()
-        new_line = f"{time_stamp}, {message}\n"
-        with open(filepath, "a") as f:
-            f.write(new_line)
+        self.log_file.write(LogRecord(message))
 
-    def log_message(self, message, htmltag="p"):
+    def log_message(self, message, htmltag="p", level=None):
         """
-        Append a message to the log browser with a timestamp.
+        Append a message to the log with a timestamp.
+
+        Parameters
+        ----------
+        level: str
+            one of event_log.LEVELS, guessed from the message if None
         """
-        time_stamp = self.generate_time_stamp()
-        self.log_to_file(strip_tags(message))
-        new_line = f"<{htmltag}>{time_stamp}: {message}</{htmltag}>"
-        if not self.logDock.log.toPlainText():
-            self.logDock.log.setHtml(new_line)
-        else:
-            current_text = self.logDock.log.toHtml()
-            current_text += new_line
-            self.logDock.log.setHtml(current_text)
+        record = LogRecord(message, level or level_of(message), htmltag)
+        self.log_records.append(record)
+        self.log_file.write(record)
+        self.logDock.append(record)
+
+    @QtCore.pyqtSlot(str, str)
+    def log_at_level(self, message, level):
+        """Log a worker message with an explicit event_log level"""
+        self.log_message(message, level=level)
 
-        self.logDock.log.moveCursor(self.logDock.log.textCursor().End)
-        # self.logDock.log.append(f"<{htmltag}>{nowstamp}: {message}</{htmltag}>")
+    def filter_log(self):
+        """Show the records matching the level and search of the Log dock"""
+        self.logDock.show_records(self.log_records.select(*self.logDock.filter()))
 
     # MARK: Data - handling
     # MARK: Data - append
+    def make_store(self, columns):
+        """Bounded in-memory store for received data, see settings.yml"""
+        return ChunkedStore(
+            columns,
+            self.config.get("Data Horizon", 7200),
+            self.config.get("Data Max Rows", 0),
+        )
+
+    @timed("store")
     def append_data(self, device_name):
         """
-        Append new data to dataframe
-        """
-        # self.datadict[device_name] = pd.concat([self.datadict[device_name], self.newdata[device_name]], ignore_index=True)
-        # Fix FutureWarning
-        self.datadict[device_name] = pd.concat(
-            [
-                self.datadict[device_name],
-                self.newdata[device_name].astype(self.datadict[device_name].dtypes),
-            ],
-            ignore_index=True,
-        )
-        # self.data = pd.concat([self.adc_values, new_data_row.astype(self.adc_values.dtypes)], ignore_index=True)
+        Append new data to the in-memory store, amortized O(1)
+        """
+        self.datadict[device_name].append(self.newdata[device_name])
+
+    @timed("store")
+    def store_ring_rows(self, device_name, start, stop):
+        """
+        Copy rows [start, stop) of the worker ring buffer into the store,
+        read as views, so the store holds the only copy in the GUI thread.
+        Returns the number of rows overwritten before or during the copy.
+        """
+        buffer = self.ring_buffers[device_name]
+        store = self.datadict[device_name]
+        lost = buffer.overwritten(start)
+        while True:
+            rows = max(stop - start - lost, 0)
+            store.append(buffer.block(start + lost, stop))
+            # rows the worker reused during the copy are torn, copy without them
+            torn = buffer.overwritten(start) - lost
+            if not torn:
+                return lost
+            store.truncate(rows)
+            lost += torn
+
+    @timed("plot model")
+    def append_plot_data(self, device_name):
+        """Append converted signals of the new batch to the plot model"""
+        model = self.plot_models[device_name]
+        newdata = self.newdata[device_name]
+        values = [np.asarray(newdata[name + "_c"], dtype=float) for name in model.names]
+        model.append(plot_time(newdata["date"]), np.vstack(values))
 
     def select_data_to_plot(self, device_name):
         """
         Select data based on self.time_window
         """
-        df = self.datadict[device_name]
+        df = self.datadict[device_name].to_dataframe()
         if self.time_window > 0:
             last_ts = df["date"].iloc[-1]
             timewindow = last_ts - pd.Timedelta(self.time_window, "seconds")
@@ -389,31 +525,51 @@ class MainApp(QtCore.QObject, UIWindow):
 
     # MARK: Worker Step
     @QtCore.pyqtSlot(list)
+    @timed("on_worker_step")
     def on_worker_step(self, result):
         """
         Collect data from worker
         - Recives data from worker(s)
-        - Updates text indicators in GUI
-        - Appends recived data to dataframes (call to self.__setStepData)
-        - Updates data in plots (skips points if data is too big)
+        - Appends recived data to the store and the plot model
+        - Marks the device for the next redraw (self.render)
         """
         device_name = result[-1]
         self.step_methods[device_name](result)
-        self.update_current_values()
+        self._stale.add(device_name)
 
     def _adc_step(self, result):
         device_name = result[-1]
-        #  self.data_ready.emit([newdata, self.device_name])
-        self.newdata[device_name] = result[0]
-        self.append_data(device_name)
+        # [(start, stop), device_name]: rows of the worker ring buffer
+        start, stop = result[0]
+        buffer = self.ring_buffers[device_name]
+        lost = self.store_ring_rows(device_name, start, stop)
+        buffer.release(stop)
+        if lost:
+            self.handoff_lost += lost
+            self.log_message(
+                f"<font color='red'>{device_name}</font> {lost} rows overwritten"
+                f" before display ({self.handoff_lost} in total),"
+                " increase ADC Buffer Size"
+            )
+        # plot and current values read the stored copy
+        store = self.datadict[device_name]
+        rows = max(stop - start - lost, 0)
+        self.newdata[device_name] = store.last(min(rows, len(store)))
+        self.append_plot_data(device_name)
+        # slow channels keep their last value between samples
+        newdata = self.newdata[device_name]
         for plotname, name in zip(
             self.config["ADC Signal Names"], self.config["ADC Converted Names"]
         ):
-            self.currentvalues[plotname] = self.datadict["ADC"].iloc[-3:][name].mean()
+            value = last_sampled(newdata[name])
+            if value is not None:
+                self.currentvalues[plotname] = value
         # to debug mV signal from Baratron, ouptut it directly.
-        self.baratronsignal1 = self.datadict["ADC"].iloc[-3:]["Bu"].mean()
-        self.baratronsignal2 = self.datadict["ADC"].iloc[-3:]["Bd"].mean()
-        self.update_plots(device_name)
+        bu, bd = last_sampled(newdata["Bu"]), last_sampled(newdata["Bd"])
+        if bu is not None:
+            self.baratronsignal1 = bu
+        if bd is not None:
+            self.baratronsignal2 = bd
 
     def _membrane_heater_step(self, result):
         device_name = result[-1]
@@ -422,8 +578,7 @@ class MainApp(QtCore.QObject, UIWindow):
         self.append_data(device_name)
         # here 3 is number of data points recieved from worker.
         # TODO: update to self.newdata[device_name]['T'].mean()
-        self.currentvalues["T"] = self.datadict[device_name].iloc[-3:]["T"].mean()
-        self.update_plots(device_name)
+        self.currentvalues["T"] = self.datadict[device_name].tail(3)["T"].mean()
 
     # MARK: worker done
     @QtCore.pyqtSlot(str)
@@ -439,10 +594,13 @@ class MainApp(QtCore.QObject, UIWindow):
             self.abort_all_threads()
 
     def reset_data(self, device_name):
-        self.datadict[device_name] = self.datadict[device_name].iloc[0:0]
-        self.newdata[device_name] = self.newdata[device_name].iloc[0:0]
+        self.datadict[device_name].clear()
+        self.newdata[device_name] = {}
+        if device_name in self.plot_models:
+            self.plot_models[device_name].clear()
 
     # MARK: update values
+    @timed("values")
     def update_current_values(self):
         """
         update current values when new signal comes
@@ -486,30 +644,23 @@ class MainApp(QtCore.QObject, UIWindow):
         skip = self.calculate_skip_points(time.shape[0])
         self.graph.valueTPlot.setData(time[::skip], temperature[::skip])
 
+    @timed("plot")
     def update_plots_adc(self):
         """
-        Update plots for ADC dataframe
+        Update plots for ADC data from the incremental plot model
         """
-        df = self.select_data_to_plot("ADC")
-        # time = df["time"].values.astype(float)
-        utc_offset = 9
-        time = (
-            df["date"]
-            .apply(lambda x: (x - timedelta(hours=utc_offset)).timestamp())
-            .values
+        time, values = self.plot_models["ADC"].view(
+            self.time_window, self.graph.view_width()
         )
-        skip = self.calculate_skip_points(time.shape[0])
-
-        what_to_plot = ["Ip", "Pu", "Pd", "Bu", "Bd"]
-        for name in what_to_plot:
+        for name, value in values.items():
             if name == "Ip":
-                values = (
-                    df[name + "_c"].values.astype(float) - self.zero_adjustment["Ip"]
-                )
+                value = value - self.zero_adjustment["Ip"]
+            # lines connect the samples of channels read at a lower rate
+            sampled = np.isfinite(value)
+            if sampled.all():
+                self.graph.plot_lines[name].setData(time, value)
             else:
-                values = df[name + "_c"].values.astype(float)
-
-            self.graph.plot_lines[name].setData(time[::skip], values[::skip])
+                self.graph.plot_lines[name].setData(time[sampled], value[sampled])
 
     @QtCore.pyqtSlot()
     def set_heater_goal(self):
@@ -577,17 +728,15 @@ class MainApp(QtCore.QObject, UIWindow):
         if not self.workers:
             return
         value = self.plasma_control_dock.voltage_spin_box.value()
-        self.workers["ADC"]["worker"].set_plasma_current.emit(value)
+        self.workers["ADC"]["worker"].set_plasma_current.emit(value, time.monotonic())
 
     @QtCore.pyqtSlot(float)
     def _set_cathode_current(self, control_voltage):
         """
-        Set voltage, recived from ADC worker in PlasmaCurrent worker
-        For PID control
+        Observe the PID control voltage.
+        The ADC worker sends it to the PlasmaCurrent worker directly.
         """
-        if not self.workers:
-            return
-        self.workers["PlasmaCurrent"]["worker"].output_voltage(control_voltage)
+        self.cathode_control_voltage = control_voltage
 
     # MARK: ADC controls
     def _set_zero_ip(self):
@@ -646,8 +795,8 @@ class MainApp(QtCore.QObject, UIWindow):
         value = float(txt.split(" ")[0])
         self.sampling = value
         self.update_plot_timewindow()
-        self.workers["ADC"]["worker"].set_sampling_time(value)
-        self.log_message(f"ADC sampling set to {value}")
+        # the worker reports whether the new rate is applied
+        self.workers["ADC"]["worker"].change_sampling_time.emit(value)
 
 
 # MARK: End
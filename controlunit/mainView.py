@@ -3,6 +3,7 @@ from PyQt5 import QtWidgets
 from pyqtgraph.dockarea import DockArea, Dock
 
 from ui.docks.log import LogDock
+from ui.docks.instrumentation import InstrumentationDock
 from controlunit.ui.docks.scales import PlotScaleDock
 from ui.docks.control import ControlDock
 from ui.docks.adcgain import ADCGain
@@ -83,11 +84,14 @@ class UIWindow(object):
         self.settings_dock.setStretch(80, 100)
         self.adcgain_dock = ADCGain()
         self.logDock = LogDock()
+        self.instrumentation_dock = InstrumentationDock()
 
         self.tabwidg.addTab(self.settings_area, "Settings")
         self.settings_area.addDock(self.settings_dock)
         self.settings_area.addDock(self.adcgain_dock, "bottom", self.settings_dock)
         self.settings_area.addDock(self.logDock, "right")
+        self.settings_area.addDock(self.instrumentation_dock, "below", self.logDock)
+        self.logDock.raiseDock()
         self.logDock.setStretch(300, 20)
 
     @staticmethod
@@ -1,12 +1,334 @@
 """
 This class will handle plotting.
 TODO: move plotting logic from main.py here
+
+PlotModel keeps plot data as epoch-float arrays, appended incrementally.
 """
 
+import datetime
 from datetime import timedelta
+import numpy as np
 import pandas as pd
 from PyQt5 import QtCore
 
+UTC_OFFSET = 9  # hours
+
+
+def plot_time(dates, utc_offset=UTC_OFFSET):
+    """
+    Vectorized `(date - timedelta(hours=utc_offset)).timestamp()`
+    for naive local dates, as used for the DateAxisItem
+    """
+    dates = np.asarray(dates, dtype="datetime64[us]")
+    local_offset = datetime.datetime.now().astimezone().utcoffset().total_seconds()
+    return dates.astype(np.int64) / 1e6 - utc_offset * 3600 - local_offset
+
+
+def last_sampled(values, n=3):
+    """
+    Mean of the last n finite values, None if there are none.
+    Channels read at a lower rate are NaN in the other rows.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    if not values.size:
+        return None
+    return values[-n:].mean()
+
+
+class SeriesBuffer:
+    """
+    Growable float64 array of shape (n_rows, n), appended along the
+    second axis and trimmed from the front. Appends are amortized O(1).
+    """
+
+    def __init__(self, n_rows, capacity=1024):
+        self.data = np.empty((n_rows, capacity))
+        self.start = 0
+        self.stop = 0
+
+    def __len__(self):
+        return self.stop - self.start
+
+    @property
+    def view(self):
+        return self.data[:, self.start : self.stop]
+
+    def append(self, block):
+        n = block.shape[1]
+        if self.stop + n > self.data.shape[1]:
+            self._reserve(n)
+        self.data[:, self.stop : self.stop + n] = block
+        self.stop += n
+
+    def _reserve(self, n):
+        size = len(self)
+        if size + n > self.data.shape[1] // 2:
+            data = np.empty((self.data.shape[0], 2 * (size + n)))
+            data[:, :size] = self.view
+            self.data = data
+        else:
+            self.data[:, :size] = self.view
+        self.start, self.stop = 0, size
+
+    def trim(self, n):
+        """Drop first n points"""
+        self.start = min(self.start + n, self.stop)
+
+    def clear(self):
+        self.start = self.stop = 0
+
+
+def envelope(block, bucket):
+    """
+    Min and max of consecutive buckets along the last axis.
+    NaN samples are ignored.
+
+    Parameters
+    ----------
+    block: array
+        shape (n_curves, n), n is a multiple of bucket
+    bucket: int
+        samples per bucket
+
+    Returns
+    -------
+    mins, maxs: arrays of shape (n_curves, n // bucket)
+    """
+    shaped = block.reshape(block.shape[0], -1, bucket)
+    return np.fmin.reduce(shaped, axis=2), np.fmax.reduce(shaped, axis=2)
+
+
+def interleave(time, mins, maxs):
+    """Min/max pairs as a line: x repeats each bucket time twice"""
+    x = np.repeat(time, 2)
+    y = np.empty((mins.shape[0], 2 * mins.shape[1]))
+    y[:, 0::2] = mins
+    y[:, 1::2] = maxs
+    return x, y
+
+
+def reduce_envelope(time, mins, maxs, ratio):
+    """
+    Merge groups of `ratio` buckets, the last group may be incomplete.
+    Returns time, mins, maxs of the merged buckets.
+    """
+    n = time.size // ratio * ratio
+    merged_mins, merged_maxs = envelope(mins[:, :n], ratio)
+    merged_maxs = envelope(maxs[:, :n], ratio)[1]
+    merged_time = time[:n:ratio]
+    if n < time.size:
+        merged_time = np.append(merged_time, time[n])
+        merged_mins = np.hstack(
+            [merged_mins, np.fmin.reduce(mins[:, n:], axis=1)[:, None]]
+        )
+        merged_maxs = np.hstack(
+            [merged_maxs, np.fmax.reduce(maxs[:, n:], axis=1)[:, None]]
+        )
+    return merged_time, merged_mins, merged_maxs
+
+
+class PyramidLevel:
+    """
+    Min/max envelope of the raw data with `factor` raw samples per bucket.
+    Bucket j covers raw samples [j * factor, (j + 1) * factor), only complete
+    buckets are stored, and at most `capacity` buckets are kept.
+    """
+
+    def __init__(self, factor, n_curves, capacity):
+        self.factor = factor
+        self.capacity = capacity
+        self.time = SeriesBuffer(1)
+        self.mins = SeriesBuffer(n_curves)
+        self.maxs = SeriesBuffer(n_curves)
+        self.first = 0  # bucket index of the oldest kept bucket
+
+    def __len__(self):
+        return len(self.time)
+
+    @property
+    def next(self):
+        """Index of the next bucket to complete"""
+        return self.first + len(self)
+
+    def extend(self, time, mins, maxs, first, ratio):
+        """
+        Add complete buckets from a finer level.
+
+        Parameters
+        ----------
+        time, mins, maxs: arrays
+            finer level data, time shape (n,), mins and maxs (n_curves, n)
+        first: int
+            finer level bucket index of time[0]
+        ratio: int
+            finer buckets per bucket of this level
+        """
+        if not len(self) and self.first * ratio < first:
+            self.first = -(-first // ratio)
+        start = self.next * ratio
+        stop = (first + time.size) // ratio * ratio
+        if stop <= start:
+            return
+        a, b = start - first, stop - first
+        self.time.append(time[np.newaxis, a:b:ratio])
+        self.mins.append(envelope(mins[:, a:b], ratio)[0])
+        self.maxs.append(envelope(maxs[:, a:b], ratio)[1])
+
+        excess = len(self) - self.capacity
+        if excess > 0:
+            for buffer in [self.time, self.mins, self.maxs]:
+                buffer.trim(excess)
+            self.first += excess
+
+
+class PlotModel:
+    """
+    Time and value arrays for a set of curves, with a multi-resolution
+    pyramid of min/max envelopes for long histories.
+
+    New batches are appended to the raw data and every pyramid level is
+    extended incrementally. `view` finds the window start with searchsorted
+    and reads from the coarsest level that still fills the screen, so
+    spikes stay visible and the number of points stays bounded.
+    Each level keeps a bounded number of points, so memory stays bounded
+    on long runs; old raw data is available from the coarser levels.
+
+    Parameters
+    ----------
+    names: list
+        curve names
+    raw_capacity: int
+        raw samples kept
+    level_capacity: int
+        buckets kept per pyramid level
+    factors: tuple
+        raw samples per bucket for each pyramid level, each a multiple
+        of the previous one
+    """
+
+    def __init__(
+        self, names, raw_capacity=500000, level_capacity=200000, factors=(10, 100, 1000)
+    ):
+        self.names = list(names)
+        self.raw = SeriesBuffer(1 + len(self.names))
+        self.raw_capacity = raw_capacity
+        self.trimmed = 0  # samples dropped from the front of self.raw
+        self.levels = [
+            PyramidLevel(factor, len(self.names), level_capacity) for factor in factors
+        ]
+
+    def __len__(self):
+        return len(self.raw)
+
+    def append(self, time, values):
+        """
+        Parameters
+        ----------
+        time: array
+            epoch seconds, shape (n,)
+        values: array
+            shape (n_curves, n)
+        """
+        self.raw.append(np.vstack([time, values]))
+
+        data = self.raw.view
+        source = (data[0], data[1:], data[1:], self.trimmed)
+        factor = 1
+        for level in self.levels:
+            level.extend(*source, level.factor // factor)
+            source = (level.time.view[0], level.mins.view, level.maxs.view, level.first)
+            factor = level.factor
+
+        excess = len(self.raw) - self.raw_capacity
+        if excess > 0:
+            self.raw.trim(excess)
+            self.trimmed += excess
+
+    def clear(self):
+        self.trimmed += len(self.raw)
+        self.raw.clear()
+        n_curves = len(self.names)
+        self.levels = [
+            PyramidLevel(level.factor, n_curves, level.capacity)
+            for level in self.levels
+        ]
+
+    def window_start(self, time_window):
+        """Position in self.raw.view of the first sample in the window"""
+        time = self.raw.view[0]
+        if time_window <= 0 or not time.size:
+            return 0
+        return int(np.searchsorted(time, time[-1] - time_window, side="right"))
+
+    def select_level(self, t_start, max_points):
+        """
+        Coarsest pyramid level with at least max_points buckets after t_start.
+        Returns (level, first bucket position), level is None for raw data.
+        """
+        raw_time = self.raw.view[0]
+        start = int(np.searchsorted(raw_time, t_start, side="right"))
+        selected = (None, start) if start > 0 or self.trimmed == 0 else None
+        for level in self.levels:
+            time = level.time.view[0]
+            first = int(np.searchsorted(time, t_start, side="right"))
+            if not (first > 0 or level.first == 0):
+                continue  # older part of the window was dropped from this level
+            if selected is None:
+                selected = (level, first)  # finest level covering the window
+            if time.size - first < max_points:
+                break
+            selected = (level, first)
+        if selected is None:
+            selected = (self.levels[-1], 0)
+        return selected
+
+    def view(self, time_window, max_points=1000):
+        """
+        Data within time_window seconds from the last sample
+
+        Parameters
+        ----------
+        time_window: float
+            seconds, non-positive for full history
+        max_points: int
+            number of min/max pairs, usually the view width in pixels
+
+        Returns
+        -------
+        time: array
+        values: dict
+            {name: array}
+        """
+        raw = self.raw.view
+        if not raw.shape[1]:
+            return raw[0], {name: raw[k + 1] for k, name in enumerate(self.names)}
+        t_start = raw[0, -1] - time_window if time_window > 0 else -np.inf
+
+        level, first = self.select_level(t_start, max_points)
+        if level is None:
+            if raw.shape[1] - first <= 2 * max_points:
+                data = raw[:, first:]
+                return data[0], {name: data[k + 1] for k, name in enumerate(self.names)}
+            time, mins, maxs = raw[0, first:], raw[1:, first:], raw[1:, first:]
+            tail = raw[:, raw.shape[1] :]
+        else:
+            time = level.time.view[0, first:]
+            mins = level.mins.view[:, first:]
+            maxs = level.maxs.view[:, first:]
+            tail = raw[:, max(level.next * level.factor - self.trimmed, 0) :]
+
+        ratio = -(-time.size // max_points)
+        if ratio > 1:
+            time, mins, maxs = reduce_envelope(time, mins, maxs, ratio)
+        if tail.shape[1]:
+            time = np.append(time, tail[0, 0])
+            mins = np.hstack([mins, np.fmin.reduce(tail[1:], axis=1)[:, None]])
+            maxs = np.hstack([maxs, np.fmax.reduce(tail[1:], axis=1)[:, None]])
+
+        x, y = interleave(time, mins, maxs)
+        return x, {name: y[k] for k, name in enumerate(self.names)}
+
 
 class PlotDataHandler(QtCore.QObject):
     def __init__(self, adc_instance, graph_instance):
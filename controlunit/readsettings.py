@@ -59,7 +59,14 @@ def init_configuration(settings="settings.yml", verbose=False):
     config = select_settings(settings, verbose=verbose)
     config["Data Folder"] = init_datafolder(config)
     config["Log File Path"] = check_logfile(config)
+    init_adc_channels(config)
+    return config
+
 
+def init_adc_channels(config):
+    """
+    Populate ADC Channel Properties and column names from config["ADC Channels"]
+    """
     adc_channels = {
         name: AdcChannelProps(name, **config["ADC Channels"][name])
         for name in list(config["ADC Channels"])
@@ -69,10 +76,14 @@ def init_configuration(settings="settings.yml", verbose=False):
 
     config["ADC Signal Names"] = list(config["ADC Channels"])
     config["ADC Converted Names"] = [i + "_c" for i in config["ADC Signal Names"]]
+    config["ADC Std Names"] = [
+        name + "_std" for name, props in adc_channels.items() if props.keep_std
+    ]
     config["ADC Column Names"] = (
         config["ADC Additional Columns"]
         + config["ADC Signal Names"]
         + config["ADC Converted Names"]
+        + config["ADC Std Names"]
     )
 
     a = config["ADC Channels"]
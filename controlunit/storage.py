@@ -0,0 +1,460 @@
+"""
+Data writers for acquisition workers.
+
+Every writer keeps one open file handle for the whole run.
+
+- CsvWriter: the `cu_*.csv` layout, `#` header followed by `# [Data]`.
+- BinaryWriter: chunked columnar binary file `cu_*.bin`.
+  Each `write` appends one chunk: int64 row count, then every column
+  as a contiguous typed array. Header metadata and column dtypes go into
+  a `cu_*.json` sidecar.
+
+Select the backend with `Data Format` in settings.yml: csv, binary, or both.
+`export_csv` converts binary (and older CSV) runs to the current CSV layout.
+
+PersistenceWorker runs a writer in a background thread, so acquisition
+loops hand over batches without waiting for the disk.
+"""
+
+import abc
+import collections
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"CUCOLS01"
+FORMATS = ["csv", "binary", "both"]
+# Columns of ADC runs not listed here are stored as float64
+ADC_COLUMN_DTYPES = {
+    "date": "datetime64[us]",
+    "IGmode": np.int64,
+    "IGscale": np.int64,
+    "QMS_signal": np.int64,
+}
+
+
+def parse_header(lines):
+    """
+    Parse `#` header lines into a dict.
+    Supports both "# Key , value" (ADC) and "# Key: value" (MAX6675).
+    """
+    header = {}
+    for line in lines:
+        line = line.strip().lstrip("#").strip()
+        if not line or line == "[Data]":
+            continue
+        for separator in [" , ", ": "]:
+            if separator in line:
+                key, value = line.split(separator, 1)
+                header[key.strip()] = value.strip()
+                break
+    return header
+
+
+def column_values(data, name):
+    """Column of a DataFrame or of a {name: array} dict as an array"""
+    values = data[name]
+    return values.to_numpy() if isinstance(values, pd.Series) else values
+
+
+def batch_length(data):
+    """Number of rows in a DataFrame or {column: array} batch"""
+    if isinstance(data, pd.DataFrame):
+        return len(data)
+    return len(next(iter(data.values())))
+
+
+# MARK: Writers
+class DataWriter(abc.ABC):
+    """
+    Writer interface
+
+    Parameters
+    ----------
+    path: Path
+        file path without suffix, e.g. Data Folder / cu_20240101_120000
+    columns: list
+        column names
+    header_lines: list
+        header lines as produced by generate_header()
+    dtypes: dict
+        {column: dtype}, float64 is used for missing columns
+    """
+
+    suffix = ""
+
+    def __init__(self, path, columns, header_lines, dtypes=None):
+        self.path = Path(path).with_suffix(self.suffix)
+        self.columns = list(columns)
+        self.header_lines = list(header_lines)
+        dtypes = dtypes or {}
+        self.dtypes = {name: np.dtype(dtypes.get(name, np.float64)) for name in columns}
+        self.rows = 0
+
+    @abc.abstractmethod
+    def write(self, data):
+        """Append a batch of rows, DataFrame or {column: array}"""
+
+    def flush(self):
+        self.file.flush()
+
+    def fsync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class CsvWriter(DataWriter):
+    """Append rows to `cu_*.csv` through one open handle"""
+
+    suffix = ".csv"
+
+    def __init__(self, path, columns, header_lines, dtypes=None):
+        super().__init__(path, columns, header_lines, dtypes)
+        self.file = open(self.path, "w", newline="")
+        self.file.writelines(self.header_lines)
+        self.file.flush()
+
+    def write(self, data):
+        if not isinstance(data, pd.DataFrame):
+            data = pd.DataFrame(data, columns=self.columns)
+        data.to_csv(self.file, header=False, index=False)
+        self.rows += batch_length(data)
+
+
+class BinaryWriter(DataWriter):
+    """Append chunks of typed columns to `cu_*.bin`, metadata in `cu_*.json`"""
+
+    suffix = ".bin"
+
+    def __init__(self, path, columns, header_lines, dtypes=None):
+        super().__init__(path, columns, header_lines, dtypes)
+        self.sidecar = self.path.with_suffix(".json")
+        # more sidecar entries, e.g. the time index of loader.py
+        self.extra = {}
+        self.write_sidecar()
+        self.file = open(self.path, "wb")
+        self.file.write(MAGIC)
+        self.file.flush()
+
+    def write_sidecar(self):
+        metadata = {
+            "format": "controlunit-columnar",
+            "version": 1,
+            "columns": self.columns,
+            "dtypes": {name: dtype.str for name, dtype in self.dtypes.items()},
+            "header": parse_header(self.header_lines),
+            "header lines": self.header_lines,
+            "rows": self.rows,
+            **self.extra,
+        }
+        with open(self.sidecar, "w") as f:
+            json.dump(metadata, f, indent=1)
+
+    def write(self, data):
+        n = batch_length(data)
+        if n == 0:
+            return
+        # convert every column first, a bad batch leaves the file intact
+        arrays = [
+            np.ascontiguousarray(column_values(data, name), dtype=self.dtypes[name])
+            for name in self.columns
+        ]
+        self.file.write(np.int64(n).tobytes())
+        for values in arrays:
+            self.file.write(memoryview(values.view(np.uint8)))
+        self.rows += n
+
+    def close(self):
+        if not self.file.closed:
+            super().close()
+            self.write_sidecar()
+
+
+class MultiWriter:
+    """Write the same data with several writers"""
+
+    def __init__(self, writers):
+        self.writers = writers
+        self.path = writers[0].path
+
+    def write(self, data):
+        for writer in self.writers:
+            writer.write(data)
+
+    def flush(self):
+        for writer in self.writers:
+            writer.flush()
+
+    def fsync(self):
+        for writer in self.writers:
+            writer.fsync()
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+
+def make_writer(data_format, path, columns, header_lines, dtypes=None):
+    """Writer for `Data Format` setting: csv, binary, or both"""
+    writers = {"csv": [CsvWriter], "binary": [BinaryWriter]}
+    writers["both"] = writers["csv"] + writers["binary"]
+    if data_format not in writers:
+        raise ValueError(f"Data Format {data_format} is not supported, {FORMATS}")
+    selected = [w(path, columns, header_lines, dtypes) for w in writers[data_format]]
+    if len(selected) == 1:
+        return selected[0]
+    return MultiWriter(selected)
+
+
+# MARK: Background
+class PersistenceWorker:
+    """
+    Write batches in a background thread.
+
+    `write` only appends to a bounded deque and never blocks: when the
+    queue is full the batch is dropped and counted. The thread drains all
+    queued batches at once, flushes, and calls fsync every
+    `fsync_interval` seconds (0: after every drain, negative: never).
+    A failing batch is counted in `errors` and skipped, the thread keeps
+    writing the next ones; `last_error` is reported by the owner.
+
+    Parameters
+    ----------
+    writer: DataWriter
+        writer used from the background thread only
+    max_batches: int
+        queue capacity in batches
+    fsync_interval: float
+        seconds between fsync calls
+    """
+
+    def __init__(self, writer, max_batches=1000, fsync_interval=10.0):
+        self.writer = writer
+        self.path = writer.path
+        self.max_batches = max_batches
+        self.fsync_interval = fsync_interval
+        self._queue = collections.deque()
+        self._wakeup = threading.Event()
+        self._stop = False
+        self._last_fsync = time.monotonic()
+
+        self.queued = 0
+        self.written = 0
+        self.rows = 0
+        self.dropped = 0
+        self.backpressure = 0
+        self.max_depth = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.errors = 0
+        self.last_error = None
+
+        name = f"writer {Path(self.path).name}"
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def write(self, data):
+        """Queue a batch, called from the acquisition thread"""
+        depth = len(self._queue)
+        if depth >= self.max_batches:
+            self.dropped += 1
+            return False
+        if depth >= self.max_batches // 2:
+            self.backpressure += 1
+        self._queue.append((time.monotonic(), data))
+        self.queued += 1
+        self.max_depth = max(self.max_depth, depth + 1)
+        self._wakeup.set()
+        return True
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            self._drain()
+            if self._stop and not self._queue:
+                break
+        self._sync(force=True)
+        try:
+            self.writer.close()
+        except Exception as ex:
+            self._error("close", ex)
+
+    def _drain(self):
+        if not self._queue:
+            return
+        while self._queue:
+            queued_at, data = self._queue.popleft()
+            try:
+                self.writer.write(data)
+            except Exception as ex:
+                self._error("write", ex)
+                continue
+            latency = time.monotonic() - queued_at
+            self.latency_sum += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.written += 1
+            self.rows += batch_length(data)
+        self._sync()
+
+    def _sync(self, force=False):
+        try:
+            self.writer.flush()
+            if self.fsync_interval < 0 and not force:
+                return
+            now = time.monotonic()
+            if force or now - self._last_fsync >= self.fsync_interval:
+                self.writer.fsync()
+                self._last_fsync = now
+        except Exception as ex:
+            self._error("sync", ex)
+
+    def _error(self, action, ex):
+        self.report(f"{action} failed, {type(ex).__name__}: {ex}")
+
+    def report(self, message):
+        """Count an error, the owner shows `last_error` in the log"""
+        self.errors += 1
+        self.last_error = message
+
+    def stats(self):
+        """Counters for logging and monitoring"""
+        return {
+            "queued": self.queued,
+            "written": self.written,
+            "rows": self.rows,
+            "dropped": self.dropped,
+            "backpressure": self.backpressure,
+            "depth": len(self._queue),
+            "max depth": self.max_depth,
+            "mean latency": self.latency_sum / max(self.written, 1),
+            "max latency": self.latency_max,
+            "errors": self.errors,
+            "last error": self.last_error,
+        }
+
+    def close(self):
+        """Write remaining batches and close the file"""
+        self._stop = True
+        self._wakeup.set()
+        self._thread.join()
+
+
+def make_persistence_worker(config, path, columns, header_lines, dtypes=None):
+    """
+    Writer from `Data Format` running in a PersistenceWorker.
+    An unsupported format falls back to csv and is reported as an error.
+    """
+    try:
+        writer = make_writer(
+            config.get("Data Format", "csv"), path, columns, header_lines, dtypes
+        )
+        problem = None
+    except ValueError as ex:
+        writer = make_writer("csv", path, columns, header_lines, dtypes)
+        problem = f"{ex}, writing csv"
+    worker = PersistenceWorker(
+        writer,
+        config.get("Writer Queue Size", 1000),
+        config.get("Fsync Interval", 10.0),
+    )
+    if problem is not None:
+        worker.report(problem)
+    return worker
+
+
+# MARK: Readers
+def read_metadata(path):
+    """Read sidecar of a binary run"""
+    with open(Path(path).with_suffix(".json"), "r") as f:
+        return json.load(f)
+
+
+def iter_binary_chunks(path, metadata=None):
+    """Yield {column: array} for every chunk of a binary run"""
+    metadata = metadata or read_metadata(path)
+    columns = metadata["columns"]
+    dtypes = [np.dtype(metadata["dtypes"][name]) for name in columns]
+    with open(Path(path).with_suffix(".bin"), "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a ControlUnit binary file")
+        while True:
+            size = f.read(8)
+            if len(size) < 8:
+                return
+            n = int(np.frombuffer(size, dtype=np.int64)[0])
+            chunk = {}
+            for name, dtype in zip(columns, dtypes):
+                buffer = f.read(n * dtype.itemsize)
+                if len(buffer) < n * dtype.itemsize:
+                    return  # truncated chunk, run was interrupted
+                chunk[name] = np.frombuffer(buffer, dtype=dtype)
+            yield chunk
+
+
+def read_binary(path):
+    """Read a binary run into a DataFrame"""
+    metadata = read_metadata(path)
+    columns = metadata["columns"]
+    chunks = list(iter_binary_chunks(path, metadata))
+    if not chunks:
+        return pd.DataFrame(
+            {name: np.array([], dtype=metadata["dtypes"][name]) for name in columns}
+        )
+    return pd.DataFrame(
+        {name: np.concatenate([c[name] for c in chunks]) for name in columns}
+    )
+
+
+def export_csv(source, destination=None):
+    """
+    Export a run to the current CSV layout.
+
+    Parameters
+    ----------
+    source: str or Path
+        `cu_*.bin` (with its `.json` sidecar) or `cu_*.csv`
+    destination: str or Path
+        output csv, by default next to the source with `_export.csv`
+    """
+    source = Path(source)
+    if destination is None:
+        destination = source.with_name(source.stem + "_export.csv")
+
+    if source.suffix == ".csv":
+        with open(source, "r") as f:
+            header_lines = []
+            for line in f:
+                header_lines.append(line)
+                if line.startswith("# [Data]"):
+                    break
+        columns = parse_header(header_lines)["Columns"].split(", ")
+        chunks = pd.read_csv(
+            source,
+            skiprows=len(header_lines),
+            header=None,
+            names=columns,
+            chunksize=100000,
+        )
+    else:
+        metadata = read_metadata(source)
+        header_lines = metadata["header lines"]
+        columns = metadata["columns"]
+        chunks = (pd.DataFrame(c, columns=columns) for c in iter_binary_chunks(source))
+
+    writer = CsvWriter(Path(destination).with_suffix(""), columns, header_lines)
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+    finally:
+        writer.close()
+    return writer.path
@@ -0,0 +1,55 @@
+import pyqtgraph as pg
+from PyQt5 import QtWidgets
+from pyqtgraph.dockarea import Dock
+
+
+class InstrumentationDock(Dock):
+    """Per-stage latency of the acquisition and GUI hot path"""
+
+    COLUMNS = ["stage", "n", "mean, ms", "p50, ms", "p99, ms", "max, ms"]
+
+    def __init__(self):
+        super().__init__("Timing")
+        self.widget = pg.LayoutWidget()
+
+        self.enable = QtWidgets.QCheckBox("record")
+        self.enable.setToolTip("time hot-path stages, small overhead")
+        self.resetBtn = QtWidgets.QPushButton("reset")
+        self.dumpBtn = QtWidgets.QPushButton("dump")
+        self.dumpBtn.setToolTip("save stats to Data Folder")
+
+        self.table = QtWidgets.QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+
+        self.__setLayout()
+
+    def __setLayout(self):
+        self.addWidget(self.widget)
+
+        self.widget.addWidget(self.enable, 0, 0)
+        self.widget.addWidget(self.resetBtn, 0, 1)
+        self.widget.addWidget(self.dumpBtn, 0, 2)
+        self.widget.addWidget(self.table, 1, 0, 1, 3)
+
+    def update_stats(self, stats):
+        """
+        Show stats
+
+        Parameters
+        ----------
+        stats: dict
+            {stage: {"count", "mean", "p50", "p99", "max"}}, seconds
+        """
+        self.table.setRowCount(len(stats))
+        for row, (name, values) in enumerate(stats.items()):
+            cells = [name, f"{values['count']}"] + [
+                f"{values[key] * 1e3:.3f}" for key in ["mean", "p50", "p99", "max"]
+            ]
+            for column, text in enumerate(cells):
+                self.table.setItem(row, column, QtWidgets.QTableWidgetItem(text))
+
+
+if __name__ == "__main__":
+    pass
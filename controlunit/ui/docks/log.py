@@ -2,23 +2,64 @@ import pyqtgraph as pg
 from PyQt5 import QtWidgets
 from pyqtgraph.dockarea import Dock
 
+from controlunit.event_log import LEVELS
+
 
 class LogDock(Dock):
-    def __init__(self):
+    """
+    Append-only log view, at most max_lines lines.
+    Filtering re-renders from the record ring, appending never does.
+    """
+
+    def __init__(self, max_lines=5000):
         super().__init__("Log")
         self.widget = pg.LayoutWidget()
 
-        self.log = QtWidgets.QTextEdit()
+        self.log = QtWidgets.QPlainTextEdit()
         self.log.setReadOnly(True)
-        self.log.document().setDefaultStyleSheet("p { margin: 0; }")
-        self.log.setStyleSheet("QTextEdit { background-color: #f2e9b8; }")
+        self.log.setMaximumBlockCount(max_lines)
+        self.log.setStyleSheet("QPlainTextEdit { background-color: #f2e9b8; }")
+
+        self.level = QtWidgets.QComboBox()
+        self.level.addItems(LEVELS)
+        self.level.setCurrentText("info")
+        self.level.setToolTip("show messages of this level and above")
+        self.search = QtWidgets.QLineEdit()
+        self.search.setPlaceholderText("search")
+        self.search.setClearButtonEnabled(True)
 
         self.__setLayout()
 
     def __setLayout(self):
         self.addWidget(self.widget)
 
-        self.widget.addWidget(self.log, 0, 0, 1, 1)
+        self.widget.addWidget(self.level, 0, 0)
+        self.widget.addWidget(self.search, 0, 1)
+        self.widget.addWidget(self.log, 1, 0, 1, 2)
+
+    def set_max_lines(self, max_lines):
+        self.log.setMaximumBlockCount(max_lines)
+
+    def filter(self):
+        """Current (level, search text)"""
+        return self.level.currentText(), self.search.text()
+
+    def append(self, record):
+        """Show record if it passes the filter, keeps the view at the end"""
+        if not record.matches(*self.filter()):
+            return
+        bar = self.log.verticalScrollBar()
+        at_end = bar.value() == bar.maximum()
+        self.log.appendHtml(record.html())
+        if at_end:
+            bar.setValue(bar.maximum())
+
+    def show_records(self, records):
+        """Replace the view with records, used when the filter changes"""
+        self.log.clear()
+        for record in records:
+            self.log.appendHtml(record.html())
+        self.log.verticalScrollBar().setValue(self.log.verticalScrollBar().maximum())
 
 
 if __name__ == "__main__":
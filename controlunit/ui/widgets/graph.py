@@ -55,6 +55,10 @@ class Graph(pg.GraphicsLayoutWidget):
         self.temperature_plot.setXLink(self.presPl)
         self.temperature_plot.setYRange(0, 320, 0)
 
+    def view_width(self, minimum=200):
+        """Width of the plot area in pixels, sets the number of points to draw"""
+        return max(int(self.pressure_plot.vb.width()), minimum)
+
     def _init_plasma_plot(self, row=0):
         """Plasma parameters plot: Plasma current"""
         self.plasma_plot = self.addPlot(row=row, col=0)
@@ -0,0 +1,95 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.devices.adc_setter import AIO_32_0RA_IRC
+
+
+def test_scan_matches_single_reads_with_fewer_mux_writes():
+    channels = [0, 26, 24, 20, 22, 30, 28, 7, 8]
+    pga = AIO_32_0RA_IRC.PGA
+    gains = [pga.PGA_10_0352V, pga.PGA_5_0176V, pga.PGA_2_5088V] * 3
+    rate = AIO_32_0RA_IRC.DataRate.DR_860SPS
+
+    aio = AIO_32_0RA_IRC(0x49, 0x3E)
+    writes = aio.multiplexer.transactions
+    single = [aio.analog_read_volt(c, rate, g) for c, g in zip(channels, gains)]
+    single_writes = aio.multiplexer.transactions - writes
+
+    aio = AIO_32_0RA_IRC(0x49, 0x3E)
+    volts = aio.scan(channels, rate, gains)
+    np.testing.assert_allclose(volts, single)
+    # 3 channels on Ain0 are paired with 6 on Ain1
+    assert aio.scan_stats["mux writes"] == 6 < single_writes
+    assert aio.scan_stats["scans"] == 1
+    assert aio.scan_stats["last transactions"] > 0
+
+    aio.scan(channels, rate, gains)
+    assert aio.scan_stats["mux writes"] <= 12
+
+
+def test_differential_channel_keeps_the_other_bank():
+    aio = AIO_32_0RA_IRC(0x49, 0x3E)
+    aio.multiplexer.write(0x50)
+    aio.multiplexerSettings = 0x50
+    mux = aio.select_channel(33)
+    assert aio.multiplexerSettings == 0x51
+    assert mux == aio.ads1115.Mux.Ain0_Ain3
+    assert aio.plan_scan([33])[0][0] == 0x51
+
+
+def test_conversion_wait_modes_count_polls():
+    from controlunit.devices.adc_setter import ADS1115
+    from controlunit.devices.dummy import pi
+
+    rate = ADS1115.DataRate.DR_860SPS
+    for mode in ["poll", "sleep"]:
+        ads = ADS1115(0x49, mode)
+        for _ in range(5):
+            ads.analog_read(ADS1115.Mux.Ain0_Gnd, rate, ADS1115.PGA.PGA_2_048V)
+        assert ads.conversions == 5
+        assert ads.polls_per_conversion() == 1
+
+    # the dummy pin never fires: wait times out and falls back to polling
+    ads = ADS1115(0x49, "alert", pi(), 4)
+    ads.analog_read(ADS1115.Mux.Ain0_Gnd, rate, ADS1115.PGA.PGA_2_048V)
+    assert ads.alert_timeouts == 1 and ads.polls == 1
+
+    assert ads.wait_mode_fallback is None
+    fallback = ADS1115(0x49, "alert")
+    assert fallback.wait_mode == "sleep" and "ALERT/RDY" in fallback.wait_mode_fallback
+    assert ADS1115(0x49, "busy").wait_mode == "poll"
+    assert ads.conversion_time(rate) == 1 / 860
+
+
+def test_stream_fills_preallocated_buffer_at_data_rate():
+    aio = AIO_32_0RA_IRC(0x49, 0x3E, "sleep")
+    rate = aio.DataRate.DR_860SPS
+    volts, times = np.zeros(100), np.zeros(100)
+    n = aio.stream(0, rate, aio.PGA.PGA_10_0352V, 0.05, volts, times)
+
+    assert 0 < n <= 43
+    assert aio.stream_stats["samples"] == n
+    np.testing.assert_allclose(
+        volts[:n], aio.volt_per_count(aio.PGA.PGA_10_0352V) * 0x3412
+    )
+    steps = np.diff(times[:n]) * 860
+    assert np.all(steps >= 1 - 1e-6)
+    assert np.allclose(steps, np.round(steps))
+
+
+def test_oversampled_scan_reduces_conversions_of_each_channel():
+    channels = [0, 26, 20]
+    pga = AIO_32_0RA_IRC.PGA
+    gains = [pga.PGA_10_0352V, pga.PGA_5_0176V, pga.PGA_2_5088V]
+    rate = AIO_32_0RA_IRC.DataRate.DR_860SPS
+
+    aio = AIO_32_0RA_IRC(0x49, 0x3E, "sleep")
+    single = aio.scan(channels, rate, gains)
+    volts = aio.scan(channels, rate, gains, [1, 4, 8], ["mean", "median", "mean"])
+    np.testing.assert_allclose(volts, single)
+    np.testing.assert_allclose(aio.scan_std, 0)
+    assert len(aio._block) >= 8
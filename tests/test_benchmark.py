@@ -0,0 +1,30 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.benchmark import compare, extend_channels
+
+
+def test_extend_channels_and_compare_with_baseline():
+    channels = {
+        "Ip": {"Channel": 0, "Gain": 5},
+        "Pu": {"Channel": 1, "Gain": 10},
+    }
+    extended = extend_channels(channels, 5)
+    assert list(extended)[:2] == ["Ip", "Pu"]
+    assert [c["Channel"] for c in extended.values()] == [0, 1, 2, 3, 4]
+
+    def case(samples, p99):
+        stage = {"count": 10, "mean": p99, "p50": p99, "p99": p99, "max": p99}
+        return {
+            "rate": 0.01,
+            "channels": 9,
+            "samples per s": samples,
+            "stages": {"read": stage},
+        }
+
+    baseline = {"cases": [case(100.0, 0.010)]}
+    assert compare({"cases": [case(90.0, 0.011)]}, baseline, 0.25) == []
+    regressions = compare({"cases": [case(50.0, 0.020)]}, baseline, 0.25)
+    assert len(regressions) == 2
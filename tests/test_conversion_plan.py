@@ -0,0 +1,54 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.devices.adc_channels import AdcChannelProps
+from controlunit.devices.conversion_plan import ConversionPlan
+
+CHANNELS = {
+    "Ip": {"Conversion Function": "Hall Sensor"},
+    "Pu": {"Conversion Function": "Pfeiffer Single Gauge"},
+    "Pk": {"Conversion Function": "Pfeiffer IKR251"},
+    "Pd": {"Conversion Function": "Ionization Gauge"},
+    "Bu": {"Conversion Function": "Baratron", "Full Scale": 1.0},
+    "Bd": {"Conversion Function": "Baratron", "Full Scale": 0.1},
+    "MFC1": {"Conversion Function": "No Conversion"},
+    "Ci": {"Conversion Function": "cathode current"},
+    "Cv": {"Conversion Function": "cathode volt"},
+}
+
+
+def make_channels():
+    return [
+        AdcChannelProps(name, Channel=k, Gain=10, Description=name, **kws)
+        for k, (name, kws) in enumerate(CHANNELS.items())
+    ]
+
+
+def reference(channels, voltages, mode, scale):
+    columns = []
+    for k, channel in enumerate(channels):
+        if channel.conversion.__name__ == "ionization_gauge":
+            columns.append(channel.conversion(voltages[:, k], mode, scale))
+        else:
+            columns.append(channel.conversion(voltages[:, k]))
+    return np.column_stack(columns)
+
+
+def test_plan_matches_reference_conversions():
+    channels = make_channels()
+    voltages = np.random.default_rng(0).uniform(0, 10, (50, len(channels)))
+    plan = ConversionPlan(channels)
+    for mode, scale in [(0, -3), (0, -8), (1, -3)]:
+        plan.set_ionization_gauge(mode, scale)
+        expected = reference(channels, voltages, mode, scale)
+        np.testing.assert_allclose(plan.convert(voltages), expected, rtol=1e-12)
+
+
+def test_replan_only_on_change():
+    plan = ConversionPlan(make_channels(), 0, -3)
+    assert not plan.set_ionization_gauge(0, -3)
+    assert plan.set_ionization_gauge(1, -3)
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.data_store import ChunkedStore
+
+
+def make_batch(start, n):
+    return pd.DataFrame(
+        {
+            "date": pd.Timestamp("2024-01-01")
+            + pd.to_timedelta(np.arange(start, start + n), "s"),
+            "Ip_c": np.arange(start, start + n, dtype=float),
+        }
+    )
+
+
+def test_store_keeps_horizon_and_tail():
+    store = ChunkedStore(["date", "Ip_c"], horizon=100, chunk_rows=16)
+    for k in range(0, 1000, 5):
+        store.append(make_batch(k, 5))
+
+    df = store.to_dataframe()
+    assert df["Ip_c"].iloc[-1] == 999
+    assert 100 <= len(store) <= 100 + 2 * 16
+    assert store.dropped_rows + len(store) == 1000
+    assert store.tail(3)["Ip_c"].tolist() == [997.0, 998.0, 999.0]
+
+
+def test_last_rows_are_views_and_truncate_undoes_an_append():
+    store = ChunkedStore(["date", "Ip_c"], horizon=0, chunk_rows=16)
+    store.append(make_batch(0, 10))
+    last = store.last(4)
+    assert last["Ip_c"].tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert np.shares_memory(last["Ip_c"], store.chunks[0].columns["Ip_c"])
+
+    store.append(make_batch(10, 10))
+    assert store.last(8)["Ip_c"].tolist() == list(range(12, 20))
+    store.truncate(10)
+    assert len(store) == 10 and len(store.chunks) == 1
+    assert store.tail(2)["Ip_c"].tolist() == [8.0, 9.0]
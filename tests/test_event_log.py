@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.event_log import LogFile, LogRecord, LogRing, level_of
+
+
+def test_ring_is_bounded_filters_and_file_is_buffered(tmp_path):
+    ring = LogRing(3)
+    path = tmp_path / "controlunit.log"
+    log_file = LogFile(str(path))
+    messages = [
+        "<font color='blue'>ADC</font> started",
+        "<font color='red'>ADC</font> 3 late ticks",
+        "sampling set to 0.1",
+        "<font color='red'>ADC</font> 5 rows overwritten",
+    ]
+    for message in messages:
+        record = LogRecord(message, level_of(message), time_stamp="t")
+        ring.append(record)
+        log_file.write(record)
+
+    assert len(ring) == 3 and ring.dropped == 1
+    assert [r.text for r in ring.select("warning")] == [
+        "ADC 3 late ticks",
+        "ADC 5 rows overwritten",
+    ]
+    assert [r.text for r in ring.select(search="SAMPLING")] == ["sampling set to 0.1"]
+
+    log_file.flush()
+    assert path.read_text().splitlines()[0] == "t, ADC started"
+    log_file.close()
+    assert len(path.read_text().splitlines()) == 4
+
+
+def test_debug_and_error_levels_filter():
+    ring = LogRing(10)
+    ring.append(LogRecord("ADC 100 ticks at 10.00 Hz", "debug"))
+    ring.append(LogRecord("<font color='blue'>ADC</font> started", "info"))
+    message = "<font color='red'>ADC</font> cu.csv: 1 write errors"
+    ring.append(LogRecord(message, "error"))
+
+    assert len(ring.select("debug")) == 3
+    assert [r.level for r in ring.select("info")] == ["info", "error"]
+    assert [r.text for r in ring.select("error")] == ["ADC cu.csv: 1 write errors"]
@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.instrumentation import Instrumentation, LatencyHistogram
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for _ in range(98):
+        histogram.record(0.001)
+    histogram.record(0.05)
+    histogram.record(20.0)  # overflow bin
+
+    assert histogram.count == 100
+    assert histogram.counts.sum() == 100
+    assert 0.001 <= histogram.percentile(50) < 0.0013
+    assert histogram.percentile(99) < 0.07
+    assert histogram.percentile(100) == histogram.max == 20.0
+    assert "p99" in histogram.summary()
+    histogram.reset()
+    assert histogram.count == 0 and histogram.percentile(50) == 0.0
+
+
+def test_stages_record_only_when_enabled(tmp_path):
+    stages = Instrumentation()
+
+    @stages.timed("work")
+    def work():
+        time.sleep(0.01)
+        return 1
+
+    assert work() == 1
+    started = stages.start()
+    stages.stop("block", started)
+    assert started == 0 and stages.stats() == {}
+
+    stages.enabled = True
+    work()
+    started = stages.start()
+    time.sleep(0.005)
+    stages.stop("block", started)
+    stats = stages.stats()
+    assert stats["work"]["count"] == 1 and 0.01 <= stats["work"]["max"] < 0.02
+    assert 0.005 <= stats["block"]["max"] < 0.015
+
+    data = json.loads(open(stages.dump(tmp_path / "timing.json")).read())
+    assert sum(data["bins"]["work"]["counts"]) == 1
+    stages.reset()
+    assert stages.stats() == {}
+
+
+def test_stages_added_from_a_worker_while_reading_stats():
+    import threading
+
+    stages = Instrumentation(enabled=True)
+
+    def worker():
+        for k in range(2000):
+            stages.stop(f"stage {k}", stages.start())
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    while thread.is_alive():
+        stages.stats()  # the Timing dock, from the GUI timer
+    thread.join()
+    assert len(stages.stats()) == 2000
@@ -0,0 +1,77 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.loader import build_cache, cache_path, open_run
+from controlunit.storage import ADC_COLUMN_DTYPES, CsvWriter
+
+HEADER = [
+    "# Title , Control Unit ADC signals\n",
+    "# Columns , date, time, IGmode, Ip, Ip_c\n",
+    "# Signals , Ip\n",
+    "# Channels , 0\n",
+    "#\n",
+    "# [Data]\n",
+]
+COLUMNS = ["date", "time", "IGmode", "Ip", "Ip_c"]
+
+
+def make_run(path, n):
+    writer = CsvWriter(path, COLUMNS, HEADER, ADC_COLUMN_DTYPES)
+    data = pd.DataFrame(
+        {
+            "date": pd.date_range("2024-01-01 12:00", periods=n, freq="100ms"),
+            "time": np.arange(n) * 0.1,
+            "IGmode": np.arange(n) % 2,
+            "Ip": np.linspace(0, 1, n),
+            "Ip_c": np.linspace(0, 2, n),
+        }
+    )
+    for k in range(0, n, 3):
+        writer.write(data.iloc[k : k + 3])
+    writer.close()
+    return writer.path, data
+
+
+def test_csv_run_is_cached_and_indexed(tmp_path):
+    source, data = make_run(tmp_path / "cu_20240101_120000", 25)
+    build_cache(source, chunk_rows=4)
+    run = open_run(source)
+    assert run.signals == ["Ip"] and run.channels == [0]
+    assert len(run) == 25 and len(run.offsets) == 7
+
+    df = run.read()
+    assert df["date"].dtype == np.dtype("datetime64[us]")
+    assert df["IGmode"].dtype == np.int64
+    np.testing.assert_array_equal(df["date"].values, data["date"].values)
+    np.testing.assert_allclose(df["Ip_c"].values, data["Ip_c"].values)
+
+    part = run.between(0.55, 1.25, ["time", "Ip"])
+    expected = data[(data["time"] >= 0.55) & (data["time"] < 1.25)]
+    assert list(part.columns) == ["time", "Ip"]
+    np.testing.assert_allclose(part["Ip"].values, expected["Ip"].values)
+    by_date = run.between(data["date"][3], data["date"][5], on="date")
+    np.testing.assert_allclose(by_date["time"].values, data["time"][3:5].values)
+    assert len(run.between(10, 20)) == 0
+
+    # unchanged source reuses the cache, a changed one rebuilds it
+    assert len(open_run(source).offsets) == 7
+    make_run(tmp_path / "cu_20240101_120000", 40)
+    assert len(open_run(source)) == 40
+    assert cache_path(source).with_suffix(".json").exists()
+
+
+def test_csv_dates_with_and_without_fractional_seconds(tmp_path):
+    path = tmp_path / "cu_20240101_130000.csv"
+    with open(path, "w") as f:
+        f.writelines(HEADER)
+        f.write("2024-01-01 13:00:00,0.0,0,1.0,2.0\n")
+        f.write("2024-01-01 13:00:00.250000,0.25,0,1.0,2.0\n")
+
+    dates = open_run(path).read(["date"])["date"].to_numpy()
+    expected = np.array(["2024-01-01T13:00:00", "2024-01-01T13:00:00.25"])
+    np.testing.assert_array_equal(dates, expected.astype("datetime64[us]"))
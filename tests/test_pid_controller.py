@@ -0,0 +1,91 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.devices.pid_controller import (
+    PIDController,
+    ControlTrace,
+    TRACE_COLUMNS,
+    TRACE_DTYPES,
+)
+from controlunit.storage import BinaryWriter, read_binary
+
+
+def test_anti_windup_and_derivative_on_measurement():
+    pid = PIDController(1.0, 10.0, 0.5, output_limits=(0, 5), derivative_filter=0.05)
+    pid.set_setpoint(100.0)
+    for _ in range(100):
+        output = pid.step(0.0, 0.1)
+    assert output == 5
+    assert pid.integral <= 5  # no windup while saturated
+
+    # setpoint step: derivative acts on measurement only
+    pid.reset()
+    pid.step(1.0, 0.1)
+    pid.set_setpoint(3.0)
+    pid.step(1.0, 0.1)
+    assert pid.components[2] == 0.0
+
+    # recovers right after the error changes sign
+    pid.set_setpoint(1.0)
+    for _ in range(3):
+        pid.step(2.0, 0.1)
+    assert pid.output < 5
+
+
+def test_gain_schedule_and_trace(tmp_path):
+    pid = PIDController(1, 0, 0, schedule=[[10, 2, 0, 0], [20, 3, 0, 0]])
+    for setpoint, kp in [(5, 1), (10, 2), (25, 3)]:
+        pid.set_setpoint(setpoint)
+        assert pid.tunings[0] == kp
+
+    trace = ControlTrace(
+        BinaryWriter(tmp_path / "cu_pid", TRACE_COLUMNS, ["# [Data]\n"], TRACE_DTYPES),
+        size=4,
+    )
+    for k in range(10):
+        output = pid.step(float(k), 0.1)
+        trace.append(k * 0.1, pid.setpoint, float(k), *pid.components, output)
+    trace.close()
+
+    data = read_binary(tmp_path / "cu_pid.bin")
+    assert len(data) == 10
+    assert data["P"].dtype == np.float32
+    np.testing.assert_allclose(data["P"], 3 * (25 - np.arange(10)))
+
+
+def test_no_pid_output_reaches_the_dac_after_abort():
+    import datetime
+    import threading
+    import time
+
+    from PyQt5 import QtCore
+
+    from controlunit.devices.mcp4725 import MCP4725
+
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    dac = MCP4725("MCP4725", app, datetime.datetime.now(), {}, None)
+    writes = []
+
+    class SlowDAC:
+        def set_voltage(self, voltage):
+            writes.append(voltage)
+            time.sleep(0.001)
+
+    dac.mcp = SlowDAC()
+
+    def control_loop():
+        for _ in range(200):
+            dac.actuate(1000.0, time.monotonic())
+
+    thread = threading.Thread(target=control_loop)
+    thread.start()
+    while not writes:
+        time.sleep(0.001)
+    dac.abort()
+    thread.join()
+
+    assert writes[-1] == 0 and writes.count(0) == 1
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.plot_data_handler import PlotModel, last_sampled
+
+
+def test_incremental_view_matches_full_rebuild():
+    incremental = PlotModel(["Ip"])
+    time = np.arange(20000) * 0.1
+    values = np.sin(time)[np.newaxis]
+    for k in range(0, time.size, 5):
+        incremental.append(time[k : k + 5], values[:, k : k + 5])
+        t, v = incremental.view(300, max_points=200)
+
+    rebuilt = PlotModel(["Ip"])
+    rebuilt.append(time, values)
+    t_full, v_full = rebuilt.view(300, max_points=200)
+
+    assert t[0] > time[-1] - 300 and t[-1] <= time[-1]
+    assert len(t) <= 2 * 200 + 2
+    np.testing.assert_array_equal(t, t_full)
+    np.testing.assert_array_equal(v["Ip"], v_full["Ip"])
+
+
+def test_envelope_keeps_spikes():
+    model = PlotModel(["Ip"])
+    values = np.zeros((1, 100000))
+    values[0, 12345] = 5.0
+    values[0, 54321] = -3.0
+    model.append(np.arange(100000) * 0.01, values)
+    t, v = model.view(-1, max_points=500)
+    assert len(t) <= 2 * 500 + 2
+    assert v["Ip"].max() == 5.0 and v["Ip"].min() == -3.0
+
+
+def test_pyramid_bounds_memory_and_keeps_full_history():
+    model = PlotModel(["Ip"], raw_capacity=5000, level_capacity=5000)
+    time = np.arange(200000) * 0.01
+    values = np.cos(time)[np.newaxis]
+    for k in range(0, time.size, 1000):
+        model.append(time[k : k + 1000], values[:, k : k + 1000])
+
+    assert len(model.raw) == 5000
+    assert all(len(level) <= 5000 for level in model.levels)
+    t, v = model.view(-1, max_points=300)
+    assert t[0] == time[0] and len(t) <= 2 * 300 + 2
+    assert v["Ip"].max() == 1.0
+
+
+def test_last_sampled_skips_rows_without_a_sample():
+    assert last_sampled([1.0, np.nan, 2.0, np.nan, 6.0, np.nan]) == 3.0
+    assert last_sampled([np.nan, np.nan]) is None
@@ -0,0 +1,97 @@
+import datetime
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit import readsettings
+from controlunit.devices.replay import ReplayADC
+from controlunit.loader import open_run
+from controlunit.storage import ADC_COLUMN_DTYPES, CsvWriter
+
+
+def recorded_run(path, config, n, **recorded):
+    columns = config["ADC Column Names"]
+    header = [
+        f"# Columns , {', '.join(columns)}\n",
+        f"# Signals , {', '.join(config['ADC Signal Names'])}\n",
+        "# [Data]\n",
+    ]
+    data = {name: np.zeros(n) for name in columns}
+    data["date"] = pd.date_range("2024-01-01 12:00", periods=n, freq="10ms")
+    data["time"] = np.arange(n) * 0.01
+    data["IGscale"] = np.full(n, -3)
+    for name in config["ADC Signal Names"]:
+        data[name] = np.random.default_rng(0).uniform(0.1, 1, n)
+    data.update(recorded)
+    writer = CsvWriter(path, columns, header, ADC_COLUMN_DTYPES)
+    writer.write(pd.DataFrame(data, columns=columns))
+    writer.close()
+    return writer.path, data
+
+
+def test_replay_sends_every_recorded_row_in_order(tmp_path):
+    from PyQt5 import QtCore
+    from devices.dummy import pigpio
+
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    settings = os.path.join(os.path.dirname(readsettings.__file__), "settings.yml")
+    config = readsettings.load_settings(settings)
+    config["Data Folder"] = str(tmp_path)
+    readsettings.init_adc_channels(config)
+    source, data = recorded_run(tmp_path / "cu_20240101_120000", config, 2500)
+    config["Replay"] = {"File": str(source), "Speed": 0, "Batch Rows": 400}
+
+    worker = ReplayADC("ADC", app, datetime.datetime.now(), config, pigpio.pi())
+    ranges = []
+    worker.data_ready.connect(lambda result: ranges.append(result[0]))
+    worker.prep_scheduler()
+    while not worker._abort:
+        worker.tick()
+        worker.buffer.release(worker.buffer.head)
+    worker.finish()
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == 2500
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert max(stop - start for start, stop in ranges) <= 400
+    replayed = open_run(worker.writer.writer.path).read()
+    np.testing.assert_array_equal(replayed["date"].values, data["date"].values)
+    np.testing.assert_allclose(replayed["Ip"].values, data["Ip"])
+    assert np.all(replayed["Ip_c"] != 0)
+
+
+def test_replay_converts_each_run_of_gauge_settings(tmp_path):
+    from PyQt5 import QtCore
+    from devices.dummy import pigpio
+
+    from controlunit.devices.conversion_plan import ConversionPlan
+
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    settings = os.path.join(os.path.dirname(readsettings.__file__), "settings.yml")
+    config = readsettings.load_settings(settings)
+    config["Data Folder"] = str(tmp_path)
+    readsettings.init_adc_channels(config)
+    # the gauge switches to log mode inside the first batch
+    ig_mode = np.repeat([0, 1], [150, 450])
+    source, data = recorded_run(
+        tmp_path / "cu_20240101_120000", config, 600, IGmode=ig_mode
+    )
+    config["Replay"] = {"File": str(source), "Speed": 0, "Batch Rows": 400}
+
+    worker = ReplayADC("ADC", app, datetime.datetime.now(), config, pigpio.pi())
+    worker.prep_scheduler()
+    while not worker._abort:
+        worker.tick()
+        worker.buffer.release(worker.buffer.head)
+    worker.finish()
+
+    replayed = open_run(worker.writer.writer.path).read()
+    channels = [worker.adc_channels[name] for name in worker.adc_signals_columns]
+    k = worker.adc_signals_columns.index("Pd")
+    raw = replayed[worker.adc_signals_columns].to_numpy()
+    for mode, rows in [(0, slice(0, 150)), (1, slice(150, 600))]:
+        expected = ConversionPlan(channels, mode, -3).convert(raw[rows])[:, k]
+        np.testing.assert_allclose(replayed["Pd_c"].to_numpy()[rows], expected)
@@ -0,0 +1,109 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.devices.ring_buffer import RingBuffer
+
+
+def test_append_consume_wraps_around():
+    buffer = RingBuffer(["time", "Ip", "IGmode"], capacity=4, dtypes={"IGmode": int})
+    for i in range(3):
+        buffer.append((i * 0.1, i, 0))
+    buffer.consume()
+    for i in range(3, 6):
+        buffer.append((i * 0.1, i, 1))
+
+    start, stop = buffer.consume()
+    df = buffer.to_dataframe(start, stop)
+    assert (start, stop) == (3, 6)
+    assert df["Ip"].tolist() == [3.0, 4.0, 5.0]
+    assert df["IGmode"].dtype == np.int64
+    assert len(buffer) == 0
+
+
+def test_overrun_drops_oldest_rows():
+    buffer = RingBuffer(["Ip"], capacity=3)
+    for i in range(5):
+        buffer.append((i,))
+    assert buffer.overruns == 2
+    assert buffer.read("Ip").tolist() == [2.0, 3.0, 4.0]
+    assert buffer.last("Ip", 2).tolist() == [3.0, 4.0]
+
+
+def test_extend_writes_blocks_across_the_wrap():
+    buffer = RingBuffer(["time", "Ip"], capacity=5)
+    buffer.extend({"time": np.arange(3.0), "Ip": np.arange(3.0)})
+    buffer.consume()
+    buffer.extend({"time": np.arange(3.0, 7.0), "Ip": np.arange(3.0, 7.0)})
+    assert buffer.read("Ip").tolist() == [3.0, 4.0, 5.0, 6.0]
+    buffer.extend({"time": np.arange(7.0, 10.0), "Ip": np.arange(7.0, 10.0)})
+    assert buffer.overruns == 1
+    assert buffer.read("Ip").tolist() == [5.0, 6.0, 7.0, 8.0, 9.0]
+
+
+def test_block_reads_views_and_reports_overwritten_rows():
+    buffer = RingBuffer(["time", "Ip"], capacity=4)
+    for i in range(3):
+        buffer.append((i * 0.1, i))
+    start, stop = buffer.consume()
+
+    block = buffer.block(start, stop)
+    assert np.shares_memory(block["Ip"], buffer.data["Ip"])
+    owned = buffer.block(start, stop, copy=True)
+    assert not np.shares_memory(owned["Ip"], buffer.data["Ip"])
+    assert buffer.overwritten(start) == 0
+
+    for i in range(3, 6):
+        buffer.append((i * 0.1, i))
+    assert buffer.overwritten(start) == 2
+    assert owned["Ip"].tolist() == [0.0, 1.0, 2.0]
+    assert buffer.block(start + 2, stop)["Ip"].tolist() == [2.0]
+
+
+def test_rows_being_written_count_as_overwritten():
+    buffer = RingBuffer(["time", "Ip"], capacity=4)
+    buffer.extend({"time": np.arange(4.0), "Ip": np.arange(4.0)})
+    start, stop = buffer.consume()
+    # the producer is inside extend, head is not advanced yet
+    buffer.writing = buffer.head + 2
+    assert buffer.overwritten(start) == 2
+    buffer.extend({"time": np.arange(4.0, 6.0), "Ip": np.arange(4.0, 6.0)})
+    assert buffer.overwritten(start) == 2
+
+
+def test_adc_holds_rows_until_the_gui_releases_them(tmp_path):
+    import datetime
+
+    from PyQt5 import QtCore
+    from devices.dummy import pigpio
+
+    from controlunit import readsettings
+    from controlunit.devices.adc import ADC
+
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    settings = os.path.join(os.path.dirname(readsettings.__file__), "settings.yml")
+    config = readsettings.load_settings(settings)
+    config["Data Folder"] = str(tmp_path)
+    config["ADC Streaming"] = False
+    readsettings.init_adc_channels(config)
+    worker = ADC("ADC", app, datetime.datetime.now(), config, pigpio.pi())
+    ranges = []
+    worker.data_ready.connect(lambda result: ranges.append(result[0]))
+    # every tick sends its row
+    worker.STEP = 1
+
+    for _ in range(3):
+        worker.tick()
+    # the GUI has not released the first range, later rows are held
+    assert ranges == [(0, 1)] and worker.held_batches == 2
+    worker.buffer.release(1)
+    worker.tick()
+    assert ranges == [(0, 1), (1, 4)]
+    worker.collect_data()
+    worker.put_new_data_in_buffer()
+    worker.send_processed_data_to_main_thread(flush=True)
+    assert ranges[-1] == (4, 5)
+    worker.close_file()
@@ -0,0 +1,111 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.devices.scan_table import ScanTable
+
+
+def test_table_meets_every_rate_with_even_scans():
+    # Ip every tick, two pressures at 2 Hz, four slow channels at 1 Hz
+    rates = [None, 2, 2, 1, 1, 1, 1]
+    table = ScanTable(rates, tick_rate=10, indices=[0, 1, 2, 4, 5, 6, 7])
+
+    assert len(table) == 10
+    reads = np.zeros(8, dtype=int)
+    for _ in range(len(table)):
+        reads[table.next()] += 1
+    np.testing.assert_array_equal(reads, [10, 2, 2, 0, 1, 1, 1, 1])
+    # 18 conversions per table instead of 70, at most 2 per tick
+    conversions = table.conversions()
+    assert conversions.sum() == 18
+    assert conversions.max() == 2
+    assert table.rates() == [10, 2, 2, 1, 1, 1, 1]
+    np.testing.assert_array_equal(table.next(), table.rows[0])
+
+
+def test_rates_are_rounded_to_tick_dividers():
+    table = ScanTable([None, 10, 3, 0.7], tick_rate=10)
+    assert table.dividers == [1, 1, 3, 14]
+    assert len(table) == 42
+
+    with pytest.raises(ValueError):
+        ScanTable([0.0], tick_rate=10)
+    with pytest.raises(ValueError):
+        ScanTable([30], tick_rate=10)
+    with pytest.raises(ValueError):
+        ScanTable([10 / 97, 10 / 101, 10 / 103], tick_rate=10)
+
+
+def test_sampling_time_change_rebuilds_the_scan_table(tmp_path):
+    import datetime
+
+    from PyQt5 import QtCore
+    from devices.dummy import pigpio
+
+    from controlunit import readsettings
+    from controlunit.devices.adc import ADC
+
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    settings = os.path.join(os.path.dirname(readsettings.__file__), "settings.yml")
+    config = readsettings.load_settings(settings)
+    config["Data Folder"] = str(tmp_path)
+    config["ADC Streaming"] = False
+    config["ADC Channels"]["Bu"]["Rate"] = 5
+    readsettings.init_adc_channels(config)
+    worker = ADC("ADC", app, datetime.datetime.now(), config, pigpio.pi())
+    messages = []
+    worker.send_message.connect(messages.append)
+    worker.send_log.connect(lambda message, level: messages.append(message))
+    first = worker.savepath
+    bu = list(worker.adc_channels).index("Bu")
+
+    # 2 Hz ticks cannot read Bu at 5 Hz
+    worker.set_sampling_time(0.5)
+    assert "refused" in messages[-1]
+    assert worker.sampling_time == 0.1 and worker.savepath == first
+
+    worker.aio.scan(worker.scan_channels[:2], worker.aio.DataRate.DR_860SPS, [1, 1])
+    worker.set_sampling_time(0.05)
+    # scan counters restart with the new file
+    assert worker.aio.scan_stats["scans"] == 0
+    assert any("1 scans" in message for message in messages)
+    assert worker.scan_table.tick_rate == 20 and worker.scan_table.dividers[bu] == 4
+    assert worker.channel_rates()[bu] == 5
+    assert worker.control_period == 1 / config["Plasma Current Control"]["Rate"]
+    assert worker.savepath != first
+    worker.close_file()
+    with open(worker.savepath) as f:
+        rates = [line for line in f if line.startswith("# Rates")][0]
+    assert rates.split(" , ")[1].split(", ")[bu] == "5"
+
+
+def test_sampling_time_change_resizes_the_fast_channel_arrays(tmp_path):
+    import datetime
+
+    from PyQt5 import QtCore
+    from devices.dummy import pigpio
+
+    from controlunit import readsettings
+    from controlunit.devices.adc import ADC
+
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    settings = os.path.join(os.path.dirname(readsettings.__file__), "settings.yml")
+    config = readsettings.load_settings(settings)
+    config["Data Folder"] = str(tmp_path)
+    config["ADC Streaming"] = True
+    config["ADC Buffer Size"] = 64
+    readsettings.init_adc_channels(config)
+    worker = ADC("ADC", app, datetime.datetime.now(), config, pigpio.pi())
+
+    # a burst of ADC Streaming Slice at a 10 % fast clock fits
+    worker.set_sampling_time(0.01)
+    assert len(worker.fast_volts) >= worker.stream_slice * 860 * 1.1
+    worker.set_sampling_time(0.5)
+    assert len(worker.fast_times) >= 0.5 * 860 * 1.1
+    assert worker.fast_buffer.capacity >= worker.STEP * 0.5 * 860 * 1.1
+    assert worker.control_source[0] is worker.fast_buffer
+    worker.close_file()
@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.devices.device import TickScheduler
+
+
+class FakeClock:
+    """Monotonic clock that only moves when sleeping or working"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_deadlines_compensate_work_time():
+    clock = FakeClock()
+    scheduler = TickScheduler(0.02, clock, clock.sleep)
+    for _ in range(10):
+        scheduler.wait()
+        clock.sleep(0.01)  # work shorter than the period
+    # 10 ticks at 20 ms plus the last work, not 10 * 30 ms
+    assert abs(clock() - scheduler.start - 0.21) < 1e-9
+    assert scheduler.overruns == 0 and scheduler.lateness_max == 0
+
+
+def test_overrun_skips_missed_deadlines():
+    clock = FakeClock()
+    scheduler = TickScheduler(0.01, clock, clock.sleep)
+    scheduler.wait()
+    clock.sleep(0.045)
+    lateness = scheduler.wait()
+    assert abs(lateness - 0.035) < 1e-9
+    assert scheduler.overruns == 1
+    assert scheduler.missed == 3
+    # the next deadline is back on the grid, in the future
+    assert abs(scheduler.delay() - 0.005) < 1e-9
+    stats = scheduler.stats()
+    assert stats["ticks"] == 2 and stats["max jitter"] == lateness
+
+
+def test_period_change_restarts_the_stats():
+    clock = FakeClock()
+    scheduler = TickScheduler(0.05, clock, clock.sleep)
+    for _ in range(20):
+        scheduler.wait()
+    scheduler.set_period(0.1)
+    for _ in range(5):
+        scheduler.wait()
+    stats = scheduler.stats()
+    assert stats["ticks"] == 5 and abs(stats["rate"] - 10) < 1e-9
+
+
+def test_timer_driven_worker_finalizes_in_its_thread():
+    from PyQt5 import QtCore
+
+    from controlunit.devices.device import DeviceThread
+
+    class Counter(DeviceThread):
+        def start(self):
+            self.sampling_time = 0.01
+            self.ticks = 0
+            self.finalized_in = None
+            self.start_ticks()
+
+        def tick(self):
+            self.ticks += 1
+
+        def finalize(self):
+            self.finalized_in = QtCore.QThread.currentThread()
+
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    worker = Counter("counter", app, None, {}, None)
+    thread = QtCore.QThread()
+    worker.moveToThread(thread)
+    thread.started.connect(worker.start)
+    thread.start()
+    time.sleep(0.1)
+    QtCore.QMetaObject.invokeMethod(worker, "abort", QtCore.Qt.BlockingQueuedConnection)
+    thread.quit()
+    thread.wait()
+
+    # wall-clock timing is covered with the fake clock above
+    assert worker.ticks >= 1
+    assert worker.finalized_in is thread
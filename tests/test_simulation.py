@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.devices import simulation
+from controlunit.devices.adc_channels import AdcChannelProps
+from controlunit.devices.adc_setter import AIO_32_0RA_IRC
+from controlunit.devices.conversion_plan import ConversionPlan
+from controlunit.devices.mcp4725_setter import MCP4725Setter
+
+CHANNELS = {
+    "Ip": {
+        "Channel": 0,
+        "Gain": 5,
+        "Description": "",
+        "Conversion Function": "Hall Sensor",
+    },
+    "Pu": {
+        "Channel": 26,
+        "Gain": 10,
+        "Description": "",
+        "Conversion Function": "Pfeiffer Single Gauge",
+    },
+    "Bd": {
+        "Channel": 22,
+        "Gain": 1,
+        "Description": "",
+        "Conversion Function": "Baratron",
+        "Full Scale": 0.1,
+    },
+}
+
+
+def test_plant_steps_faster_than_real_time():
+    plant = simulation.Plant({"Simulation": {"Plasma Time Constant": 0.1}})
+    start = time.perf_counter()
+    trace = plant.simulate(20.0, 0.01, lambda t, signals: 2.0)
+    assert time.perf_counter() - start < 2.0
+
+    # no gas: cathode current rises, almost no discharge
+    assert abs(trace["Ci"][-1] - 6.0) < 1e-3
+    assert trace["Ip"][-1] < 0.01
+
+    plant.set_mfc(0, 2.5)
+    trace = plant.simulate(20.0, 0.01)
+    pu = 1e-5 + 0.02 * 2.5
+    assert abs(trace["Pu"][-1] - pu) < 1e-3
+    assert abs(trace["Ip"][-1] - 0.5 * 4.0 * pu / (pu + 0.01)) < 1e-2
+
+
+def test_buses_drive_the_plant_and_read_back_through_conversions():
+    parameters = {"Seed": 1, "I2C Latency": 1e-4, "Time Scale": 100.0}
+    plant = simulation.Plant({"Simulation": parameters, "ADC Channels": CHANNELS})
+    aio = AIO_32_0RA_IRC(0x49, 0x3E)
+    aio.ads1115.i2c = aio.multiplexer.i2c = simulation.SMBus(1, plant)
+
+    MCP4725Setter(simulation.pi(plant)).set_voltage(2.0)
+    dac = simulation.SpiDev(0, 0, plant)
+    dac.writebytes([0x30, 0x80, 0x00])
+    time.sleep(0.2)  # 20 s of plant time
+
+    before = plant.transactions
+    volts = aio.scan([0, 26, 22], aio.DataRate.DR_860SPS)
+    assert plant.transactions - before == aio.scan_stats["last transactions"]
+
+    props = [AdcChannelProps(name, **kws) for name, kws in CHANNELS.items()]
+    values = ConversionPlan(props).convert(volts)
+    signals = plant.signals()
+    np.testing.assert_allclose(
+        values, [signals["Ip"], signals["Pu"], signals["Bd"]], rtol=0.1
+    )
+    assert values[0] > 0.5
+
+
+def test_oversampling_lowers_scan_noise():
+    parameters = {"Seed": 2, "I2C Latency": 0, "ADC Noise": 0.01}
+    plant = simulation.Plant({"Simulation": parameters, "ADC Channels": CHANNELS})
+    aio = AIO_32_0RA_IRC(0x49, 0x3E)
+    aio.ads1115.i2c = aio.multiplexer.i2c = simulation.SMBus(1, plant)
+    rate, gains = aio.DataRate.DR_860SPS, [aio.PGA.PGA_1_2544V]
+
+    # channel 5 is not wired to the plant, it reads ADC noise only
+    single = [aio.scan([5], rate, gains)[0] for _ in range(20)]
+    averaged = [aio.scan([5], rate, gains, [16])[0] for _ in range(20)]
+    assert aio.scan_std[0] > 0
+    assert np.std(averaged) < 0.5 * np.std(single)
+
+
+def test_first_continuous_read_is_not_the_previous_channel():
+    parameters = {"Seed": 3, "I2C Latency": 0, "ADC Clock Error": 0.1}
+    plant = simulation.Plant({"Simulation": parameters, "ADC Channels": CHANNELS})
+    aio = AIO_32_0RA_IRC(0x49, 0x3E)
+    aio.ads1115.i2c = aio.multiplexer.i2c = simulation.SMBus(1, plant)
+    rate, pga = aio.DataRate.DR_860SPS, aio.PGA.PGA_10_0352V
+    volts, times = np.zeros(20), np.zeros(20)
+
+    # Pu reads a few V, channel 5 only ADC noise
+    for _ in range(10):
+        assert aio.scan([26], rate, [pga])[0] > 1
+        n = aio.stream(5, rate, pga, 0.01, volts, times)
+        assert n > 0 and np.all(np.abs(volts[:n]) < 0.1)
+
+
+def test_oversampled_block_starts_after_the_channel_switch():
+    parameters = {"Seed": 4, "I2C Latency": 0, "ADC Clock Error": 0.1}
+    plant = simulation.Plant({"Simulation": parameters, "ADC Channels": CHANNELS})
+    aio = AIO_32_0RA_IRC(0x49, 0x3E)
+    aio.ads1115.i2c = aio.multiplexer.i2c = simulation.SMBus(1, plant)
+    rate, pga = aio.DataRate.DR_860SPS, aio.PGA.PGA_10_0352V
+
+    # Pu reads a few V, channel 5 only ADC noise
+    for _ in range(10):
+        volts = aio.scan([26, 5], rate, [pga, pga], [1, 4])
+        assert volts[0] > 1 and abs(volts[1]) < 0.1
+        assert aio.scan_std[1] < 0.1
+
+
+def test_simulated_devices_share_one_module_and_plant():
+    import subprocess
+
+    code = (
+        "import controlunit\n"
+        "from devices.dummy import smbus, pigpio\n"
+        "from controlunit.devices import simulation\n"
+        "assert simulation._plant is None\n"
+        "assert smbus is simulation.smbus and pigpio is simulation.pigpio\n"
+        "assert smbus.SMBus(1).plant is pigpio.pi().plant is simulation.get_plant()\n"
+    )
+    env = dict(os.environ, CONTROLUNIT_SIMULATION="1")
+    root = os.path.join(os.path.dirname(__file__), "..")
+    subprocess.run([sys.executable, "-c", code], cwd=root, env=env, check=True)
@@ -0,0 +1,95 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controlunit.storage import (
+    BinaryWriter,
+    PersistenceWorker,
+    export_csv,
+    make_persistence_worker,
+    parse_header,
+    read_binary,
+)
+
+HEADER = [
+    "# Title , Control Unit ADC signals\n",
+    "# Columns , date, time, IGmode, Ip\n",
+    "#\n",
+    "# [Data]\n",
+]
+COLUMNS = ["date", "time", "IGmode", "Ip"]
+DTYPES = {"date": "datetime64[us]", "IGmode": np.int64}
+
+
+def make_batch(start, n):
+    return pd.DataFrame(
+        {
+            "date": pd.date_range("2024-01-01", periods=n, freq="100ms")
+            + pd.Timedelta(start * 100, "ms"),
+            "time": np.arange(start, start + n) * 0.1,
+            "IGmode": np.ones(n, dtype=np.int64),
+            "Ip": np.linspace(0, 1, n),
+        }
+    )
+
+
+def test_binary_roundtrip_and_csv_export(tmp_path):
+    writer = BinaryWriter(tmp_path / "cu_20240101_000000", COLUMNS, HEADER, DTYPES)
+    batches = [make_batch(0, 3), make_batch(3, 5)]
+    for batch in batches:
+        writer.write(batch)
+    writer.close()
+
+    df = read_binary(writer.path)
+    expected = pd.concat(batches, ignore_index=True)
+    assert df["date"].dtype == np.dtype("datetime64[us]")
+    np.testing.assert_array_equal(df["Ip"].values, expected["Ip"].values)
+    np.testing.assert_array_equal(df["date"].values, expected["date"].values)
+
+    csv_path = export_csv(writer.path)
+    with open(csv_path) as f:
+        lines = f.readlines()
+    assert lines[: len(HEADER)] == HEADER
+    assert parse_header(HEADER)["Columns"].split(", ") == COLUMNS
+    assert len(lines) == len(HEADER) + len(expected)
+
+
+def test_persistence_worker_writes_in_background(tmp_path):
+    writer = BinaryWriter(tmp_path / "cu_20240101_000001", COLUMNS, HEADER, DTYPES)
+    worker = PersistenceWorker(writer, max_batches=100, fsync_interval=0)
+    for i in range(10):
+        assert worker.write(make_batch(i * 3, 3))
+    worker.close()
+
+    stats = worker.stats()
+    assert stats["written"] == 10 and stats["dropped"] == 0
+    assert len(read_binary(writer.path)) == 30
+
+
+def test_persistence_worker_survives_a_bad_batch(tmp_path):
+    writer = BinaryWriter(tmp_path / "cu_20240101_000002", COLUMNS, HEADER, DTYPES)
+    worker = PersistenceWorker(writer, max_batches=100, fsync_interval=0)
+    worker.write(make_batch(0, 3))
+    worker.write({"unknown": np.zeros(3)})
+    worker.write(make_batch(3, 3))
+    worker.close()
+
+    stats = worker.stats()
+    assert stats["errors"] == 1 and "KeyError" in stats["last error"]
+    assert len(read_binary(writer.path)) == 6
+
+
+def test_unsupported_data_format_falls_back_to_csv(tmp_path):
+    config = {"Data Format": "parquet", "Fsync Interval": 0}
+    worker = make_persistence_worker(
+        config, tmp_path / "cu_20240101_000003", COLUMNS, HEADER, DTYPES
+    )
+    worker.write(make_batch(0, 3))
+    worker.close()
+
+    assert worker.path.suffix == ".csv"
+    assert worker.errors == 1 and "parquet" in worker.last_error